@@ -0,0 +1,350 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+import cv2
+
+import posture_check
+from posture_check import load_pose_backend, detect_keypoints
+from posture_rules import compile_rules
+from motion_gate import MotionGate
+from crop_region import CropTracker
+from preprocess import InputBuffer
+from monitor_user import PresenceTracker
+from config import load_settings, DEFAULT_SETTING_PATH
+from utils.common_functions import MedianFilter
+from utils.simulated_devices import SimulatedCapture, load_distance_trace
+
+PERCENTILES = (50, 95, 99)
+
+
+class StageTimer():
+    """Collects latency samples per pipeline stage.
+    """
+
+    def __init__(self):
+        self.samples = {}
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        """Time the enclosed block as one sample of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+
+    def summary(self):
+        """Return the count, mean and percentiles of every stage in milliseconds.
+        """
+        report = {}
+        for stage, samples in self.samples.items():
+            latencies = np.array(samples) * 1000
+            report[stage] = {"count": len(latencies), "mean_ms": float(latencies.mean())}
+            for q, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+                report[stage][f"p{q}_ms"] = float(value)
+        return report
+
+
+class ReplayFrames():
+    """Frame source for detect() that serves one recorded frame at a time.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.timestamp = None
+
+    def push(self, frame, timestamp):
+        self.frame = frame
+        self.timestamp = timestamp
+
+    def read(self, timeout=1.0):
+        return self.frame, self.timestamp
+
+
+class TimedBackend():
+    """Wraps a pose backend to time every inference call.
+    """
+
+    def __init__(self, backend, timer):
+        self.backend = backend
+        self.timer = timer
+        self.input_size = backend.input_size
+        self.input_dtype = backend.input_dtype
+
+    def __call__(self, input_image):
+        with self.timer.measure("inference"):
+            return self.backend(input_image)
+
+
+def replay_frames(const, frames, width, height, timer, max_frames=None, fps=30):
+    """Replay recorded frames through detect_keypoints() and the posture rules.
+
+    Parameters
+    ----------
+    const : Constants
+        Constants object.
+    frames : str
+        Video file or image directory.
+    width : int
+        Frame width the recording is resized to.
+    height : int
+        Frame height the recording is resized to.
+    timer : StageTimer
+        Timer receiving the capture, detect, inference and rules samples.
+    max_frames : int, optional
+        Stop after this many frames, by default None (whole recording)
+    fps : float, optional
+        Frame rate of the recording, used for the frame timestamps, by default 30
+
+    Returns
+    -------
+    dict
+        Number of frames, processing time and throughput in frames per second.
+    """
+    rules = compile_rules(const)
+    motion_gate = MotionGate(const.motion_threshold, const.motion_max_staleness) if const.motion_threshold > 0 else None
+    crop_tracker = CropTracker(posture_check.input_size) if const.crop_tracking else None
+    # 記録のフレームは待たずに読む
+    capture = SimulatedCapture(frames, width, height, fps=1e9, loop=False)
+    source = ReplayFrames()
+    count = 0
+    busy = 0.0
+    while max_frames is None or count < max_frames:
+        with timer.measure("capture"):
+            ret, raw = capture.read()
+        if not ret:
+            break
+        frame = cv2.cvtColor(raw, cv2.COLOR_BGR2RGB)
+        source.push(frame, count / fps)
+        start = time.perf_counter()
+        with timer.measure("detect"), contextlib.redirect_stdout(io.StringIO()):
+            keypoints = detect_keypoints(frame_grabber=source, motion_gate=motion_gate, crop_tracker=crop_tracker)
+        with timer.measure("rules"):
+            rules.evaluate(keypoints)
+        busy += time.perf_counter() - start
+        count += 1
+    capture.release()
+    return {
+        "frames": count,
+        "busy_s": busy,
+        "throughput_fps": count / busy if busy > 0 else 0.0,
+        "inference_skip_ratio": motion_gate.skip_ratio() if motion_gate is not None else 0.0,
+    }
+
+
+def compare_preprocess(frames, width, height, input_size, input_dtype, timer, max_frames=None):
+    """Time the TensorFlow letterboxing against the preallocated cv2 buffer on recorded frames.
+
+    The TensorFlow path is the one detect() used before: tensor conversion,
+    ``expand_dims``, ``resize_with_pad`` to float32 and a cast to the model
+    dtype. It is skipped when TensorFlow is not installed.
+
+    Parameters
+    ----------
+    frames : str
+        Video file or image directory.
+    width : int
+        Frame width the recording is resized to.
+    height : int
+        Frame height the recording is resized to.
+    input_size : int
+        Input resolution of the model.
+    input_dtype : numpy.dtype
+        Input dtype of the model.
+    timer : StageTimer
+        Timer receiving the preprocess_tensorflow and preprocess_buffer samples.
+    max_frames : int, optional
+        Stop after this many frames, by default None (whole recording)
+
+    Returns
+    -------
+    dict
+        Number of frames and the largest pixel difference between both paths.
+    """
+    try:
+        import tensorflow as tf
+    except ImportError:
+        tf = None
+    buffer = InputBuffer(input_size, input_dtype)
+    capture = SimulatedCapture(frames, width, height, fps=1e9, loop=False)
+    count = 0
+    max_difference = 0.0
+    while max_frames is None or count < max_frames:
+        ret, raw = capture.read()
+        if not ret:
+            break
+        frame = cv2.cvtColor(raw, cv2.COLOR_BGR2RGB)
+        with timer.measure("preprocess_buffer"):
+            input_image = buffer.letterbox(frame)
+        if tf is not None:
+            with timer.measure("preprocess_tensorflow"):
+                reference = tf.expand_dims(tf.convert_to_tensor(frame), axis=0)
+                reference = tf.image.resize_with_pad(reference, input_size, input_size)
+                reference = tf.cast(reference, tf.as_dtype(input_dtype)).numpy()
+            max_difference = max(max_difference, float(np.abs(reference.astype(np.float32) - input_image).max()))
+        count += 1
+    capture.release()
+    return {"frames": count, "tensorflow": tf is not None, "max_abs_difference": max_difference if tf is not None else None}
+
+
+def replay_trace(trace, timer):
+    """Replay an ultrasonic distance trace through the presence logic of monitor_user().
+
+    Each reading first goes through the median filter that
+    UltrasonicSensor.start_sampling() feeds, with the sensor defaults, and
+    the filtered distance at the time of the reading is passed on.
+
+    Parameters
+    ----------
+    trace : str
+        Distance trace CSV, see load_distance_trace().
+    timer : StageTimer
+        Timer receiving the presence samples.
+
+    Returns
+    -------
+    dict
+        Number of readings and presence changes.
+    """
+    times, distances = load_distance_trace(trace)
+    readings = MedianFilter()
+    presence = PresenceTracker()
+    changes = 0
+    for timestamp, distance in zip(times, distances):
+        with timer.measure("presence"):
+            # 応答のなかった測定はサンプラーと同じく捨てる
+            if not np.isnan(distance):
+                readings.add(timestamp, float(distance))
+            present, changed = presence.update(readings.value(timestamp))
+        changes += changed
+    return {"readings": len(distances), "presence_changes": changes}
+
+
+def git_commit():
+    """Return the commit of the working tree, or None outside a git checkout.
+    """
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Return the peak resident set size in MiB.
+
+    Parameters
+    ----------
+    who : int, optional
+        resource.RUSAGE_SELF for this process, or resource.RUSAGE_CHILDREN
+        for the largest child that has exited, such as the inference worker,
+        by default resource.RUSAGE_SELF
+    """
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux は KiB、macOS はバイトで返す
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(const, frames=None, trace=None, width=640, height=480, max_frames=None, label=None, preprocess=False):
+    """Replay a recorded session and collect the benchmark results.
+
+    Parameters
+    ----------
+    const : Constants
+        Constants object, with the pose backend settings.
+    frames : str, optional
+        Video file or image directory, by default None (no posture stages)
+    trace : str, optional
+        Distance trace CSV, by default None (no presence stage)
+    width : int, optional
+        Frame width, by default 640
+    height : int, optional
+        Frame height, by default 480
+    max_frames : int, optional
+        Stop after this many frames, by default None
+    label : str, optional
+        Free-form name of the run, by default None
+    preprocess : bool, optional
+        Also compare the TensorFlow and cv2 preprocessing, by default False
+
+    Returns
+    -------
+    dict
+        Machine-readable results.
+    """
+    timer = StageTimer()
+    results = {
+        "label": label,
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "pose_backend": const.pose_backend,
+        "inference_threads": const.inference_threads,
+        "frame_size": [width, height],
+        "frames_source": frames,
+        "trace": trace,
+    }
+    if frames is not None:
+        backend = load_pose_backend(const)
+        results["input_size"] = backend.input_size
+        posture_check.backend = TimedBackend(backend, timer)
+        results["posture"] = replay_frames(const, frames, width, height, timer, max_frames)
+        if preprocess:
+            results["preprocess"] = compare_preprocess(frames, width, height, backend.input_size, backend.input_dtype, timer, max_frames)
+        if hasattr(backend, "close"):
+            backend.close()
+    if trace is not None:
+        results["presence"] = replay_trace(trace, timer)
+    results["stages"] = timer.summary()
+    results["peak_rss_mb"] = peak_rss_mb()
+    # 推論プロセスは上で閉じて回収済みなので子プロセスの値に含まれる
+    results["children_peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return results
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Replay a recorded session through the posture pipeline without hardware")
+    argparser.add_argument("--frames", help="Video file or image directory")
+    argparser.add_argument("--trace", help="Ultrasonic distance trace CSV (time_s,distance_cm)")
+    argparser.add_argument("--setting", default=DEFAULT_SETTING_PATH, help="Path of setting.json")
+    argparser.add_argument("--backend", help="Pose backend overriding the settings")
+    argparser.add_argument("--model", help="Pose model path overriding the settings")
+    argparser.add_argument("--width", type=int, default=None, help="Frame width (camera_width by default)")
+    argparser.add_argument("--height", type=int, default=None, help="Frame height (camera_height by default)")
+    argparser.add_argument("--max-frames", type=int, default=None, help="Stop after this many frames")
+    argparser.add_argument("--compare-preprocess", action="store_true", help="Also time the former TensorFlow preprocessing against the cv2 input buffer")
+    argparser.add_argument("--label", help="Name of the run stored in the results")
+    argparser.add_argument("--output", default="benchmark.json", help="Path of the JSON results")
+    args = argparser.parse_args()
+    if args.frames is None and args.trace is None:
+        argparser.error("give --frames, --trace or both")
+    const = load_settings(args.setting).constants
+    if args.backend:
+        const = const.replace(pose_backend=args.backend)
+    if args.model:
+        const = const.replace(pose_model_path=args.model)
+    results = run_benchmark(const, args.frames, args.trace, args.width or const.camera_width, args.height or const.camera_height,
+                            args.max_frames, args.label, args.compare_preprocess)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    for stage, summary in results["stages"].items():
+        print(f"{stage}: p50={summary['p50_ms']:.2f}ms p95={summary['p95_ms']:.2f}ms p99={summary['p99_ms']:.2f}ms (n={summary['count']})")
+    if "posture" in results:
+        print(f"throughput={results['posture']['throughput_fps']:.1f}fps")
+    print(f"peak RSS={results['peak_rss_mb']:.1f}MiB (child processes {results['children_peak_rss_mb']:.1f}MiB)")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import argparse
+import csv
+import itertools
+import time
+import numpy as np
+
+from posture_rules import compile_rules, KEYPOINT_NAMES
+from config import load_settings, DEFAULT_SETTING_PATH
+
+# Groups with a per-frame verdict, in the order posture_check() handles them.
+GROUPS = ("move", "back", "bad_posture")
+
+# Grid values above this many margin elements are evaluated in chunks.
+MAX_CHUNK_ELEMENTS = 32 * 1024 * 1024
+
+
+def parse_grid(specs):
+    """Parse threshold grid specifications.
+
+    Parameters
+    ----------
+    specs : list of str
+        Specifications ``name=start:stop:step`` (stop included) or ``name=v1,v2,...``.
+
+    Returns
+    -------
+    dict
+        Candidate values per constant name.
+    """
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if not values:
+            raise ValueError(f"Invalid grid specification: {spec}")
+        if ":" in values:
+            start, stop, step = (float(value) for value in values.split(":"))
+            grid[name] = np.arange(start, stop + step / 2, step)
+        else:
+            grid[name] = np.array([float(value) for value in values.split(",")])
+    return grid
+
+
+def load_dataset(path, labels_path=None):
+    """Load recorded keypoints and their labels.
+
+    The dataset is a .npz file with a ``keypoints`` array of MoveNet outputs,
+    such as the output of offline_analysis.py. Labels are boolean arrays named
+    ``label_<group>`` in the same file, or columns named after the groups in a
+    CSV file with a ``frame_index`` column.
+
+    Parameters
+    ----------
+    path : str
+        Path of the .npz dataset
+    labels_path : str, optional
+        Path of a CSV file with the labels, by default None
+
+    Returns
+    -------
+    tuple
+        (keypoints, labels) where keypoints is [N, 17, 3] and labels maps
+        groups to [N] boolean arrays.
+    """
+    data = np.load(path)
+    keypoints = np.asarray(data["keypoints"], dtype=np.float32).reshape(-1, len(KEYPOINT_NAMES), 3)
+    labels = {group: data[f"label_{group}"].astype(bool) for group in GROUPS if f"label_{group}" in data.files}
+    if labels_path is not None:
+        frame_index = data["frame_index"] if "frame_index" in data.files else np.arange(len(keypoints))
+        position = {int(index): i for i, index in enumerate(frame_index)}
+        with open(labels_path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        for group in GROUPS:
+            if rows and group in rows[0]:
+                labels[group] = np.zeros(len(keypoints), dtype=bool)
+                for row in rows:
+                    i = position.get(int(row["frame_index"]))
+                    if i is not None:
+                        labels[group][i] = row[group].strip() in ("1", "true", "True")
+    if not labels:
+        raise ValueError("The dataset has no labels.")
+    return keypoints, labels
+
+
+def _scores(predicted, actual):
+    """Return precision, recall and F1 per grid point for [G, N] predictions.
+    """
+    true_positive = np.count_nonzero(predicted & actual, axis=-1)
+    predicted_positive = np.count_nonzero(predicted, axis=-1)
+    actual_positive = np.count_nonzero(actual)
+    precision = np.divide(true_positive, predicted_positive, out=np.zeros(len(true_positive)), where=predicted_positive > 0)
+    recall = true_positive / actual_positive if actual_positive else np.zeros(len(true_positive))
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros(len(true_positive)), where=(precision + recall) > 0)
+    return precision, recall, f1
+
+
+def calibrate(const, keypoints, labels, grid):
+    """Score every combination of candidate thresholds against the labels.
+
+    All rules are evaluated for a whole chunk of combinations in one
+    vectorized pass. The verdicts follow posture_check(): a frame with a move
+    or back violation is not counted as bad posture. A ``bad_posture_limit``
+    in the grid is scored by the alerts it would raise, every
+    ``bad_posture_limit + 1`` bad-posture frames.
+
+    Parameters
+    ----------
+    const : Constants
+        Constants object with the posture rules and current thresholds.
+    keypoints : numpy.ndarray
+        A [N, 17, 3] array of recorded keypoints.
+    labels : dict
+        [N] boolean label arrays per group.
+    grid : dict
+        Candidate values per constant name.
+
+    Returns
+    -------
+    dict
+        Columns of the results: one array of values per constant, then
+        precision, recall and F1 per labeled group, and the alert counts and
+        precision when bad_posture_limit is swept.
+    """
+    rules = compile_rules(const)
+    names = list(grid)
+    for name in names:
+        if name != "bad_posture_limit" and name not in rules.limit_names:
+            raise ValueError(f"No posture rule uses the constant {name}")
+    combos = np.array(list(itertools.product(*(grid[name] for name in names))), dtype=np.float64).reshape(-1, len(names))
+    limits = np.tile(rules.limits, (len(combos), 1))
+    for column, name in enumerate(names):
+        for i, limit_name in enumerate(rules.limit_names):
+            if limit_name == name:
+                limits[:, i] = combos[:, column]
+    alert_limits = combos[:, names.index("bad_posture_limit")] if "bad_posture_limit" in names else None
+
+    results = {name: combos[:, column] for column, name in enumerate(names)}
+    columns = {f"{group}_{score}": [] for group in labels for score in ("precision", "recall", "f1")}
+    if alert_limits is not None:
+        columns.update(alerts=[], alert_precision=[])
+    chunk = max(1, MAX_CHUNK_ELEMENTS // max(1, len(keypoints) * len(rules.names)))
+    for start in range(0, len(combos), chunk):
+        # [G, 1, R] の閾値と [1, N, 17, 3] のキーポイントをブロードキャストする
+        mask, _ = rules.evaluate(keypoints[np.newaxis], limits[start:start + chunk, np.newaxis, :].astype(np.float32))
+        out_of_frame = (mask & (rules.groups.get("move", 0) | rules.groups.get("back", 0))) != 0
+        verdicts = {
+            "move": (mask & rules.groups.get("move", 0)) != 0,
+            "back": (mask & rules.groups.get("back", 0)) != 0,
+            "bad_posture": ((mask & rules.groups.get("bad_posture", 0)) != 0) & ~out_of_frame,
+        }
+        for group in labels:
+            for score, values in zip(("precision", "recall", "f1"), _scores(verdicts[group], labels[group])):
+                columns[f"{group}_{score}"].append(values)
+        if alert_limits is not None:
+            bad = verdicts["bad_posture"]
+            period = alert_limits[start:start + chunk, np.newaxis].astype(np.int64) + 1
+            alerts = bad & (np.cumsum(bad, axis=-1) % period == 0)
+            count = np.count_nonzero(alerts, axis=-1)
+            correct = np.count_nonzero(alerts & labels.get("bad_posture", bad), axis=-1)
+            columns["alerts"].append(count)
+            columns["alert_precision"].append(np.divide(correct, count, out=np.zeros(len(count)), where=count > 0))
+    results.update({name: np.concatenate(values) for name, values in columns.items()})
+    return results
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Sweep posture thresholds over labeled recorded keypoints")
+    argparser.add_argument("dataset", help=".npz file with keypoints and label_<group> arrays")
+    argparser.add_argument("--labels", help="CSV file with frame_index and one column per group")
+    argparser.add_argument("--grid", nargs="+", required=True, help="Threshold grids, name=start:stop:step or name=v1,v2,...")
+    argparser.add_argument("--setting", default=DEFAULT_SETTING_PATH, help="Path of setting.json")
+    argparser.add_argument("--sort", default=None, help="Column to rank by (F1 of the first labeled group by default)")
+    argparser.add_argument("--top", type=int, default=10, help="Number of combinations to print")
+    argparser.add_argument("--output", default="calibration.csv", help="Path of the CSV results")
+    args = argparser.parse_args()
+    const = load_settings(args.setting).constants
+    keypoints, labels = load_dataset(args.dataset, args.labels)
+    grid = parse_grid(args.grid)
+    start = time.monotonic()
+    results = calibrate(const, keypoints, labels, grid)
+    elapsed = time.monotonic() - start
+    columns = list(results)
+    count = len(results[columns[0]])
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(zip(*(results[column] for column in columns)))
+    sort = args.sort or f"{next(iter(labels))}_f1"
+    order = np.argsort(-results[sort], kind="stable")[:args.top]
+    print(f"{count} combinations x {len(keypoints)} frames in {elapsed:.2f}s, written to {args.output}")
+    for i in order:
+        print(", ".join(f"{column}={results[column][i]:.4g}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
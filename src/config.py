@@ -0,0 +1,324 @@
+import json
+import os
+import threading
+import traceback
+import types
+
+from posture_rules import PostureRules
+
+# Default location of the settings, next to the source tree.
+DEFAULT_SETTING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "setting.json")
+
+
+class ConfigError(ValueError):
+    """Raised when the settings file is missing a value or has a value of the wrong type.
+    """
+
+
+class FrozenConfig():
+    """Immutable, slot-based group of settings.
+
+    Values are read as attributes or by key. Subclasses list their fields in
+    ``__slots__``, so attribute lookups are plain slot reads.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only; use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __contains__(self, name):
+        return name in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def get(self, name, default=None):
+        return getattr(self, name) if name in self.__slots__ else default
+
+    def replace(self, **changes):
+        """Return a copy with some values changed.
+        """
+        values = dict(self.items())
+        values.update(changes)
+        return type(self)(**values)
+
+
+_section_classes = {}
+
+
+def _section_class(fields):
+    """Return a FrozenConfig subclass with the given fields, created once per field set.
+    """
+    fields = tuple(fields)
+    if fields not in _section_classes:
+        _section_classes[fields] = type("Section", (FrozenConfig,), {"__slots__": fields})
+    return _section_classes[fields]
+
+
+def _freeze(value):
+    """Turn parsed JSON into immutable values: dicts become sections and lists tuples.
+    """
+    if isinstance(value, dict):
+        if all(isinstance(key, str) and key.isidentifier() for key in value):
+            return _section_class(value)(**{key: _freeze(item) for key, item in value.items()})
+        return types.MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class Constants(FrozenConfig):
+    """Validated constants of the ``constants`` section of setting.json.
+    """
+
+    # Accepted types per constant. float fields also accept integers.
+    SCHEMA = {
+        "audio_path": str,
+        "start_audio_file": str,
+        "move_audio_file": str,
+        "back_audio_file": str,
+        "posture_alert_audio_file": str,
+        "treat_audio_file": str,
+        "item_get_audio_file": str,
+        "finish_audio_file": str,
+        "audio_cache_bytes": int,
+        "left_shoulder_x_limit": float,
+        "left_shoulder_y_limit": float,
+        "right_shoulder_x_limit": float,
+        "right_shoulder_y_limit": float,
+        "left_eye_y_limit": float,
+        "right_eye_y_limit": float,
+        "caterpillar_back_rotation": float,
+        "caterpillar_speed": float,
+        "bad_posture_limit": int,
+        "punch_distance": float,
+        "punch_time": int,
+        "delivery_interval": float,
+        "camera_id": (int, str),
+        "camera_width": int,
+        "camera_height": int,
+        "frame_buffer_size": int,
+        "pose_backend": str,
+        "pose_model_path": str,
+        "inference_threads": int,
+        "pose_inference_process": bool,
+        "motion_threshold": float,
+        "motion_max_staleness": float,
+        "crop_tracking": bool,
+        "posture_rules": list,
+    }
+
+    __slots__ = tuple(SCHEMA)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Validate the constants and build the frozen object.
+
+        Parameters
+        ----------
+        data : dict
+            The ``constants`` section of setting.json.
+
+        Returns
+        -------
+        Constants
+            The validated constants.
+        """
+        unknown = sorted(set(data) - set(cls.SCHEMA))
+        if unknown:
+            raise ConfigError(f"Unknown constants: {', '.join(unknown)}")
+        values = {}
+        for name, expected in cls.SCHEMA.items():
+            if name not in data:
+                raise ConfigError(f"Missing constant: {name}")
+            values[name] = _freeze(_check_type(name, data[name], expected))
+        constants = cls(**values)
+        try:
+            PostureRules(constants.posture_rules, constants)
+        except (KeyError, ValueError, TypeError) as e:
+            raise ConfigError(f"Invalid posture_rules: {e!r}")
+        return constants
+
+
+def _check_type(name, value, expected):
+    """Check the type of a constant, converting integers given for float constants.
+    """
+    expected = expected if isinstance(expected, tuple) else (expected,)
+    if isinstance(value, bool) and bool not in expected:
+        raise ConfigError(f"{name} must be {' or '.join(t.__name__ for t in expected)}, not bool")
+    if float in expected and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, expected):
+        raise ConfigError(f"{name} must be {' or '.join(t.__name__ for t in expected)}, not {type(value).__name__}")
+    return value
+
+
+class Settings(FrozenConfig):
+    """All sections of setting.json. ``constants`` is validated, the others are frozen as they are.
+    """
+
+    __slots__ = ("constants", "pins", "metrics", "session_log", "devices")
+
+
+def parse_settings(data):
+    """Build Settings from the parsed JSON.
+    """
+    missing = [name for name in Settings.__slots__ if name not in data]
+    if missing:
+        raise ConfigError(f"Missing sections: {', '.join(missing)}")
+    sections = {name: _freeze(data[name]) for name in Settings.__slots__ if name != "constants"}
+    return Settings(constants=Constants.from_dict(data["constants"]), **sections)
+
+
+def load_settings(path=DEFAULT_SETTING_PATH):
+    """Read and validate setting.json.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path of the settings file, by default DEFAULT_SETTING_PATH
+
+    Returns
+    -------
+    Settings
+        The frozen settings.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    return parse_settings(data)
+
+
+class ConfigStore():
+    """Holds the current settings and reloads them when the file changes.
+
+    A watcher thread polls the modification time and size of the file. A
+    changed file is loaded and validated completely before the new Settings
+    replace the old ones in a single reference assignment, so a worker always
+    sees one consistent version. Invalid files are reported and ignored.
+    Workers compare ``version`` with the version they last used to notice a
+    reload. Only the constants take effect without a restart.
+    """
+
+    def __init__(self, path=DEFAULT_SETTING_PATH, poll_interval=0.25):
+        """Load the settings.
+
+        Parameters
+        ----------
+        path : str, optional
+            Path of the settings file, by default DEFAULT_SETTING_PATH
+        poll_interval : float, optional
+            Seconds between two checks of the file, by default 0.25
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self._stamp = self._file_stamp()
+        self.settings = load_settings(path)
+        self.version = 0
+        self._subscribers = []
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def constants(self):
+        """Constants of the current settings."""
+        return self.settings.constants
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def subscribe(self, callback):
+        """Call a function with the new Settings after every reload.
+        """
+        self._subscribers.append(callback)
+        return
+
+    def reload(self):
+        """Load the file again if it changed.
+
+        Returns
+        -------
+        bool
+            True if new settings were published.
+        """
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            settings = load_settings(self.path)
+        except (OSError, ValueError) as e:
+            print("Error in ConfigStore (settings not reloaded):", e)
+            return False
+        if settings == self.settings:
+            return False
+        self.settings = settings
+        self.version += 1
+        print(f"設定を再読み込みしました (version {self.version})")
+        for callback in self._subscribers:
+            try:
+                callback(settings)
+            except Exception as e:
+                print("Error in ConfigStore subscriber:", e)
+                traceback.print_exc()
+        return True
+
+    def start(self):
+        """Start watching the file.
+
+        Returns
+        -------
+        ConfigStore
+            The store itself, so that it can be chained after the constructor.
+        """
+        if self._thread is not None:
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, name="ConfigWatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching the file.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        return
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.reload()
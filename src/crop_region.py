@@ -0,0 +1,163 @@
+import numpy as np
+import cv2
+
+# Keypoints below this score are ignored when determining the crop region.
+MIN_CROP_KEYPOINT_SCORE = 0.2
+
+# Crops smaller than this fraction of the padded frame are treated as failed tracking.
+MIN_CROP_LENGTH = 0.05
+
+TORSO_JOINTS = [5, 6, 11, 12]
+SHOULDERS = [5, 6]
+HIPS = [11, 12]
+
+
+def init_crop_region():
+    """Return the initial crop region, which covers the whole padded frame.
+
+    Crop regions are normalized to the square obtained by padding the frame to
+    its longer side, the same coordinates ``resize_with_pad`` produces, so the
+    initial region is equivalent to letterboxing the whole frame.
+
+    Returns
+    -------
+    dict
+        Crop region with y_min, x_min, y_max, x_max, height and width.
+    """
+    return {'y_min': 0.0, 'x_min': 0.0, 'y_max': 1.0, 'x_max': 1.0, 'height': 1.0, 'width': 1.0}
+
+
+def torso_visible(keypoints, min_score=MIN_CROP_KEYPOINT_SCORE):
+    """Check whether at least one shoulder and one hip are confidently detected.
+
+    Parameters
+    ----------
+    keypoints : numpy.ndarray
+        A [17, 3] array of keypoints.
+    min_score : float, optional
+        Minimum keypoint score, by default MIN_CROP_KEYPOINT_SCORE
+
+    Returns
+    -------
+    bool
+        True if the torso is visible.
+    """
+    scores = keypoints[:, 2]
+    return bool((scores[HIPS] > min_score).any() and (scores[SHOULDERS] > min_score).any())
+
+
+def determine_crop_region(keypoints, min_score=MIN_CROP_KEYPOINT_SCORE):
+    """Determine the region to crop for the next frame from the current keypoints.
+
+    The region is a square centered on the hips that contains the torso with a
+    margin and all confidently detected keypoints. If the torso is not visible
+    the whole frame is used, as it is when the region would be degenerate.
+
+    Parameters
+    ----------
+    keypoints : numpy.ndarray
+        A [17, 3] array of keypoints in padded-frame coordinates.
+    min_score : float, optional
+        Minimum keypoint score, by default MIN_CROP_KEYPOINT_SCORE
+
+    Returns
+    -------
+    dict
+        The crop region.
+    """
+    if not torso_visible(keypoints, min_score):
+        return init_crop_region()
+    center_y = keypoints[HIPS, 0].mean()
+    center_x = keypoints[HIPS, 1].mean()
+    torso_range = np.abs(keypoints[TORSO_JOINTS, :2] - (center_y, center_x)).max(axis=0)
+    body = keypoints[keypoints[:, 2] >= min_score, :2]
+    body_range = np.abs(body - (center_y, center_x)).max(axis=0) if len(body) else np.zeros(2)
+    crop_length_half = max(torso_range.max() * 1.9, body_range.max() * 1.2)
+    crop_length_half = min(crop_length_half, max(center_x, 1 - center_x, center_y, 1 - center_y))
+    if crop_length_half > 0.5 or crop_length_half * 2 < MIN_CROP_LENGTH:
+        return init_crop_region()
+    y_min = float(center_y - crop_length_half)
+    x_min = float(center_x - crop_length_half)
+    length = float(crop_length_half * 2)
+    return {'y_min': y_min, 'x_min': x_min, 'y_max': y_min + length, 'x_max': x_min + length,
+            'height': length, 'width': length}
+
+
+class CropTracker():
+    """MoveNet crop-region tracking across frames.
+
+    Each frame is cropped around the person found in the previous frame and
+    resized to the model input in one affine warp, so the model input is not
+    wasted on background. Keypoints are mapped back to padded-frame
+    coordinates so that callers see the same coordinates as with letterboxing.
+    """
+
+    def __init__(self, input_size=192, min_score=MIN_CROP_KEYPOINT_SCORE):
+        """Initialize the tracker.
+
+        Parameters
+        ----------
+        input_size : int, optional
+            Input resolution of the model, by default 192
+        min_score : float, optional
+            Minimum keypoint score used for tracking, by default MIN_CROP_KEYPOINT_SCORE
+        """
+        self.input_size = input_size
+        self.min_score = min_score
+        self.crop_region = init_crop_region()
+        self._region = self.crop_region
+        self._transform = np.zeros((2, 3), dtype=np.float64)
+
+    def reset(self):
+        """Start again from the whole frame, for example after the user left.
+        """
+        self.crop_region = init_crop_region()
+        return
+
+    def crop(self, frame, dst=None):
+        """Crop the current region out of the frame and resize it to the model input.
+
+        Parts of the region outside the frame are filled with zeros.
+
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            A [height, width, 3] camera frame.
+        dst : numpy.ndarray, optional
+            A [input_size, input_size, 3] buffer to write into, by default None
+
+        Returns
+        -------
+        numpy.ndarray
+            The [input_size, input_size, 3] model input.
+        """
+        height, width = frame.shape[:2]
+        side = max(height, width)
+        region = self.crop_region
+        scale = self.input_size / (region['width'] * side)
+        self._transform[0, 0] = scale
+        self._transform[1, 1] = scale
+        self._transform[0, 2] = -(region['x_min'] * side - (side - width) / 2) * scale
+        self._transform[1, 2] = -(region['y_min'] * side - (side - height) / 2) * scale
+        self._region = region
+        return cv2.warpAffine(frame, self._transform, (self.input_size, self.input_size), dst=dst,
+                              flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+    def update(self, keypoints):
+        """Map keypoints from the last crop to padded-frame coordinates and track the next crop.
+
+        Parameters
+        ----------
+        keypoints : numpy.ndarray
+            A [17, 3] array predicted on the last crop. It is updated in place.
+
+        Returns
+        -------
+        numpy.ndarray
+            The same keypoints in padded-frame coordinates.
+        """
+        region = self._region
+        keypoints[:, 0] = region['y_min'] + region['height'] * keypoints[:, 0]
+        keypoints[:, 1] = region['x_min'] + region['width'] * keypoints[:, 1]
+        self.crop_region = determine_crop_region(keypoints, self.min_score)
+        return keypoints
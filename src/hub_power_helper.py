@@ -0,0 +1,43 @@
+import subprocess
+import sys
+
+# Commands accepted on stdin, mapped to the uhubctl action.
+ACTIONS = {"on": "on", "off": "off"}
+
+
+def serve(hub_num, port=None):
+    """Switch the power of one hub (port) for every command read from stdin.
+
+    The helper is started once with sudo by lightning_control.LED and then
+    only accepts the words ``on`` and ``off``, so the caller needs sudo rights
+    for this script alone instead of a root shell. For every command one line
+    is written back: ``0`` on success, or the uhubctl exit code followed by
+    its error message.
+
+    Parameters
+    ----------
+    hub_num : int
+        Hub number passed to ``uhubctl -l``
+    port : int, optional
+        Hub port passed to ``uhubctl -p``, by default None (all ports)
+    """
+    command = ["uhubctl", "-l", str(hub_num)]
+    if port is not None:
+        command += ["-p", str(port)]
+    for line in sys.stdin:
+        action = ACTIONS.get(line.strip())
+        if action is None:
+            print(f"2 unknown command: {line.strip()!r}", flush=True)
+            continue
+        try:
+            result = subprocess.run(command + ["-a", action], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        except OSError as e:
+            print(f"127 {e}", flush=True)
+            continue
+        message = " ".join(result.stderr.split())
+        print(f"{result.returncode} {message}".strip(), flush=True)
+    return
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules imported by main.py before any hardware is initialized.
+STARTUP_MODULES = ["posture_check", "monitor_user", "snack_delivery", "lightning_control", "pose_backends"]
+
+# Heavy dependencies that must only be loaded on demand.
+FORBIDDEN_MODULES = ["matplotlib", "imageio", "IPython", "tensorflow_docs", "tensorflow", "tensorflow_hub"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure_imports(modules=STARTUP_MODULES):
+    """Import the startup modules in a fresh interpreter.
+
+    Parameters
+    ----------
+    modules : list, optional
+        Names of the modules to import, by default STARTUP_MODULES
+
+    Returns
+    -------
+    tuple
+        (elapsed, loaded) where elapsed is the import time in seconds and
+        loaded is the list of all modules in sys.modules afterwards.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(modules=list(modules))],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return report["elapsed"], report["modules"]
+
+
+def check_import_budget(budget_ms=2000, modules=STARTUP_MODULES, forbidden=FORBIDDEN_MODULES):
+    """Check that the non-verbose startup path stays light.
+
+    Parameters
+    ----------
+    budget_ms : float, optional
+        Maximum import time in milliseconds, by default 2000
+    modules : list, optional
+        Names of the modules to import, by default STARTUP_MODULES
+    forbidden : list, optional
+        Top-level packages that must not be imported, by default FORBIDDEN_MODULES
+
+    Returns
+    -------
+    list
+        Violation messages. The check passed if the list is empty.
+    """
+    try:
+        elapsed, loaded = measure_imports(modules)
+    except ImportError as e:
+        return [f"startup imports failed: {e}"]
+    loaded_packages = {name.split(".")[0] for name in loaded}
+    errors = [f"{name} is imported at startup" for name in forbidden if name in loaded_packages]
+    if elapsed * 1000 > budget_ms:
+        errors.append(f"startup imports took {elapsed * 1000:.0f}ms (budget {budget_ms}ms)")
+    return errors
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Check the import-time budget of the startup path")
+    argparser.add_argument("--budget-ms", type=float, default=2000, help="Maximum import time in milliseconds")
+    args = argparser.parse_args()
+    errors = check_import_budget(args.budget_ms)
+    for error in errors:
+        print(f"FAIL: {error}")
+    if errors:
+        sys.exit(1)
+    print("import budget OK")
+
+
+if __name__ == "__main__":
+    main()
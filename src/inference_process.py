@@ -0,0 +1,353 @@
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from multiprocessing import shared_memory
+import numpy as np
+
+from pose_backends import PoseBackend, check_model, create_backend
+from preprocess import InputBuffer
+from utils import metrics
+
+NUM_KEYPOINTS = 17
+
+
+def _views(input_buf, output_buf, slots, input_size, input_dtype):
+    """Map the shared input and output rings as arrays.
+
+    Returns
+    -------
+    tuple
+        (inputs, keypoints, sequences, heartbeat) where inputs is [slots, 1,
+        size, size, 3], keypoints [slots, 17, 3] float32, sequences [slots]
+        float64 and heartbeat a [1] float64 monotonic time.
+    """
+    # frombuffer の配列は共有メモリを参照し続けるので、使用中に unmap されない
+    inputs = np.frombuffer(input_buf, dtype=input_dtype, count=slots * input_size * input_size * 3)
+    inputs = inputs.reshape(slots, 1, input_size, input_size, 3)
+    keypoints = np.frombuffer(output_buf, dtype=np.float32, count=slots * NUM_KEYPOINTS * 3)
+    keypoints = keypoints.reshape(slots, NUM_KEYPOINTS, 3)
+    offset = keypoints.nbytes
+    sequences = np.frombuffer(output_buf, dtype=np.float64, count=slots, offset=offset)
+    heartbeat = np.frombuffer(output_buf, dtype=np.float64, count=1, offset=offset + sequences.nbytes)
+    return inputs, keypoints, sequences, heartbeat
+
+
+def _output_bytes(slots):
+    return slots * NUM_KEYPOINTS * 3 * 4 + (slots + 1) * 8
+
+
+def _serve(conn, backend_name, model_path, num_threads, heartbeat_interval):
+    """Entry point of the worker process.
+
+    Loads and warms up the backend, reports its input size and dtype, attaches
+    to the rings the parent creates, then runs one inference per (slot,
+    sequence) message until it receives None or the parent goes away.
+    """
+    parent = os.getppid()
+    try:
+        backend = create_backend(backend_name, model_path, num_threads)
+        backend.warmup()
+    except Exception as e:
+        traceback.print_exc()
+        conn.send(("error", repr(e)))
+        return
+    conn.send(("ready", backend.input_size, np.dtype(backend.input_dtype).str))
+    message = conn.recv()
+    if message is None:
+        return
+    input_name, output_name, slots = message
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    inputs, keypoints, sequences, heartbeat = _views(input_shm.buf, output_shm.buf, slots, backend.input_size, backend.input_dtype)
+    try:
+        while True:
+            heartbeat[0] = time.monotonic()
+            if not conn.poll(heartbeat_interval):
+                if os.getppid() != parent:
+                    break
+                continue
+            message = conn.recv()
+            if message is None:
+                break
+            slot, sequence = message
+            keypoints[slot] = backend(inputs[slot])[0, 0]
+            # 座標を書き終えてから番号を更新する
+            sequences[slot] = sequence
+            conn.send(message)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del inputs, keypoints, sequences, heartbeat
+        input_shm.close()
+        output_shm.close()
+    return
+
+
+class InferenceProcess(PoseBackend):
+    """Pose backend that runs inference in a separate worker process.
+
+    Inference no longer holds the GIL of the main process, so the ultrasonic
+    polling and delivery threads keep their timing. Input images and keypoints
+    are exchanged through rings of slots in shared memory; only the slot index
+    and a sequence number go through the pipe, never pixel data. Replies whose
+    sequence number does not match the request, for example from before a
+    timeout, are ignored.
+
+    The worker writes a heartbeat while it waits. A worker that exited, stopped
+    beating or did not answer within ``timeout`` is killed, and the next call
+    makes one attempt to start it again, after a delay that doubles after each
+    failed start up to ``max_restart_delay``. A call that cannot get keypoints
+    raises RuntimeError, so the caller moves on to the next frame. close()
+    interrupts these waits and frees the shared memory only once no call is
+    running.
+    """
+
+    def __init__(self, backend_name, model_path, num_threads=None, slots=2, timeout=2.0,
+                 heartbeat_interval=0.5, start_timeout=60.0, restart_delay=1.0, max_restart_delay=30.0):
+        """Prepare the process. Call start() to load the model.
+
+        Parameters
+        ----------
+        backend_name : str
+            Backend run by the worker, one of pose_backends.BACKENDS.
+        model_path : str
+            Path of the model to load.
+        num_threads : int, optional
+            Number of inference threads of the worker, by default None
+        slots : int, optional
+            Number of slots of the shared rings, by default 2
+        timeout : float, optional
+            Seconds to wait for one inference, by default 2.0
+        heartbeat_interval : float, optional
+            Seconds between two heartbeats of an idle worker, by default 0.5
+        start_timeout : float, optional
+            Seconds to wait for the model to load, by default 60.0
+        restart_delay : float, optional
+            Delay before the first restart, by default 1.0
+        max_restart_delay : float, optional
+            Maximum delay between restarts, by default 30.0
+        """
+        # 子プロセスを起動する前に、モデルがないことを分かりやすく知らせる
+        check_model(backend_name, model_path)
+        self.backend_name = backend_name
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.slots = slots
+        self.timeout = timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.start_timeout = start_timeout
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._input_shm = None
+        self._output_shm = None
+        self._buffers = None
+        self._next_slot = 0
+        self._sequence = 0
+        self._delay = restart_delay
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def start(self):
+        """Start the worker and wait until the model is loaded.
+
+        Returns
+        -------
+        InferenceProcess
+            The process itself, so that it can be chained after the constructor.
+        """
+        with self._lock:
+            return self._start()
+
+    def _start(self):
+        if self._closed.is_set():
+            raise RuntimeError("Inference process is closed")
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_serve, name="PoseInference", daemon=True,
+                                        args=(child_conn, self.backend_name, self.model_path, self.num_threads, self.heartbeat_interval))
+        process.start()
+        child_conn.close()
+        self._process, self._conn = process, conn
+        deadline = time.monotonic() + self.start_timeout
+        # close() を待たせないよう、読み込みの完了は短い間隔で確認する
+        while not conn.poll(min(self.heartbeat_interval, self.start_timeout)):
+            if self._closed.is_set() or not process.is_alive() or time.monotonic() > deadline:
+                self._kill()
+                raise RuntimeError("Inference process did not load the model")
+        try:
+            message = conn.recv()
+        except EOFError:
+            message = ("error", "exited while loading the model")
+        if message[0] != "ready":
+            self._kill()
+            raise RuntimeError(f"Inference process failed: {message[1]}")
+        _, input_size, input_dtype = message
+        if self._input_shm is None or (input_size, np.dtype(input_dtype)) != (self.input_size, self.input_dtype):
+            self._allocate(input_size, np.dtype(input_dtype))
+        self._heartbeat[0] = time.monotonic()
+        conn.send((self._input_shm.name, self._output_shm.name, self.slots))
+        return self
+
+    def _allocate(self, input_size, input_dtype):
+        """Create the shared rings for the model input of the worker.
+        """
+        self._release()
+        self.input_size = input_size
+        self.input_dtype = input_dtype
+        input_bytes = self.slots * input_size * input_size * 3 * input_dtype.itemsize
+        self._input_shm = shared_memory.SharedMemory(create=True, size=input_bytes)
+        self._output_shm = shared_memory.SharedMemory(create=True, size=_output_bytes(self.slots))
+        self._inputs, self._keypoints, self._sequences, self._heartbeat = _views(
+            self._input_shm.buf, self._output_shm.buf, self.slots, input_size, input_dtype)
+        self._buffers = [InputBuffer(input_size, input_dtype, batch=self._inputs[slot]) for slot in range(self.slots)]
+        return
+
+    def _release(self):
+        """Unmap and remove the shared rings.
+
+        A mapping cannot be closed while an array still views it, for example
+        an InputBuffer a caller kept from input_buffer(). The segments are then
+        unlinked anyway and stay mapped, and the memory is freed once the last
+        view is gone.
+        """
+        if self._input_shm is None:
+            return
+        self._buffers = None
+        del self._inputs, self._keypoints, self._sequences, self._heartbeat
+        for shm in (self._input_shm, self._output_shm):
+            try:
+                shm.close()
+            except BufferError:
+                print("Error in InferenceProcess: shared memory is still in use, unlinking it anyway")
+            shm.unlink()
+        self._input_shm = self._output_shm = None
+        return
+
+    def alive(self):
+        """Check that the worker runs and its heartbeat is recent.
+        """
+        if self._process is None or not self._process.is_alive():
+            return False
+        return time.monotonic() - self._heartbeat[0] < max(self.timeout, 3 * self.heartbeat_interval)
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join(timeout=1)
+        if self._conn is not None:
+            self._conn.close()
+        self._process = self._conn = None
+        return
+
+    def restart(self):
+        """Kill the worker and make one attempt to start a new one after the restart delay.
+
+        Raises
+        ------
+        RuntimeError
+            If the worker could not be started or the process was closed.
+        """
+        with self._lock:
+            return self._restart()
+
+    def _restart(self):
+        self._kill()
+        print(f"推論プロセスを再起動します ({self._delay}s後)")
+        if self._closed.wait(self._delay):
+            raise RuntimeError("Inference process is closed")
+        self._delay = min(self._delay * 2, self.max_restart_delay)
+        self.restarts += 1
+        metrics.inc("inference_restarts_total")
+        return self._start()
+
+    def input_buffer(self):
+        """Return the InputBuffer of the slot used by the next call, to preprocess in place.
+
+        The buffer views the shared memory. Callers must not keep it beyond the
+        next call, so that close() can unmap the memory.
+        """
+        if self._buffers is None:
+            raise RuntimeError("Inference process is closed")
+        return self._buffers[self._next_slot]
+
+    def __call__(self, input_image):
+        """Run inference in the worker.
+
+        Parameters
+        ----------
+        input_image : array_like
+            A [1, input_size, input_size, 3] image. Images already written
+            through input_buffer() are not copied.
+
+        Returns
+        -------
+        numpy.ndarray
+            A [1, 1, 17, 3] float32 array with the keypoint coordinates and scores.
+
+        Raises
+        ------
+        RuntimeError
+            If the worker did not answer, could not be restarted or was closed.
+        """
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError("Inference process is closed")
+            if not self.alive():
+                self._restart()
+            return self._infer(input_image)
+
+    def _infer(self, input_image):
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.slots
+        target = self._inputs[slot]
+        if not np.shares_memory(input_image, target):
+            np.copyto(target, input_image, casting="unsafe")
+        self._sequence += 1
+        self._conn.send((slot, self._sequence))
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if self._conn.poll(min(self.heartbeat_interval, self.timeout)):
+                try:
+                    if self._conn.recv() == (slot, self._sequence) and self._sequences[slot] == self._sequence:
+                        break
+                except EOFError:
+                    pass
+            if self._closed.is_set() or not self._process.is_alive() or time.monotonic() > deadline:
+                self._kill()
+                raise RuntimeError("Inference process did not answer; it is restarted on the next frame")
+        self._delay = self.restart_delay
+        return self._keypoints[slot].copy()[np.newaxis, np.newaxis]
+
+    def warmup(self, runs=2):
+        # モデルはワーカーの起動時に温めてある
+        return
+
+    def close(self):
+        """Stop the worker and free the shared memory.
+
+        Waits for a running call, which returns early once closed. If it does
+        not finish in time, the shared memory is left to the resource tracker
+        instead of being freed under it.
+        """
+        self._closed.set()
+        if not self._lock.acquire(timeout=self.timeout + self.heartbeat_interval):
+            print("Error in InferenceProcess: a call is still running, not freeing the shared memory")
+            return
+        try:
+            if self._conn is not None:
+                try:
+                    self._conn.send(None)
+                except (OSError, ValueError):
+                    pass
+            if self._process is not None:
+                self._process.join(timeout=self.timeout)
+            self._kill()
+            self._release()
+        finally:
+            self._lock.release()
+        return
@@ -1,29 +1,125 @@
 import os
-import RPi.GPIO as GPIO
+import subprocess
+import sys
+import threading
+import time
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    GPIO = None
+
+# Script run with sudo to switch the hub power.
+HELPER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hub_power_helper.py")
+
 class LED():
     """LED control class
+
+    The LED is powered from a USB hub. The hub power state is cached, so only
+    real transitions are sent to the hub. When a port is given and its sysfs
+    ``disable`` file is writable, the port is switched directly through sysfs.
+    Otherwise the transitions go to one persistent hub_power_helper process,
+    started with ``sudo -n``, which only accepts ``on`` and ``off`` and runs
+    uhubctl for this hub. After a failure the LED waits before trying again,
+    doubling the wait up to ``max_retry_delay``.
     """
-    def __init__(self, hub_num=2):
+    def __init__(self, hub_num=2, port=None, retry_delay=1.0, max_retry_delay=60.0):
         """Constructor
 
         Parameters
         ----------
-        hub_num : str, optional
-            hub number, by default 1-1
+        hub_num : int, optional
+            hub number, by default 2
+        port : int, optional
+            hub port number, by default None (all ports of the hub)
+        retry_delay : float, optional
+            seconds before the first retry after a failure, by default 1.0
+        max_retry_delay : float, optional
+            maximum seconds between two retries, by default 60.0
+        """
+        self.hub_num = int(hub_num)
+        self.port = int(port) if port is not None else None
+        self.state = None
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._lock = threading.Lock()
+        self._helper = None
+        self._delay = retry_delay
+        self._retry_at = 0.0
+        self._sysfs_path = None
+        if port is not None:
+            path = f"/sys/bus/usb/devices/{hub_num}-0:1.0/usb{hub_num}-port{port}/disable"
+            if os.access(path, os.W_OK):
+                self._sysfs_path = path
+        return
+
+    def _start_helper(self):
+        """Start the privileged helper for this hub.
+        """
+        command = ["sudo", "-n", sys.executable, HELPER_PATH, str(self.hub_num)]
+        if self.port is not None:
+            command.append(str(self.port))
+        self._helper = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        return
+
+    def _set_power(self, on):
+        """Switch the hub power.
+
+        Parameters
+        ----------
+        on : bool
+            True to power the LED
+
+        Raises
+        ------
+        RuntimeError
+            If uhubctl or the helper failed.
         """
-        self.hub_num = hub_num
+        if self._sysfs_path is not None:
+            with open(self._sysfs_path, "w") as f:
+                f.write("0" if on else "1")
+            return
+        if self._helper is None or self._helper.poll() is not None:
+            self._start_helper()
+        try:
+            self._helper.stdin.write("on\n" if on else "off\n")
+            self._helper.stdin.flush()
+            reply = self._helper.stdout.readline()
+        except (OSError, ValueError) as e:
+            reply = f"-1 {e}"
+        if not reply:
+            # sudo を拒否された場合などはヘルパーが終了している
+            reply = f"{self._helper.wait()} hub_power_helper exited"
+        code, _, message = reply.strip().partition(" ")
+        if code != "0":
+            raise RuntimeError(f"uhubctl failed ({code}): {message}")
+        return
+
+    def _switch(self, on):
+        with self._lock:
+            if self.state is on or time.monotonic() < self._retry_at:
+                return
+            try:
+                self._set_power(on)
+            except Exception:
+                # 状態は不明になるが、すぐには送り直さずに待つ
+                self.state = None
+                self._retry_at = time.monotonic() + self._delay
+                self._delay = min(self._delay * 2, self.max_retry_delay)
+                raise
+            self.state = on
+            self._delay = self.retry_delay
         return
 
     def on(self):
         """Turn on the LED
         """
-        os.system(f"sudo uhubctl -l {self.hub_num} -a on")
+        self._switch(True)
         return
 
     def off(self):
         """Turn off the LED
         """
-        os.system(f"sudo uhubctl -l {self.hub_num} -a off")
+        self._switch(False)
         return
 
     def blink(self, t=5):
@@ -38,6 +134,18 @@ class LED():
             self.on()
             self.off()
         return
+
+    def close(self):
+        """Stop the helper. The hub keeps its power state.
+        """
+        if self._helper is not None and self._helper.poll() is None:
+            self._helper.stdin.close()
+            try:
+                self._helper.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._helper.kill()
+        self._helper = None
+        return
     
 
 class OrganicEL():
@@ -1,58 +1,80 @@
-from utils.common_functions import Speaker, UltrasonicSensor, input_json, quit_program
-from lightning_control import LED, OrganicEL
+from config import ConfigStore, DEFAULT_SETTING_PATH
+from utils.device_registry import configure_devices, create_device
+from utils.common_functions import HaltableMotor
+from utils.metrics import REGISTRY, MetricsExporter
 from monitor_user import monitor_user
-from posture_check import posture_check
+from posture_check import posture_check, load_pose_backend, close_pose_backend
 from snack_delivery import Delivery, periodic_delivery
-from buildhat import Motor
-import threading
+from shared_state import SharedState
+from session_log import SessionLogWriter
+from runtime import Runtime
 import traceback
 import argparse
 import random
-import time
+import os
 
 argparser = argparse.ArgumentParser(description="Run the main program")
 argparser.add_argument("--verbose", action="store_true", help="Print debug messages")
-args = argparser.parse_args()
-if args.verbose:
-    print("verbose")
-SETTING = input_json("/home/sozo/program/Sozo/config/setting.json")
-CONST, PINS = SETTING.constants, SETTING.pins
+argparser.add_argument("--simulate", action="store_true", help="Use simulated devices instead of the hardware")
+argparser.add_argument("--metrics", action="store_true", help="Record and export latency metrics")
+argparser.add_argument("--config", default=os.environ.get("SOZO_CONFIG", DEFAULT_SETTING_PATH), help="Path of setting.json")
 
-def main():
+def main(argv=None):
+    """Run the program.
+
+    Everything with side effects happens here rather than at import time, so
+    that child processes started with the spawn method, which import this
+    module again, do not parse arguments, load the settings or configure the
+    devices.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        Command line arguments, by default None (sys.argv)
+    """
+    args = argparser.parse_args(argv)
+    if args.verbose:
+        print("verbose")
+    # 設定ファイルの変更は実行中のワーカーに反映される
+    config = ConfigStore(args.config)
+    setting = config.settings
+    const, pins = setting.constants, setting.pins
+    configure_devices("simulated" if args.simulate else setting.devices.default, setting.devices.backends, setting.devices.options)
+    REGISTRY.enabled = args.metrics or setting.metrics.enabled
     try:
         print("初期化開始")
         mode = random.choice(["hiroyuki/", "oka-san/"])
         if args.verbose:
             print(f"mode:{mode}")
-        led = LED()
-        speaker = Speaker(CONST.audio_path+mode)
-        delivery = Delivery(PINS.servo_motor)
-        caterpillar_motor = Motor(PINS.caterpillar_port)
-        right_arm_motor = Motor(PINS.right_arm_port)
-        ultrasonic_sensor = UltrasonicSensor(PINS.ultrasonic_sensor.trigger, PINS.ultrasonic_sensor.echo)
+        led = create_device("led", pins.led.hub, pins.led.port)
+        speaker = create_device("speaker", const.audio_path+mode, max_cache_bytes=const.audio_cache_bytes or None)
+        delivery = Delivery(pins.servo_motor)
+        caterpillar_motor = HaltableMotor(create_device("motor", pins.caterpillar_port))
+        right_arm_motor = HaltableMotor(create_device("motor", pins.right_arm_port))
+        ultrasonic_sensor = create_device("ultrasonic_sensor", pins.ultrasonic_sensor.trigger, pins.ultrasonic_sensor.echo)
+        ultrasonic_sensor.start_sampling()
+        load_pose_backend(const)
+        frame_grabber = create_device("camera", const.camera_id, const.camera_width, const.camera_height, const.frame_buffer_size).start()
         print("初期化終了")
 
         # スレッド間で共有する状態
-        shared_state = {"human_detected": False, "bad_posture": False}
-
-        # スレッドの作成
-        threads = [
-            threading.Thread(target=monitor_user, args=(ultrasonic_sensor, led, speaker, shared_state, CONST, args.verbose)),
-            threading.Thread(target=posture_check, args=(shared_state, speaker, caterpillar_motor, right_arm_motor, ultrasonic_sensor, CONST, args.verbose)),
-            threading.Thread(target=periodic_delivery, args=(shared_state, speaker, delivery, CONST, args.verbose))
-        ]
-
-        for thread in threads:
-            thread.daemon = True
-
-        # スレッドを開始
-        for thread in threads:
-            thread.start()
-        quit_program()
+        shared_state = SharedState()
+        session_log = SessionLogWriter(setting.session_log.directory, setting.session_log.segment_records, setting.session_log.max_segments) if setting.session_log.enabled else None
 
-        # スレッドを待機
-        for thread in threads:
-            thread.join()
+        # ワーカーの登録
+        runtime = Runtime(shared_state, verbose=args.verbose)
+        runtime.add_worker("monitor_user", monitor_user, ultrasonic_sensor, led, speaker, shared_state, const, args.verbose)
+        runtime.add_worker("posture_check", posture_check, shared_state, speaker, caterpillar_motor, right_arm_motor, ultrasonic_sensor, const, args.verbose, frame_grabber, session_log, config)
+        runtime.add_worker("periodic_delivery", periodic_delivery, shared_state, speaker, delivery, const, args.verbose, config)
+        config.start()
+        runtime.on_stop(config.stop)
+        # 終了したらすぐにモーターを止める
+        runtime.on_stop(caterpillar_motor.halt)
+        runtime.on_stop(right_arm_motor.halt)
+        if REGISTRY.enabled:
+            exporter = MetricsExporter(REGISTRY, setting.metrics.interval, setting.metrics.prometheus_path, setting.metrics.jsonl_path).start()
+            runtime.on_stop(exporter.stop)
+        runtime.run()
 
     except KeyboardInterrupt:
         print("プログラムを終了します。")
@@ -61,10 +83,18 @@ def main():
         traceback.print_exc()
     
     finally:
-        time.sleep(10)
-        if 'led' in locals(): led.off()
-        if 'caterpillar_motor' in locals(): caterpillar_motor.stop()
-        if 'right_arm_motor' in locals(): right_arm_motor.stop()
+        if 'led' in locals():
+            try:
+                led.off()
+            except Exception as e:
+                # 消灯に失敗してもモーターの停止は続ける
+                print("Error in led.off (from main):", e)
+            led.close()
+        if 'caterpillar_motor' in locals(): caterpillar_motor.halt()
+        if 'right_arm_motor' in locals(): right_arm_motor.halt()
+        if 'frame_grabber' in locals(): frame_grabber.stop()
+        if locals().get('session_log') is not None: session_log.close()
+        close_pose_backend()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
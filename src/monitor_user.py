@@ -1,5 +1,51 @@
-import time
 import traceback
+from utils import metrics
+
+class PresenceTracker():
+    """Decides whether a user is present from ultrasonic distances.
+
+    A reading closer than the presence distance means the user is present. The
+    user counts as gone only after more than leave_count readings in a row
+    without one, so a single missed echo does not end the session.
+    """
+
+    def __init__(self, presence_distance=150, leave_count=5):
+        """Initialize the tracker with nobody present.
+
+        Parameters
+        ----------
+        presence_distance : float, optional
+            Distance in cm below which a user is present, by default 150
+        leave_count : int, optional
+            Number of readings without a user after which the user has left, by default 5
+        """
+        self.presence_distance = presence_distance
+        self.leave_count = leave_count
+        self.present = False
+        self.left_count = 0
+
+    def update(self, distance):
+        """Update the presence with a new reading.
+
+        Parameters
+        ----------
+        distance : float
+            Distance in cm, or None for a missed echo
+
+        Returns
+        -------
+        tuple
+            (present, changed) where changed is True if the user arrived or left.
+        """
+        was_present = self.present
+        if distance is not None and distance < self.presence_distance:
+            self.present = True
+            self.left_count = 0
+        else:
+            self.left_count += 1
+            if self.left_count > self.leave_count:
+                self.present = False
+        return self.present, self.present != was_present
 
 def monitor_user(ultrasonic_sensor, led, speaker, shared_state, const, verbose=False):
     """Monitor user and update shared state accordingly.
@@ -12,39 +58,37 @@ def monitor_user(ultrasonic_sensor, led, speaker, shared_state, const, verbose=F
         LED object.
     speaker : object of class Speaker
         Speaker object.
-    shared_state : dict
+    shared_state : object of class SharedState
         Shared state between threads.
-    const : AttrDict
+    const : Constants
         Constants object.
     verbose : bool, optional
         Whether to print debug messages. The default is False.
     """
-    left_count = 0
+    presence = PresenceTracker()
     print("ユーザー検知開始")
     print(f"verbose:{verbose}")
-    led_flag = 0
-    while True:
+    while not shared_state.closed:
         try:
             if verbose:
                 print("計測")
-            distance = abs(ultrasonic_sensor.read_distance())
+            with metrics.timer("stage_seconds", stage="distance"):
+                distance = ultrasonic_sensor.latest_distance()
             if verbose:
                 print(f"distance={distance}cm")
-            if distance < 150:
-                shared_state["human_detected"] = True
+            present, changed = presence.update(distance)
+            if changed:
+                metrics.inc("presence_changes_total", present=str(present).lower())
+            if present:
+                shared_state.human_detected = True
+                if changed:
+                    speaker.play_audio(const.start_audio_file, speaker.PRIORITY_GREETING)
                 led.on()
-                if led_flag == 0:
-                    speaker.play_audio(const.start_audio_file)
-                left_count = 0
-                led_flag = 1
-            else:
-                left_count += 1
-                if left_count > 5:
-                    if led_flag == 1:
-                        speaker.play_audio(const.finish_audio_file)
-                    led_flag = 0
-                    shared_state["human_detected"] = False
-                    led.off()
+            elif presence.left_count > presence.leave_count:
+                if changed:
+                    speaker.play_audio(const.finish_audio_file, speaker.PRIORITY_GREETING)
+                shared_state.human_detected = False
+                led.off()
 
         except KeyboardInterrupt:
             print("ユーザーの監視を終了します")
@@ -54,4 +98,4 @@ def monitor_user(ultrasonic_sensor, led, speaker, shared_state, const, verbose=F
             print("Error in monitor_motion (from monitor_user):", e)
             traceback.print_exc()
             
-        time.sleep(0.1)
\ No newline at end of file
+        shared_state.wait_closed(0.1)
@@ -0,0 +1,90 @@
+import time
+import numpy as np
+import cv2
+
+
+class MotionGate():
+    """Cheap scene-change detector that decides when pose inference must run.
+
+    Each camera frame is reduced to a tiny luma image and compared with the
+    luma image of the frame the model last ran on. While the mean absolute
+    difference stays below the threshold, the previous keypoints are reused,
+    up to a maximum staleness.
+    """
+
+    def __init__(self, threshold=3.0, max_staleness=1.0, size=(32, 24)):
+        """Initialize the motion gate.
+
+        Parameters
+        ----------
+        threshold : float, optional
+            Mean absolute luma difference (0-255) that counts as a change, by default 3.0
+        max_staleness : float, optional
+            Maximum time in seconds to reuse the last keypoints, by default 1.0
+        size : tuple, optional
+            (width, height) of the downscaled luma image, by default (32, 24)
+        """
+        self.threshold = threshold
+        self.max_staleness = max_staleness
+        self.size = tuple(size)
+        self._small = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8)
+        self._luma = np.empty((self.size[1], self.size[0]), dtype=np.uint8)
+        self._reference = np.empty_like(self._luma)
+        self._diff = np.empty_like(self._luma)
+        self._last_run = None
+        self.keypoints = None
+        self.checks = 0
+        self.skips = 0
+
+    def should_run(self, frame, timestamp=None):
+        """Decide whether the model has to run on this frame.
+
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            A [height, width, 3] RGB camera frame.
+        timestamp : float, optional
+            ``time.monotonic()`` capture time of the frame, by default now
+
+        Returns
+        -------
+        bool
+            True if the scene changed, the last keypoints are too old or no
+            keypoints exist yet.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.checks += 1
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_RGB2GRAY, dst=self._luma)
+        if self.keypoints is not None and timestamp - self._last_run < self.max_staleness:
+            cv2.absdiff(self._luma, self._reference, dst=self._diff)
+            if cv2.mean(self._diff)[0] < self.threshold:
+                self.skips += 1
+                return False
+        return True
+
+    def update(self, keypoints, timestamp=None):
+        """Remember the keypoints of the frame last passed to should_run().
+
+        Parameters
+        ----------
+        keypoints : numpy.ndarray
+            Keypoints predicted for the frame.
+        timestamp : float, optional
+            ``time.monotonic()`` capture time of the frame, by default now
+        """
+        self.keypoints = keypoints
+        self._last_run = time.monotonic() if timestamp is None else timestamp
+        np.copyto(self._reference, self._luma)
+        return
+
+    def skip_ratio(self):
+        """Return the fraction of frames for which inference was skipped.
+
+        Returns
+        -------
+        float
+            Skipped frames divided by checked frames.
+        """
+        return self.skips / self.checks if self.checks else 0.0
@@ -0,0 +1,223 @@
+import argparse
+import functools
+import multiprocessing
+import os
+import time
+import numpy as np
+import cv2
+
+from pose_backends import check_model, create_backend
+from posture_rules import compile_rules
+from crop_region import CropTracker
+from config import load_settings, DEFAULT_SETTING_PATH
+from utils.simulated_devices import IMAGE_EXTENSIONS
+
+# Backend of each worker process, loaded once by _init_worker().
+_backend = None
+
+
+def list_segments(source, segment_frames=256, stride=1):
+    """Split a video file or image directory into independent work units.
+
+    Parameters
+    ----------
+    source : str
+        Video file or image directory
+    segment_frames : int, optional
+        Number of decoded frames per work unit, by default 256
+    stride : int, optional
+        Analyze every stride-th frame, by default 1
+
+    Returns
+    -------
+    tuple
+        (segments, fps) where each segment is (source, frame indices) and fps
+        is the frame rate of the video, or None for an image directory.
+    """
+    if os.path.isdir(source):
+        images = sorted(os.path.join(source, name) for name in os.listdir(source)
+                        if name.lower().endswith(IMAGE_EXTENSIONS))
+        indices = list(range(0, len(images), stride))
+        segments = [([images[i] for i in indices[start:start + segment_frames]], indices[start:start + segment_frames])
+                    for start in range(0, len(indices), segment_frames)]
+        return segments, None
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise ValueError(f"Failed to open video: {source}")
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or None
+    cap.release()
+    span = segment_frames * stride
+    segments = [(source, list(range(start, min(start + span, count), stride))) for start in range(0, count, span)]
+    return segments, fps
+
+
+def read_segment(segment):
+    """Decode the frames of a work unit.
+
+    Yields
+    ------
+    tuple
+        (frame index, BGR frame)
+    """
+    source, indices = segment
+    if isinstance(source, list):
+        for path, index in zip(source, indices):
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield index, frame
+        return
+    if not indices:
+        return
+    cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, indices[0])
+    wanted = set(indices)
+    index = indices[0]
+    while index <= indices[-1]:
+        # 間引くフレームはデコードせずに読み飛ばす
+        if index in wanted:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield index, frame
+        elif not cap.grab():
+            break
+        index += 1
+    cap.release()
+
+
+def _init_worker(backend_name, model_path, num_threads):
+    global _backend
+    # 各プロセスで1スレッドずつ推論し、プロセス数でコアを使い切る
+    cv2.setNumThreads(1)
+    _backend = create_backend(backend_name, model_path, num_threads)
+
+
+def analyze_segment(segment, batch_size=8):
+    """Decode, letterbox and run batched inference on one work unit.
+
+    Frames are letterboxed to the model input like ``resize_with_pad``, so the
+    keypoints have the same coordinates as in detect(). Crop tracking is not
+    used, so every work unit can be processed independently.
+
+    Parameters
+    ----------
+    segment : tuple
+        Work unit from list_segments()
+    batch_size : int, optional
+        Number of frames per inference, by default 8
+
+    Returns
+    -------
+    tuple
+        (frame indices, keypoints) as [N] int32 and [N, 17, 3] float32 arrays.
+    """
+    size = _backend.input_size
+    letterbox = CropTracker(size)
+    batch = np.empty((batch_size, size, size, 3), dtype=np.uint8)
+    indices, keypoints = [], []
+    count = 0
+    for index, frame in read_segment(segment):
+        # BGRからRGBへの変換は入力サイズに縮小してから行う
+        letterbox.crop(frame, dst=batch[count])
+        cv2.cvtColor(batch[count], cv2.COLOR_BGR2RGB, dst=batch[count])
+        indices.append(index)
+        count += 1
+        if count == batch_size:
+            keypoints.append(_backend.predict_batch(batch))
+            count = 0
+    if count:
+        keypoints.append(_backend.predict_batch(batch[:count]))
+    if not indices:
+        return np.zeros(0, np.int32), np.zeros((0, 17, 3), np.float32)
+    return np.asarray(indices, dtype=np.int32), np.concatenate(keypoints).astype(np.float32)
+
+
+def analyze(const, source, output, workers=None, batch_size=8, segment_frames=256, stride=1, verbose=False):
+    """Analyze a recorded session and write the per-frame results.
+
+    The output is a compressed ``.npz`` file with one array per column:
+    frame index, time, keypoints, rule bitmask and rule margins, plus the rule
+    names and groups needed to decode the bitmask.
+
+    Parameters
+    ----------
+    const : Constants
+        Constants object, with the pose backend settings and posture rules.
+    source : str
+        Video file or image directory
+    output : str
+        Path of the .npz output
+    workers : int, optional
+        Number of worker processes, by default None (one per CPU core)
+    batch_size : int, optional
+        Number of frames per inference, by default 8
+    segment_frames : int, optional
+        Number of frames per work unit, by default 256
+    stride : int, optional
+        Analyze every stride-th frame, by default 1
+    verbose : bool, optional
+        Print the progress, by default False
+
+    Returns
+    -------
+    dict
+        Number of frames, elapsed time and frames per second.
+    """
+    check_model(const.pose_backend, const.pose_model_path)
+    start = time.monotonic()
+    workers = workers or os.cpu_count() or 1
+    segments, fps = list_segments(source, segment_frames, stride)
+    results = []
+    with multiprocessing.Pool(workers, _init_worker, (const.pose_backend, const.pose_model_path, 1)) as pool:
+        for i, result in enumerate(pool.imap(functools.partial(analyze_segment, batch_size=batch_size), segments)):
+            results.append(result)
+            if verbose:
+                print(f"segment {i + 1}/{len(segments)}")
+    if results:
+        frame_index = np.concatenate([indices for indices, _ in results])
+        keypoints = np.concatenate([points for _, points in results])
+    else:
+        frame_index, keypoints = np.zeros(0, np.int32), np.zeros((0, 17, 3), np.float32)
+    rules = compile_rules(const)
+    mask, margins = rules.evaluate_batch(keypoints)
+    times = frame_index / fps if fps else np.full(len(frame_index), np.nan)
+    np.savez_compressed(
+        output,
+        frame_index=frame_index,
+        time=times.astype(np.float32),
+        keypoints=keypoints.astype(np.float16),
+        violations=mask.astype(np.uint32),
+        margins=margins.astype(np.float16),
+        rule_names=np.array(rules.names),
+        rule_groups=np.array([next(group for group, bits in rules.groups.items() if bits >> i & 1) for i in range(len(rules.names))]),
+        source=np.array(source),
+    )
+    elapsed = time.monotonic() - start
+    return {"frames": len(frame_index), "elapsed_s": elapsed, "fps": len(frame_index) / elapsed if elapsed > 0 else 0.0}
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Analyze the posture in a recorded video or image directory")
+    argparser.add_argument("source", help="Video file or image directory")
+    argparser.add_argument("--output", default="posture_analysis.npz", help="Path of the .npz output")
+    argparser.add_argument("--setting", default=DEFAULT_SETTING_PATH, help="Path of setting.json")
+    argparser.add_argument("--backend", help="Pose backend overriding the settings")
+    argparser.add_argument("--model", help="Pose model path overriding the settings")
+    argparser.add_argument("--workers", type=int, default=None, help="Number of worker processes (CPU cores by default)")
+    argparser.add_argument("--batch-size", type=int, default=8, help="Number of frames per inference")
+    argparser.add_argument("--segment-frames", type=int, default=256, help="Number of frames per work unit")
+    argparser.add_argument("--stride", type=int, default=1, help="Analyze every n-th frame")
+    argparser.add_argument("--verbose", action="store_true", help="Print the progress")
+    args = argparser.parse_args()
+    const = load_settings(args.setting).constants
+    if args.backend:
+        const = const.replace(pose_backend=args.backend)
+    if args.model:
+        const = const.replace(pose_model_path=args.model)
+    summary = analyze(const, args.source, args.output, args.workers, args.batch_size, args.segment_frames, args.stride, args.verbose)
+    print(f"{summary['frames']} frames in {summary['elapsed_s']:.1f}s ({summary['fps']:.1f}fps), written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import collections
+import threading
+import numpy as np
+import cv2
+
+# Maps bones to a matplotlib color name.
+KEYPOINT_EDGE_INDS_TO_COLOR = {
+    (0, 1): 'm',
+    (0, 2): 'c',
+    (1, 3): 'm',
+    (2, 4): 'c',
+    (0, 5): 'm',
+    (0, 6): 'c',
+    (5, 7): 'm',
+    (7, 9): 'm',
+    (6, 8): 'c',
+    (8, 10): 'c',
+    (5, 6): 'y',
+    (5, 11): 'm',
+    (6, 12): 'c',
+    (11, 12): 'y',
+    (11, 13): 'm',
+    (13, 15): 'm',
+    (12, 14): 'c',
+    (14, 16): 'c'
+}
+
+# RGB values of the matplotlib single-letter colors.
+COLOR_RGB = {
+    'm': (191, 0, 191),
+    'c': (0, 191, 191),
+    'y': (191, 191, 0),
+    'b': (0, 0, 255),
+}
+KEYPOINT_COLOR_RGB = (255, 20, 147)
+
+
+class OverlayRenderer():
+    """Draws MoveNet keypoints and skeleton edges onto a frame with cv2 primitives.
+    """
+
+    def __init__(self, keypoint_threshold=0.11):
+        """Initialize the renderer.
+
+        Parameters
+        ----------
+        keypoint_threshold : float, optional
+            Minimum confidence score for a keypoint to be drawn, by default 0.11
+        """
+        self.keypoint_threshold = keypoint_threshold
+        self._edges = np.array(list(KEYPOINT_EDGE_INDS_TO_COLOR), dtype=np.intp)
+        self._edge_colors = [COLOR_RGB[color] for color in KEYPOINT_EDGE_INDS_TO_COLOR.values()]
+
+    def draw(self, image, keypoints_with_scores, crop_region=None):
+        """Draw the keypoint predictions onto the image in place.
+
+        Parameters
+        ----------
+        image : numpy.ndarray
+            A writable [height, width, 3] RGB image.
+        keypoints_with_scores : numpy.ndarray
+            A [1, 1, 17, 3] or [17, 3] array returned from the MoveNet model,
+            normalized to the frame padded to a square as by ``resize_with_pad``.
+        crop_region : dict, optional
+            Crop region in the same normalized coordinates to draw as a box, by default None
+
+        Returns
+        -------
+        numpy.ndarray
+            The same image with the overlay drawn on it.
+        """
+        height, width = image.shape[:2]
+        side = max(height, width)
+        offset_x = (side - width) / 2
+        offset_y = (side - height) / 2
+        keypoints = np.reshape(keypoints_with_scores, (-1, 3))[:17]
+        points = np.empty((17, 2), dtype=np.int32)
+        points[:, 0] = keypoints[:, 1] * side - offset_x
+        points[:, 1] = keypoints[:, 0] * side - offset_y
+        visible = keypoints[:, 2] > self.keypoint_threshold
+        thickness = max(1, round(min(height, width) / 160))
+
+        edge_visible = visible[self._edges[:, 0]] & visible[self._edges[:, 1]]
+        for (start, end), color, draw in zip(self._edges, self._edge_colors, edge_visible):
+            if draw:
+                cv2.line(image, tuple(points[start]), tuple(points[end]), color, thickness, cv2.LINE_AA)
+        for point in points[visible]:
+            cv2.circle(image, tuple(point), thickness + 2, KEYPOINT_COLOR_RGB, -1, cv2.LINE_AA)
+
+        if crop_region is not None:
+            top_left = (int(crop_region['x_min'] * side - offset_x), int(crop_region['y_min'] * side - offset_y))
+            bottom_right = (int(crop_region['x_max'] * side - offset_x), int(crop_region['y_max'] * side - offset_y))
+            cv2.rectangle(image, top_left, bottom_right, COLOR_RGB['b'], 1)
+        return image
+
+
+class AsyncImageWriter():
+    """Renders overlays and writes them to disk on a background thread.
+
+    Frames are copied into a fixed pool of preallocated buffers. When every
+    buffer is queued, the oldest pending frame is dropped so that the caller
+    never waits for the disk.
+    """
+
+    def __init__(self, renderer=None, max_queue=2):
+        """Start the writer thread.
+
+        Parameters
+        ----------
+        renderer : object of class OverlayRenderer, optional
+            Renderer used to draw the overlay, by default a new OverlayRenderer
+        max_queue : int, optional
+            Maximum number of pending frames, by default 2
+        """
+        self.renderer = OverlayRenderer() if renderer is None else renderer
+        self.max_queue = max(int(max_queue), 1)
+        self._free = []
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._bgr = None
+        self._running = True
+        self.written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="AsyncImageWriter", daemon=True)
+        self._thread.start()
+
+    def _take_buffer(self, shape):
+        """Return a free buffer of the given shape, dropping the oldest pending frame if needed.
+        """
+        while self._free:
+            buffer = self._free.pop()
+            if buffer.shape == shape:
+                return buffer
+        if len(self._pending) >= self.max_queue:
+            buffer = self._pending.popleft()[0]
+            self.dropped += 1
+            if buffer.shape == shape:
+                return buffer
+        return np.empty(shape, dtype=np.uint8)
+
+    def submit(self, image, keypoints_with_scores, output_path, crop_region=None):
+        """Queue a frame to be rendered and written.
+
+        Parameters
+        ----------
+        image : array_like
+            A [height, width, 3] RGB image. It is copied, so the caller may reuse it.
+        keypoints_with_scores : numpy.ndarray
+            A [1, 1, 17, 3] or [17, 3] array returned from the MoveNet model.
+        output_path : str
+            Path to write the image to.
+        crop_region : dict, optional
+            Crop region to draw, by default None
+        """
+        image = np.asarray(image)
+        with self._cond:
+            buffer = self._take_buffer(image.shape)
+            np.copyto(buffer, image, casting='unsafe')
+            keypoints = np.array(keypoints_with_scores, dtype=np.float32).reshape(-1, 3)[:17]
+            self._pending.append((buffer, keypoints, output_path, crop_region))
+            self._cond.notify()
+        return
+
+    def _run(self):
+        """Render and write queued frames until closed.
+        """
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                buffer, keypoints, output_path, crop_region = self._pending.popleft()
+            try:
+                self.renderer.draw(buffer, keypoints, crop_region)
+                if self._bgr is None or self._bgr.shape != buffer.shape:
+                    self._bgr = np.empty_like(buffer)
+                cv2.cvtColor(buffer, cv2.COLOR_RGB2BGR, dst=self._bgr)
+                cv2.imwrite(output_path, self._bgr)
+                self.written += 1
+            except Exception as e:
+                print("Error in AsyncImageWriter:", e)
+            with self._cond:
+                self._free.append(buffer)
+
+    def close(self, timeout=1):
+        """Write the remaining frames and stop the writer thread.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Time to wait for the writer thread in seconds, by default 1
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout)
+        return
@@ -0,0 +1,235 @@
+import os
+import numpy as np
+
+from config import ConfigError
+
+
+class PoseBackend():
+    """Base class for MoveNet inference backends.
+
+    A backend is created once at startup, warmed up, and then called with a
+    [1, input_size, input_size, 3] image for every frame.
+    """
+
+    input_size = 192
+    input_dtype = np.int32
+    # Whether model_path must be a local model file.
+    requires_model_file = False
+
+    def __call__(self, input_image):
+        """Run inference on a single image.
+
+        Parameters
+        ----------
+        input_image : array_like
+            A [1, input_size, input_size, 3] image.
+
+        Returns
+        -------
+        numpy.ndarray
+            A [1, 1, 17, 3] float array with the keypoint coordinates and scores.
+        """
+        raise NotImplementedError
+
+    def predict_batch(self, images):
+        """Run inference on a batch of images.
+
+        The default implementation runs the images one at a time.
+
+        Parameters
+        ----------
+        images : array_like
+            A [N, input_size, input_size, 3] batch of images.
+
+        Returns
+        -------
+        numpy.ndarray
+            A [N, 17, 3] float array with the keypoint coordinates and scores.
+        """
+        return np.stack([self(image[np.newaxis])[0, 0] for image in images]) if len(images) else np.zeros((0, 17, 3), np.float32)
+
+    def warmup(self, runs=2):
+        """Run inference on blank images so that the first real frame is not slow.
+
+        Parameters
+        ----------
+        runs : int, optional
+            Number of warm-up inferences, by default 2
+        """
+        dummy = np.zeros((1, self.input_size, self.input_size, 3), dtype=self.input_dtype)
+        for _ in range(runs):
+            self(dummy)
+        return
+
+
+class SavedModelBackend(PoseBackend):
+    """TensorFlow SavedModel backend (the original TF Hub MoveNet model).
+    """
+
+    def __init__(self, model_path, num_threads=None, input_size=192):
+        """Load the SavedModel.
+
+        Parameters
+        ----------
+        model_path : str
+            Local directory of the SavedModel or a TF Hub handle.
+        num_threads : int, optional
+            Number of intra-op threads, by default None (TensorFlow default)
+        input_size : int, optional
+            Input resolution of the model, by default 192
+        """
+        import tensorflow as tf
+        import tensorflow_hub as hub
+        if num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            except RuntimeError:
+                print("TensorFlow is already initialized, ignoring num_threads.")
+        self._tf = tf
+        self._model = hub.load(model_path).signatures['serving_default']
+        self.input_size = input_size
+        self.input_dtype = np.int32
+
+    def __call__(self, input_image):
+        # SavedModel format expects tensor type of int32.
+        input_image = self._tf.cast(input_image, dtype=self._tf.int32)
+        outputs = self._model(input_image)
+        # Output is a [1, 1, 17, 3] tensor.
+        return outputs['output_0'].numpy()
+
+
+def _load_tflite_interpreter():
+    """Return the TFLite Interpreter class, preferring the small tflite_runtime package.
+    """
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        from tensorflow.lite import Interpreter
+    return Interpreter
+
+
+class TFLiteBackend(PoseBackend):
+    """TFLite backend for the int8 quantized MoveNet model.
+
+    TFLite applies the XNNPACK delegate by default on CPU, and ``num_threads``
+    sizes its thread pool.
+    """
+
+    requires_model_file = True
+
+    def __init__(self, model_path, num_threads=None):
+        """Load the TFLite model and allocate its tensors.
+
+        Parameters
+        ----------
+        model_path : str
+            Path of the .tflite model file.
+        num_threads : int, optional
+            Number of inference threads, by default None (TFLite default)
+        """
+        Interpreter = _load_tflite_interpreter()
+        self._interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        input_details = self._interpreter.get_input_details()[0]
+        self._input_index = input_details['index']
+        self._output_index = self._interpreter.get_output_details()[0]['index']
+        self.input_size = int(input_details['shape'][1])
+        self.input_dtype = input_details['dtype']
+        self._batch_size = 1
+        self._batchable = True
+
+    def __call__(self, input_image):
+        if self._batch_size != 1:
+            self._resize_batch(1)
+        input_image = np.asarray(input_image)
+        if input_image.dtype != self.input_dtype:
+            input_image = input_image.astype(self.input_dtype)
+        self._interpreter.set_tensor(self._input_index, input_image)
+        self._interpreter.invoke()
+        # Output is a [1, 1, 17, 3] tensor.
+        return self._interpreter.get_tensor(self._output_index)
+
+    def _resize_batch(self, batch_size):
+        """Resize the input tensor to the batch size, returning False if the model does not allow it.
+        """
+        if batch_size == self._batch_size:
+            return True
+        try:
+            self._interpreter.resize_tensor_input(self._input_index, [batch_size, self.input_size, self.input_size, 3])
+            self._interpreter.allocate_tensors()
+        except (RuntimeError, ValueError):
+            self._interpreter.resize_tensor_input(self._input_index, [1, self.input_size, self.input_size, 3])
+            self._interpreter.allocate_tensors()
+            self._batch_size = 1
+            self._batchable = False
+            return False
+        self._batch_size = batch_size
+        return True
+
+    def predict_batch(self, images):
+        """Run one batched inference, or one per image if the model has a fixed batch size.
+        """
+        images = np.asarray(images)
+        if not self._batchable or len(images) <= 1 or not self._resize_batch(len(images)):
+            if self._batch_size != 1:
+                self._resize_batch(1)
+            return super().predict_batch(images)
+        if images.dtype != self.input_dtype:
+            images = images.astype(self.input_dtype)
+        self._interpreter.set_tensor(self._input_index, images)
+        self._interpreter.invoke()
+        # Output is a [N, 1, 17, 3] tensor.
+        return self._interpreter.get_tensor(self._output_index)[:, 0]
+
+
+BACKENDS = {
+    "tflite": TFLiteBackend,
+    "saved_model": SavedModelBackend,
+}
+
+
+def check_model(name, model_path):
+    """Check that the backend exists and that its model file is present and not empty.
+
+    Parameters
+    ----------
+    name : str
+        Backend name, one of BACKENDS.
+    model_path : str
+        Path of the model to load.
+
+    Raises
+    ------
+    ConfigError
+        If the backend is unknown or its model file is missing or empty.
+    """
+    if name not in BACKENDS:
+        raise ConfigError(f"Unknown pose backend: {name}")
+    if not BACKENDS[name].requires_model_file:
+        return
+    if not os.path.isfile(model_path):
+        raise ConfigError(f"pose_model_path {model_path} does not exist; download the MoveNet model there or change pose_model_path")
+    if os.path.getsize(model_path) == 0:
+        raise ConfigError(f"pose_model_path {model_path} is empty; download the MoveNet model there or change pose_model_path")
+    return
+
+
+def create_backend(name, model_path, num_threads=None):
+    """Create a pose-inference backend by name.
+
+    Parameters
+    ----------
+    name : str
+        Backend name, one of BACKENDS.
+    model_path : str
+        Path of the model to load.
+    num_threads : int, optional
+        Number of inference threads, by default None
+
+    Returns
+    -------
+    PoseBackend
+        The loaded backend.
+    """
+    check_model(name, model_path)
+    return BACKENDS[name](model_path, num_threads=num_threads)
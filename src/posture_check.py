@@ -1,21 +1,16 @@
-import tensorflow as tf
-import tensorflow_hub as hub
-from tensorflow_docs.vis import embed
 import numpy as np
 import cv2
 import time
 import traceback
 
-# Import matplotlib libraries
-from matplotlib import pyplot as plt
-from matplotlib.collections import LineCollection
-import matplotlib.patches as patches
-
-# Some modules to display an animation using imageio.
-import imageio
-from IPython.display import HTML, display
-
-from utils.common_functions import Camera
+from utils.device_registry import create_device
+from utils import metrics
+from pose_backends import create_backend
+from inference_process import InferenceProcess
+from posture_rules import KEYPOINT_NAMES, compile_rules
+from motion_gate import MotionGate
+from crop_region import CropTracker
+from preprocess import InputBuffer
 
 
 # Dictionary that maps from joint names to keypoint indices.
@@ -39,175 +34,34 @@ KEYPOINT_DICT = {
     'right_ankle': 16
 }
 
-# Maps bones to a matplotlib color name.
-KEYPOINT_EDGE_INDS_TO_COLOR = {
-    (0, 1): 'm',
-    (0, 2): 'c',
-    (1, 3): 'm',
-    (2, 4): 'c',
-    (0, 5): 'm',
-    (0, 6): 'c',
-    (5, 7): 'm',
-    (7, 9): 'm',
-    (6, 8): 'c',
-    (8, 10): 'c',
-    (5, 6): 'y',
-    (5, 11): 'm',
-    (6, 12): 'c',
-    (11, 12): 'y',
-    (11, 13): 'm',
-    (13, 15): 'm',
-    (12, 14): 'c',
-    (14, 16): 'c'
-}
-
-def _keypoints_and_edges_for_display(keypoints_with_scores,
-                                     height,
-                                     width,
-                                     keypoint_threshold=0.11):
-  """Returns high confidence keypoints and edges for visualization.
-
-  Args:
-    keypoints_with_scores: A numpy array with shape [1, 1, 17, 3] representing
-      the keypoint coordinates and scores returned from the MoveNet model.
-    height: height of the image in pixels.
-    width: width of the image in pixels.
-    keypoint_threshold: minimum confidence score for a keypoint to be
-      visualized.
-
-  Returns:
-    A (keypoints_xy, edges_xy, edge_colors) containing:
-      * the coordinates of all keypoints of all detected entities;
-      * the coordinates of all skeleton edges of all detected entities;
-      * the colors in which the edges should be plotted.
-  """
-  keypoints_all = []
-  keypoint_edges_all = []
-  edge_colors = []
-  num_instances, _, _, _ = keypoints_with_scores.shape
-  for idx in range(num_instances):
-    kpts_x = keypoints_with_scores[0, idx, :, 1]
-    kpts_y = keypoints_with_scores[0, idx, :, 0]
-    kpts_scores = keypoints_with_scores[0, idx, :, 2]
-    kpts_absolute_xy = np.stack(
-        [width * np.array(kpts_x), height * np.array(kpts_y)], axis=-1)
-    kpts_above_thresh_absolute = kpts_absolute_xy[
-        kpts_scores > keypoint_threshold, :]
-    keypoints_all.append(kpts_above_thresh_absolute)
-
-    for edge_pair, color in KEYPOINT_EDGE_INDS_TO_COLOR.items():
-      if (kpts_scores[edge_pair[0]] > keypoint_threshold and
-          kpts_scores[edge_pair[1]] > keypoint_threshold):
-        x_start = kpts_absolute_xy[edge_pair[0], 0]
-        y_start = kpts_absolute_xy[edge_pair[0], 1]
-        x_end = kpts_absolute_xy[edge_pair[1], 0]
-        y_end = kpts_absolute_xy[edge_pair[1], 1]
-        line_seg = np.array([[x_start, y_start], [x_end, y_end]])
-        keypoint_edges_all.append(line_seg)
-        edge_colors.append(color)
-  if keypoints_all:
-    keypoints_xy = np.concatenate(keypoints_all, axis=0)
-  else:
-    keypoints_xy = np.zeros((0, 17, 2))
-
-  if keypoint_edges_all:
-    edges_xy = np.stack(keypoint_edges_all, axis=0)
-  else:
-    edges_xy = np.zeros((0, 2, 2))
-  return keypoints_xy, edges_xy, edge_colors
-
-
-def draw_prediction_on_image(
-    image, keypoints_with_scores, crop_region=None, close_figure=False,
-    output_image_height=None):
-  """Draws the keypoint predictions on image.
+model_name = "movenet_lightning_int8"
+backend = None
+input_size = 192
 
-  Args:
-    image: A numpy array with shape [height, width, channel] representing the
-      pixel values of the input image.
-    keypoints_with_scores: A numpy array with shape [1, 1, 17, 3] representing
-      the keypoint coordinates and scores returned from the MoveNet model.
-    crop_region: A dictionary that defines the coordinates of the bounding box
-      of the crop region in normalized coordinates (see the init_crop_region
-      function below for more detail). If provided, this function will also
-      draw the bounding box on the image.
-    output_image_height: An integer indicating the height of the output image.
-      Note that the image aspect ratio will be the same as the input image.
+def load_pose_backend(const):
+	"""Loads and warms up the pose-inference backend selected in the settings.
 
-  Returns:
-    A numpy array with shape [out_height, out_width, channel] representing the
-    image overlaid with keypoint predictions.
-  """
-  height, width, channel = image.shape
-  aspect_ratio = float(width) / height
-  fig, ax = plt.subplots(figsize=(12 * aspect_ratio, 12))
-  # To remove the huge white borders
-  fig.tight_layout(pad=0)
-  ax.margins(0)
-  ax.set_yticklabels([])
-  ax.set_xticklabels([])
-  plt.axis('off')
-
-  im = ax.imshow(image)
-  line_segments = LineCollection([], linewidths=(4), linestyle='solid')
-  ax.add_collection(line_segments)
-  # Turn off tick labels
-  scat = ax.scatter([], [], s=60, color='#FF1493', zorder=3)
-
-  (keypoint_locs, keypoint_edges,
-   edge_colors) = _keypoints_and_edges_for_display(
-       keypoints_with_scores, height, width)
-
-  line_segments.set_segments(keypoint_edges)
-  line_segments.set_color(edge_colors)
-  if keypoint_edges.shape[0]:
-    line_segments.set_segments(keypoint_edges)
-    line_segments.set_color(edge_colors)
-  if keypoint_locs.shape[0]:
-    scat.set_offsets(keypoint_locs)
-
-  if crop_region is not None:
-    xmin = max(crop_region['x_min'] * width, 0.0)
-    ymin = max(crop_region['y_min'] * height, 0.0)
-    rec_width = min(crop_region['x_max'], 0.99) * width - xmin
-    rec_height = min(crop_region['y_max'], 0.99) * height - ymin
-    rect = patches.Rectangle(
-        (xmin,ymin),rec_width,rec_height,
-        linewidth=1,edgecolor='b',facecolor='none')
-    ax.add_patch(rect)
-
-  fig.canvas.draw()
-  image_from_plot = np.frombuffer(fig.canvas.tostring_rgb(), dtype=np.uint8)
-  image_from_plot = image_from_plot.reshape(
-      fig.canvas.get_width_height()[::-1] + (3,))
-  plt.close(fig)
-  if output_image_height is not None:
-    output_image_width = int(output_image_height / height * width)
-    image_from_plot = cv2.resize(
-        image_from_plot, dsize=(output_image_width, output_image_height),
-         interpolation=cv2.INTER_CUBIC)
-  return image_from_plot
-
-def to_gif(images, duration):
-  """Converts image sequence (4D numpy array) to gif."""
-  imageio.mimsave('./animation.gif', images, duration=duration)
-  return embed.embed_file('./animation.gif')
-
-def progress(value, max=100):
-  return HTML("""
-      <progress
-          value='{value}'
-          max='{max}',
-          style='width: 100%'
-      >
-          {value}
-      </progress>
-  """.format(value=value, max=max))
+	Args:
+		const: Constants object with pose_backend, pose_model_path,
+			inference_threads and pose_inference_process.
 
+	Returns:
+		The loaded PoseBackend.
+	"""
+	global backend, input_size
+	if const.pose_inference_process:
+		backend = InferenceProcess(const.pose_backend, const.pose_model_path, const.inference_threads).start()
+	else:
+		backend = create_backend(const.pose_backend, const.pose_model_path, const.inference_threads)
+		backend.warmup()
+	input_size = backend.input_size
+	return backend
 
-model_name = "movenet_lightning_int8"
-module = hub.load("https://tfhub.dev/google/movenet/singlepose/lightning/4")
-input_size = 192
+def close_pose_backend():
+	"""Stops the inference process of the pose backend, if there is one.
+	"""
+	if hasattr(backend, "close"):
+		backend.close()
 
 def movenet(input_image):
 	"""Runs detection on an input image.
@@ -221,67 +75,142 @@ def movenet(input_image):
 		A [1, 1, 17, 3] float numpy array representing the predicted keypoint
 		coordinates and scores.
 	"""
-	model = module.signatures['serving_default']
+	if backend is None:
+		raise RuntimeError("Pose backend is not loaded. Call load_pose_backend() first.")
+	return backend(input_image)
 
-	# SavedModel format expects tensor type of int32.
-	input_image = tf.cast(input_image, dtype=tf.int32)
-	# Run model inference.
-	outputs = model(input_image)
-	# Output is a [1, 1, 17, 3] tensor.
-	keypoints_with_scores = outputs['output_0'].numpy()
-	return keypoints_with_scores
+_default_frame_grabber = None
+_overlay_writer = None
+_input_buffer = None
 
-def detect(image_path=None, output_path=None):
-	"""Detects keypoints on an image.
+def get_input_buffer():
+	"""Returns the preallocated model input, matching the loaded backend.
 
-  Args:
-      image_path: Path to the image.
-      output_path: Path to save the output image.
+	Returns:
+		An InputBuffer with the input size and dtype of the backend, or the
+		next shared slot of an InferenceProcess.
+	"""
+	global _input_buffer
+	if hasattr(backend, "input_buffer"):
+		# Preprocess straight into the shared memory of the inference process.
+		return backend.input_buffer()
+	dtype = getattr(backend, "input_dtype", np.uint8)
+	if _input_buffer is None or _input_buffer.input_size != input_size or _input_buffer.dtype != dtype:
+		_input_buffer = InputBuffer(input_size, dtype)
+	return _input_buffer
+
+def get_frame_grabber():
+	"""Returns the shared frame grabber, starting it on first use.
 
-  Returns:
-      A dictionary containing the detected keypoints.
+	Returns:
+		A running FrameGrabber used when no grabber is passed to detect().
+	"""
+	global _default_frame_grabber
+	if _default_frame_grabber is None:
+		_default_frame_grabber = create_device("camera").start()
+	return _default_frame_grabber
+
+def get_overlay_writer():
+	"""Returns the shared asynchronous overlay writer, starting it on first use.
+
+	Returns:
+		An AsyncImageWriter that renders and saves the verbose output image.
+	"""
+	global _overlay_writer
+	if _overlay_writer is None:
+		from overlay import AsyncImageWriter
+		_overlay_writer = AsyncImageWriter()
+	return _overlay_writer
+
+def detect_keypoints(image_path=None, output_path=None, frame_grabber=None, motion_gate=None, crop_tracker=None, verbose=False):
+	"""Detects keypoints on an image and returns the raw MoveNet output.
+
+	Args:
+		image_path: Path to the image.
+		output_path: Path to save the output image.
+		frame_grabber: FrameGrabber to take the newest camera frame from. The
+			shared grabber is used when omitted.
+		motion_gate: MotionGate that reuses the last keypoints while the camera
+			scene is static. Inference always runs when omitted.
+		crop_tracker: CropTracker that crops camera frames around the person
+			found in the previous frame. The whole frame is letterboxed when
+			omitted.
+		verbose: Print the detection time of every frame. It is always
+			recorded in the stage_seconds metric.
+
+	Returns:
+		A [17, 3] float numpy array of (y, x, score) per keypoint, normalized to
+		the frame padded to a square.
 	"""
 	start = time.time()
 	if image_path:
-			image = tf.io.read_file(image_path)
-			image = tf.image.decode_jpeg(image)
+		frame = cv2.imread(image_path)
+		if frame is None:
+			raise RuntimeError(f"Failed to read image: {image_path}")
+		frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+	else:
+		if frame_grabber is None:
+			frame_grabber = get_frame_grabber()
+		with metrics.timer("stage_seconds", stage="capture"):
+			frame, timestamp = frame_grabber.read()
+		if frame is None:
+			raise RuntimeError("No camera frame available.")
+		if motion_gate is not None and not motion_gate.should_run(frame, timestamp):
+			metrics.inc("inference_skips_total")
+			return motion_gate.keypoints
+
+	crop_region = None
+	if crop_tracker is not None and not image_path:
+		# Crop around the person from the previous frame and resize in one step.
+		crop_region = crop_tracker.crop_region
+		with metrics.timer("stage_seconds", stage="preprocess"):
+			input_image = get_input_buffer().crop(crop_tracker, frame)
+		with metrics.timer("stage_seconds", stage="inference"):
+			keypoints_with_scores = movenet(input_image)
+		crop_tracker.update(keypoints_with_scores[0, 0])
 	else:
-			camera = Camera()
-			image = camera.capt_picture(192, 192)
-			image = tf.convert_to_tensor(image)
-			
-	# Resize and pad the image to keep the aspect ratio and fit the expected size.
-	input_image = tf.expand_dims(image, axis=0)
-	input_image = tf.image.resize_with_pad(input_image, input_size, input_size)
-
-	# Run model inference.
-	keypoints_with_scores = movenet(input_image)
-	keypoints = {list(KEYPOINT_DICT)[i]: keypoints_with_scores[0][0][i] for i in range(len(KEYPOINT_DICT))}
+		# Resize and pad the image into the preallocated input to keep the
+		# aspect ratio and fit the expected size.
+		with metrics.timer("stage_seconds", stage="preprocess"):
+			input_image = get_input_buffer().letterbox(frame)
+
+		# Run model inference.
+		with metrics.timer("stage_seconds", stage="inference"):
+			keypoints_with_scores = movenet(input_image)
+	if motion_gate is not None and not image_path:
+		motion_gate.update(keypoints_with_scores[0, 0], timestamp)
 
 	if output_path:
-			# Visualize the predictions with image.
-			display_image = tf.expand_dims(image, axis=0)
-			display_image = tf.cast(tf.image.resize_with_pad(
-					display_image, 1280, 1280), dtype=tf.int32)
-			output_overlay = draw_prediction_on_image(
-					np.squeeze(display_image.numpy(), axis=0), keypoints_with_scores)
-			plt.figure(figsize=(5, 5))
-			plt.imshow(output_overlay)
-			_ = plt.axis('off')
-			plt.savefig(output_path, bbox_inches='tight', pad_inches=0)
-			plt.close()
+		# Render and save the overlay on the writer thread.
+		get_overlay_writer().submit(frame, keypoints_with_scores, output_path, crop_region)
 
 	end = time.time()
-	print(f"time={round(end-start, 4)}s")
+	metrics.observe("stage_seconds", end - start, stage="detect")
+	if verbose:
+		print(f"time={round(end-start, 4)}s")
+
+	return keypoints_with_scores[0, 0]
 
-	return keypoints
+def detect(image_path=None, output_path=None, frame_grabber=None):
+	"""Detects keypoints on an image.
 
-def posture_check(shared_state, speaker, caterpillar_motor, right_arm_motor, ultrasonic_sensor, const, verbose=False):
+  Args:
+      image_path: Path to the image.
+      output_path: Path to save the output image.
+      frame_grabber: FrameGrabber to take the newest camera frame from. The
+        shared grabber is used when omitted.
+
+  Returns:
+      A dictionary containing the detected keypoints.
+	"""
+	return dict(zip(KEYPOINT_NAMES, detect_keypoints(image_path, output_path, frame_grabber)))
+
+def posture_check(shared_state, speaker, caterpillar_motor, right_arm_motor, ultrasonic_sensor, const, verbose=False, frame_grabber=None, session_log=None, config=None):
   """Check the posture of the detected human and take action accordingly.
 
   Parameters
   ----------
-  shared_state : dict
+  shared_state : object of class SharedState
       Shared state between threads.
   speaker : object of class Speaker
       Speaker object.
@@ -291,78 +220,114 @@ def posture_check(shared_state, speaker, caterpillar_motor, right_arm_motor, ult
       Right arm motor object.
   ultrasonic_sensor : object of class UltrasonicSensor
       Ultrasonic sensor object.
-  const : AttrDict
+  const : Constants
       Constants object.
   verbose : bool, optional
       Whether to print debug messages. The default is False.
+  frame_grabber : object of class FrameGrabber, optional
+      Frame grabber to read camera frames from. The shared grabber is used when omitted.
+  session_log : object of class SessionLogWriter, optional
+      Log that receives the keypoints and verdict of every frame. Nothing is logged when omitted.
+  config : object of class ConfigStore, optional
+      Store whose reloaded constants replace const and recompile the rules. const is fixed when omitted.
   """
   bad_posture_flag = 0
   continual_bad_posture_flag = 0
-  while True:
+  rules = compile_rules(const)
+  motion_gate = MotionGate(const.motion_threshold, const.motion_max_staleness) if const.motion_threshold > 0 else None
+  crop_tracker = CropTracker(input_size) if const.crop_tracking else None
+  move_rules = rules.groups.get("move", 0)
+  back_rules = rules.groups.get("back", 0)
+  bad_posture_rules = rules.groups.get("bad_posture", 0)
+  config_version = config.version if config is not None else None
+  while not shared_state.closed:
       try:
-          if not shared_state["human_detected"]:
-              time.sleep(0.1)
+          if config is not None and config.version != config_version:
+              # 再読み込みされた設定でルールを作り直す
+              config_version = config.version
+              const = config.constants
+              rules = compile_rules(const)
+              move_rules = rules.groups.get("move", 0)
+              back_rules = rules.groups.get("back", 0)
+              bad_posture_rules = rules.groups.get("bad_posture", 0)
+              if verbose:
+                print(f"posture rules reloaded (version {config_version})")
+
+          if not shared_state.human_detected:
+              shared_state.bad_posture = False
+              if crop_tracker is not None:
+                  crop_tracker.reset()
+              # ユーザーが来るまで待機
+              shared_state.wait_until(human_detected=True)
+              metrics.observe("reaction_seconds", shared_state.since_change("human_detected"), worker="posture_check")
+              if verbose:
+                  print(f"user detected, reaction={round(shared_state.since_change('human_detected'), 4)}s")
               continue
           
-          shared_state["bad_posture"] = False
-          key_points = detect(output_path=f"/home/sozo/program/Sozo/img/output_img.png") if verbose else detect()
-          # if verbose:
-          #     print(key_points)
-
-          if key_points["left_shoulder"][1] > const.left_shoulder_x_limit or key_points["right_shoulder"][1] < const.right_shoulder_x_limit:
+          key_points = detect_keypoints(output_path=f"/home/sozo/program/Sozo/img/output_img.png", frame_grabber=frame_grabber, motion_gate=motion_gate, crop_tracker=crop_tracker, verbose=True) if verbose else detect_keypoints(frame_grabber=frame_grabber, motion_gate=motion_gate, crop_tracker=crop_tracker)
+          if verbose and motion_gate is not None:
+            print(f"inference skip ratio={round(motion_gate.skip_ratio(), 3)}")
+          with metrics.timer("stage_seconds", stage="rules"):
+            violated, _ = rules.evaluate(key_points)
+          shared_state.bad_posture = bool(violated & bad_posture_rules) and not (violated & (move_rules | back_rules))
+          if session_log is not None:
+            session_log.append(time.time(), key_points, violated, shared_state.human_detected, shared_state.bad_posture)
+
+          if violated & move_rules:
+            metrics.inc("posture_violations_total", group="move")
             speaker.play_audio(const.move_audio_file)
             if verbose:
-              if key_points["left_shoulder"][1] > const.left_shoulder_x_limit:
-                print("left shoulder is out of frame")
-              else:
-                print("right shoulder is out of frame")
-            time.sleep(5)
+              for message in rules.violations(violated, "move"):
+                print(message)
+            shared_state.wait_closed(5)
             continue
 
-          if key_points["left_eye"][0] < const.left_eye_y_limit or key_points["right_eye"][0] > const.right_eye_y_limit or \
-            key_points["left_shoulder"][0] < const.left_shoulder_y_limit or key_points["right_shoulder"][0] > const.right_shoulder_y_limit:
+          if violated & back_rules:
+            metrics.inc("posture_violations_total", group="back")
             if verbose:
-              if key_points["left_eye"][0] < const.left_eye_y_limit:
-                print("left eye is out of frame")
-              if key_points["right_eye"][0] > const.right_eye_y_limit:
-                print("right eye is out of frame")
-              if key_points["left_shoulder"][0] < const.left_shoulder_y_limit:
-                print("left shoulder is out of frame")
-              if key_points["right_shoulder"][0] > const.right_shoulder_y_limit:
-                print("right shoulder is out of frame")
+              for message in rules.violations(violated, "back"):
+                print(message)
             speaker.play_audio(const.back_audio_file)
-            caterpillar_motor.run_for_rotations(const.caterpillar_back_rotation, const.caterpillar_speed)
+            if shared_state.closed:
+              continue
+            with metrics.timer("motor_seconds", motor="caterpillar", action="back"):
+              caterpillar_motor.run_for_rotations(const.caterpillar_back_rotation, const.caterpillar_speed)
             continue
 
-          nose2eye_y = abs(key_points["nose"][0] - key_points["left_eye"][0])
-          if abs(key_points["left_shoulder"][0] - key_points["right_shoulder"][0]) > (2 * nose2eye_y) or \
-              abs(key_points["left_shoulder"][0] - key_points["nose"][0]) < 2 * nose2eye_y or \
-              abs(key_points["left_hip"][0] - key_points["left_shoulder"][0]) < 4 * nose2eye_y:
+          if violated & bad_posture_rules:
+            metrics.inc("posture_violations_total", group="bad_posture")
             bad_posture_flag += 1
-            shared_state["bad_posture"] = True
             if verbose:
               print(f"bad posture, flag={bad_posture_flag}")
-              if abs(key_points["left_shoulder"][0] - key_points["right_shoulder"][0]) > (2 * nose2eye_y):
-                print("shoulders are tilted")
-              if abs(key_points["left_shoulder"][0] - key_points["nose"][0]) < 2 * nose2eye_y:
-                print("shoulder is too close to face")
-              if abs(key_points["left_hip"][0] - key_points["left_shoulder"][0]) < 4 * nose2eye_y:
-                print("hip is too close to shoulder")
+              for message in rules.violations(violated, "bad_posture"):
+                print(message)
             if bad_posture_flag > const.bad_posture_limit:
-              speaker.play_audio(const.posture_alert_audio_file)
+              speaker.play_audio(const.posture_alert_audio_file, speaker.PRIORITY_ALERT)
               bad_posture_flag = 0
               continual_bad_posture_flag += 1
               if verbose:
                 print(f"continual bad posture, flag={continual_bad_posture_flag}")
               if continual_bad_posture_flag > const.bad_posture_limit:
-                caterpillar_motor.run_for_seconds(3, -const.caterpillar_speed)
+                continual_bad_posture_flag = 0
+                # 終了処理でモーターを止めた後は、どの動作も始めずに抜ける
+                if shared_state.closed:
+                  continue
+                with metrics.timer("motor_seconds", motor="caterpillar", action="approach"):
+                  caterpillar_motor.run_for_seconds(3, -const.caterpillar_speed)
                 for i in range(const.punch_time):
+                  if shared_state.closed:
+                    break
                   if verbose:
                      print(f"punch: {i}")
-                  right_arm_motor.run_for_rotations(3, -100)
-                  right_arm_motor.run_for_rotations(2.5, 100)
-                continual_bad_posture_flag = 0
-                caterpillar_motor.run_for_seconds(3, const.caterpillar_speed)
+                  with metrics.timer("motor_seconds", motor="right_arm", action="punch"):
+                    right_arm_motor.run_for_rotations(3, -100)
+                    if shared_state.closed:
+                      break
+                    right_arm_motor.run_for_rotations(2.5, 100)
+                if shared_state.closed:
+                  continue
+                with metrics.timer("motor_seconds", motor="caterpillar", action="return"):
+                  caterpillar_motor.run_for_seconds(3, const.caterpillar_speed)
 
       except KeyboardInterrupt:
          print("姿勢検知を終了します")
@@ -372,4 +337,4 @@ def posture_check(shared_state, speaker, caterpillar_motor, right_arm_motor, ult
           print("Error in posture_check (from posture_check):", e)
           traceback.print_exc()
 
-      time.sleep(0.05)
\ No newline at end of file
+      shared_state.wait_closed(0.05)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import numpy as np
+
+# Keypoint order of the MoveNet output.
+KEYPOINT_NAMES = (
+    'nose', 'left_eye', 'right_eye', 'left_ear', 'right_ear',
+    'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist', 'left_hip', 'right_hip',
+    'left_knee', 'right_knee', 'left_ankle', 'right_ankle',
+)
+
+# Index of each coordinate in a MoveNet [y, x, score] keypoint.
+AXES = {"y": 0, "x": 1}
+
+OPERATORS = {">": 1.0, "<": -1.0}
+
+
+class PostureRules():
+    """Posture rules compiled into vectorized NumPy predicates.
+
+    Each rule compares a keypoint coordinate, or the absolute distance between
+    two keypoints along one axis, against a threshold. The threshold is a fixed
+    limit plus an optional multiple of a reference distance between two other
+    keypoints (for example nose to eye). Margins are positive when a rule is
+    violated and give the distance past the threshold.
+    """
+
+    def __init__(self, rules, const=None):
+        """Compile the rules.
+
+        Parameters
+        ----------
+        rules : list of dict
+            Rule declarations. Each rule has ``name``, ``group``, ``keypoint``,
+            ``axis`` ("x" or "y") and ``op`` (">" or "<"), and optionally
+            ``relative_to`` (a second keypoint), ``limit`` (a number or the name
+            of a constant), ``scale`` and ``unit`` (a pair of keypoints whose
+            distance is multiplied by ``scale``) and ``message``.
+        const : Constants, optional
+            Constants used to resolve limits given by name, by default None
+        """
+        if len(rules) > 32:
+            raise ValueError("At most 32 posture rules are supported.")
+        self.names = [rule["name"] for rule in rules]
+        self.messages = [rule.get("message", rule["name"]) for rule in rules]
+        self.limit_names = [rule.get("limit") if isinstance(rule.get("limit"), str) else None for rule in rules]
+        count = len(rules)
+        self._keypoint = np.zeros(count, dtype=np.intp)
+        self._relative_to = np.zeros(count, dtype=np.intp)
+        self._relative = np.zeros(count, dtype=bool)
+        self._axis = np.zeros(count, dtype=np.intp)
+        self._sign = np.zeros(count, dtype=np.float32)
+        self._scale = np.zeros(count, dtype=np.float32)
+        self._unit = np.zeros((2, count), dtype=np.intp)
+        self.limits = np.zeros(count, dtype=np.float32)
+        self.groups = {}
+        for i, rule in enumerate(rules):
+            if rule["op"] not in OPERATORS:
+                raise ValueError(f"Unknown operator in posture rule {rule['name']}: {rule['op']}")
+            self._keypoint[i] = KEYPOINT_NAMES.index(rule["keypoint"])
+            if rule.get("relative_to"):
+                self._relative_to[i] = KEYPOINT_NAMES.index(rule["relative_to"])
+                self._relative[i] = True
+            self._axis[i] = AXES[rule["axis"]]
+            self._sign[i] = OPERATORS[rule["op"]]
+            if rule.get("unit"):
+                self._unit[:, i] = [KEYPOINT_NAMES.index(name) for name in rule["unit"]]
+                self._scale[i] = rule.get("scale", 1)
+            limit = rule.get("limit", 0)
+            self.limits[i] = const[limit] if isinstance(limit, str) else limit
+            group = rule.get("group", rule["name"])
+            self.groups[group] = self.groups.get(group, 0) | (1 << i)
+        self._bits = np.left_shift(np.uint32(1), np.arange(count, dtype=np.uint32))
+
+    def evaluate(self, keypoints, limits=None):
+        """Evaluate all rules in one pass.
+
+        Parameters
+        ----------
+        keypoints : numpy.ndarray
+            A [..., 17, 3] array of MoveNet keypoints; any leading dimensions
+            are treated as a batch.
+        limits : numpy.ndarray, optional
+            Limits broadcastable to [..., R] that replace the compiled limits,
+            for example a grid of candidate thresholds, by default None
+
+        Returns
+        -------
+        tuple
+            (mask, margins) where mask is a uint32 bitmask of violated rules
+            with shape [...] and margins has shape [..., R].
+        """
+        keypoints = np.asarray(keypoints, dtype=np.float32)
+        value = keypoints[..., self._keypoint, self._axis]
+        other = keypoints[..., self._relative_to, self._axis]
+        value = np.where(self._relative, np.abs(value - other), value)
+        unit = np.abs(keypoints[..., self._unit[0], self._axis] - keypoints[..., self._unit[1], self._axis])
+        threshold = (self.limits if limits is None else limits) + self._scale * unit
+        margins = self._sign * (value - threshold)
+        mask = np.bitwise_or.reduce(np.where(margins > 0, self._bits, np.uint32(0)), axis=-1)
+        return mask, margins
+
+    def evaluate_batch(self, keypoints, limits=None):
+        """Evaluate all rules over a batch of recorded frames.
+
+        Parameters
+        ----------
+        keypoints : numpy.ndarray
+            A [N, 17, 3] or [N, 1, 1, 17, 3] array of MoveNet outputs.
+        limits : numpy.ndarray, optional
+            Limits broadcastable to [N, R], by default None
+
+        Returns
+        -------
+        tuple
+            (mask, margins) with shapes [N] and [N, R].
+        """
+        keypoints = np.asarray(keypoints).reshape(-1, len(KEYPOINT_NAMES), 3)
+        return self.evaluate(keypoints, limits)
+
+    def violations(self, mask, group=None):
+        """Return the messages of the violated rules.
+
+        Parameters
+        ----------
+        mask : int
+            Bitmask returned by evaluate().
+        group : str, optional
+            Only report rules in this group, by default None
+
+        Returns
+        -------
+        list
+            Messages of the violated rules.
+        """
+        mask = int(mask)
+        if group is not None:
+            mask &= self.groups.get(group, 0)
+        return [message for i, message in enumerate(self.messages) if mask >> i & 1]
+
+
+def compile_rules(const):
+    """Compile the posture rules declared in the constants.
+
+    Parameters
+    ----------
+    const : Constants
+        Constants object with a ``posture_rules`` list.
+
+    Returns
+    -------
+    PostureRules
+        The compiled rules.
+    """
+    return PostureRules(const.posture_rules, const)
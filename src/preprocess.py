@@ -0,0 +1,104 @@
+import math
+import numpy as np
+import cv2
+
+
+class InputBuffer():
+    """Preallocated MoveNet input, filled in place for every frame.
+
+    The camera frame is letterboxed like ``tf.image.resize_with_pad``: it is
+    resized with cv2 straight into the centered region of the buffer, and the
+    padding around it is zeroed only when the frame size changes. The buffer
+    already has the dtype the backend expects, so no tensor conversion or cast
+    is needed before inference. Models with a non-uint8 input are resized into
+    a uint8 scratch image and copied into the buffer with one cast.
+    """
+
+    def __init__(self, input_size=192, dtype=np.uint8, batch=None):
+        """Allocate the buffers.
+
+        Parameters
+        ----------
+        input_size : int, optional
+            Input resolution of the model, by default 192
+        dtype : numpy.dtype, optional
+            Input dtype of the model, by default numpy.uint8
+        batch : numpy.ndarray, optional
+            A [1, input_size, input_size, 3] array to fill, such as a slot of
+            shared memory, by default None (allocated here)
+        """
+        self.input_size = input_size
+        self.dtype = np.dtype(dtype)
+        self.batch = np.zeros((1, input_size, input_size, 3), dtype=self.dtype) if batch is None else batch
+        # cv2 は uint8 同士でしか書き込めないので、それ以外の型は作業用画像を経由する
+        self._cast = self.dtype != np.uint8
+        self.image = np.zeros((input_size, input_size, 3), dtype=np.uint8) if self._cast else self.batch[0]
+        self._frame_shape = None
+        self._size = None
+        self._region = None
+
+    def _layout(self, height, width):
+        """Compute the resized size and placement of a frame, as resize_with_pad does.
+        """
+        ratio = max(width / self.input_size, height / self.input_size)
+        resized_width = int(width / ratio)
+        resized_height = int(height / ratio)
+        left = max(0, math.floor((self.input_size - width / ratio) / 2))
+        top = max(0, math.floor((self.input_size - height / ratio) / 2))
+        self._size = (resized_width, resized_height)
+        self._region = self.image[top:top + resized_height, left:left + resized_width]
+        self.image[:] = 0
+        self._frame_shape = (height, width)
+        return
+
+    def letterbox(self, frame):
+        """Resize and pad a frame into the model input.
+
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            A [height, width, 3] uint8 camera frame.
+
+        Returns
+        -------
+        numpy.ndarray
+            The [1, input_size, input_size, 3] input buffer. It is overwritten
+            by the next call.
+        """
+        if frame.shape[:2] != self._frame_shape:
+            self._layout(*frame.shape[:2])
+        cv2.resize(frame, self._size, dst=self._region, interpolation=cv2.INTER_LINEAR)
+        return self.commit()
+
+    def crop(self, crop_tracker, frame):
+        """Crop the tracked region of a frame into the model input.
+
+        Parameters
+        ----------
+        crop_tracker : CropTracker
+            Tracker with the region to crop.
+        frame : numpy.ndarray
+            A [height, width, 3] uint8 camera frame.
+
+        Returns
+        -------
+        numpy.ndarray
+            The [1, input_size, input_size, 3] input buffer. It is overwritten
+            by the next call.
+        """
+        crop_tracker.crop(frame, dst=self.image)
+        # 余白も上書きされたので、次の letterbox() で配置からやり直す
+        self._frame_shape = None
+        return self.commit()
+
+    def commit(self):
+        """Copy ``image`` into the input buffer if the model does not take uint8.
+
+        Returns
+        -------
+        numpy.ndarray
+            The [1, input_size, input_size, 3] input buffer.
+        """
+        if self._cast:
+            np.copyto(self.batch[0], self.image, casting="unsafe")
+        return self.batch
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+import traceback
+from utils.common_functions import quit_program
+
+
+class Runtime():
+    """Asyncio orchestrator for the worker loops.
+
+    Each worker is a blocking function that loops until the shared state is
+    closed. It runs in its own named daemon thread so that inference and GPIO
+    work never block the event loop, and a supervisor task restarts it when it
+    fails. Quitting closes the shared state, runs the stop callbacks at once
+    (e.g. motor.stop) and then waits a bounded time for the workers to exit.
+    A worker still stuck after that does not keep the program from exiting.
+    """
+
+    def __init__(self, shared_state, restart_delay=1.0, max_restart_delay=30.0, shutdown_timeout=3.0, verbose=False):
+        """Initialize the runtime.
+
+        Parameters
+        ----------
+        shared_state : SharedState
+            State shared between the workers, closed on shutdown.
+        restart_delay : float, optional
+            Seconds to wait before restarting a failed worker, by default 1.0
+        max_restart_delay : float, optional
+            Upper bound of the doubling restart delay, by default 30.0
+        shutdown_timeout : float, optional
+            Seconds to wait for the workers to exit after quitting, by default 3.0
+        verbose : bool, optional
+            Print debug messages, by default False
+        """
+        self.shared_state = shared_state
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.verbose = verbose
+        self._workers = []
+        self._stop_callbacks = []
+        self.restarts = {}
+
+    def add_worker(self, name, target, *args):
+        """Register a blocking worker loop.
+
+        Parameters
+        ----------
+        name : str
+            Name of the worker, also used for its thread.
+        target : callable
+            Function that loops until the shared state is closed.
+        *args
+            Arguments passed to the function.
+        """
+        self._workers.append((name, target, args))
+        self.restarts[name] = 0
+        return
+
+    def on_stop(self, callback):
+        """Call a function as soon as the program quits, before the workers are joined.
+        """
+        self._stop_callbacks.append(callback)
+        return
+
+    def run(self):
+        """Run the workers until the user quits.
+        """
+        asyncio.run(self._main())
+        return
+
+    def _start_thread(self, loop, name, target, args):
+        """Run a worker once in a daemon thread and return a future of its result.
+
+        Unlike executor threads, which are joined when the interpreter exits,
+        a daemon thread is abandoned if the worker is stuck.
+        """
+        future = loop.create_future()
+
+        def resolve(result, error):
+            # 終了時に取り消したスーパーバイザーの future には結果を入れない
+            if future.done():
+                return
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+        def run():
+            try:
+                result, error = target(*args), None
+            except BaseException as e:
+                result, error = None, e
+            try:
+                loop.call_soon_threadsafe(resolve, result, error)
+            except RuntimeError:
+                # イベントループはすでに閉じている
+                pass
+
+        threading.Thread(target=run, name=name, daemon=True).start()
+        return future
+
+    async def _main(self):
+        loop = asyncio.get_running_loop()
+        supervisors = [asyncio.create_task(self._supervise(name, target, args), name=name) for name, target, args in self._workers]
+        quit_requested = loop.create_future()
+
+        def wait_for_quit():
+            quit_program()
+            loop.call_soon_threadsafe(lambda: quit_requested.done() or quit_requested.set_result(None))
+
+        # input() は取り消せないので、終了時に待たなくて済むデーモンスレッドで読む
+        threading.Thread(target=wait_for_quit, name="input", daemon=True).start()
+        try:
+            await quit_requested
+        finally:
+            await self._shutdown(supervisors)
+        return
+
+    async def _supervise(self, name, target, args):
+        loop = asyncio.get_running_loop()
+        delay = self.restart_delay
+        while not self.shared_state.closed:
+            started_at = time.monotonic()
+            try:
+                await self._start_thread(loop, name, target, args)
+                if self.shared_state.closed:
+                    return
+                print(f"{name} stopped unexpectedly (from runtime)")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in {name} (from runtime):", e)
+                traceback.print_exc()
+            # 長く動いていたワーカーは遅延をリセットする
+            if time.monotonic() - started_at > self.max_restart_delay:
+                delay = self.restart_delay
+            self.restarts[name] += 1
+            if self.verbose:
+                print(f"restart {name} in {delay:.1f}s ({self.restarts[name]} restarts)")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+        return
+
+    async def _shutdown(self, supervisors):
+        self.shared_state.close()
+        for callback in self._stop_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print("Error in stop callback (from runtime):", e)
+                traceback.print_exc()
+        # ワーカーは閉じた状態を見て抜けるので、スーパーバイザーの再起動待ちだけ取り消す
+        done, pending = await asyncio.wait(supervisors, timeout=self.shutdown_timeout)
+        for task in pending:
+            if self.verbose:
+                print(f"{task.get_name()} did not stop within {self.shutdown_timeout}s")
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return
@@ -0,0 +1,231 @@
+import glob
+import os
+import time
+import numpy as np
+
+# Fixed-size record of one posture_check() frame (120 bytes).
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("keypoints", "<f2", (17, 3)),
+    ("violations", "<u4"),
+    ("human_detected", "u1"),
+    ("bad_posture", "u1"),
+    ("reserved", "u1", (4,)),
+])
+
+# File header, padded to HEADER_SIZE bytes before the first record.
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("record_size", "<u4"),
+    ("segment_records", "<u8"),
+    ("count", "<u8"),
+])
+HEADER_SIZE = 64
+MAGIC = b"SOZOKPT1"
+VERSION = 1
+
+
+class SessionLogWriter():
+    """Append-only log of timestamped MoveNet outputs in memory-mapped files.
+
+    A log file grows by preallocated segments of segment_records records, and
+    a new file is started once it holds max_segments segments. The number of
+    valid records is kept in the file header, so a reader never sees a record
+    that is only partly written. Appending writes into the mapped arrays in
+    place, without allocating, except when a segment is added.
+    """
+
+    def __init__(self, directory, segment_records=65536, max_segments=64, max_files=None):
+        """Prepare the writer. The first file is created on the first append.
+
+        Parameters
+        ----------
+        directory : str
+            Directory of the log files
+        segment_records : int, optional
+            Number of records added to a file at a time, by default 65536
+        max_segments : int, optional
+            Number of segments after which a new file is started, by default 64
+        max_files : int, optional
+            Number of files kept, the oldest are deleted, by default None (all)
+        """
+        self.directory = directory
+        self.segment_records = int(segment_records)
+        self.max_segments = int(max_segments)
+        self.max_files = max_files
+        self.path = None
+        self._header = None
+        self._records = None
+        self._capacity = 0
+        self._count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_file(self):
+        """Start a new log file with one segment.
+        """
+        self.close()
+        # 同じ秒に作ったファイルも名前順に並ぶように連番を付ける
+        prefix = os.path.join(self.directory, time.strftime("keypoints-%Y%m%d-%H%M%S"))
+        suffix = 0
+        while os.path.exists(f"{prefix}-{suffix:03d}.log"):
+            suffix += 1
+        self.path = f"{prefix}-{suffix:03d}.log"
+        with open(self.path, "wb") as f:
+            f.write(b"\0" * HEADER_SIZE)
+        self._header = np.memmap(self.path, dtype=HEADER_DTYPE, mode="r+", shape=(1,))
+        self._header["magic"] = MAGIC
+        self._header["version"] = VERSION
+        self._header["record_size"] = RECORD_DTYPE.itemsize
+        self._header["segment_records"] = self.segment_records
+        self._header["count"] = 0
+        self._count_view = self._header["count"]
+        self._count = 0
+        self._capacity = 0
+        self._grow()
+        self._remove_old_files()
+        return
+
+    def _grow(self):
+        """Preallocate one more segment and map the whole file again.
+        """
+        self._capacity += self.segment_records
+        size = HEADER_SIZE + self._capacity * RECORD_DTYPE.itemsize
+        with open(self.path, "r+b") as f:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, size)
+            else:
+                f.truncate(size)
+        if self._records is not None:
+            self._records.flush()
+        self._records = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r+", offset=HEADER_SIZE, shape=(self._capacity,))
+        # フィールドごとのビューを作っておき、追記時にオブジェクトを作らない
+        self._timestamps = self._records["timestamp"]
+        self._keypoints = self._records["keypoints"]
+        self._violations = self._records["violations"]
+        self._human_detected = self._records["human_detected"]
+        self._bad_posture = self._records["bad_posture"]
+        return
+
+    def _remove_old_files(self):
+        if self.max_files is None:
+            return
+        for path in list_session_logs(self.directory)[:-self.max_files]:
+            os.remove(path)
+        return
+
+    def append(self, timestamp, keypoints, violations, human_detected, bad_posture):
+        """Append one frame.
+
+        Parameters
+        ----------
+        timestamp : float
+            ``time.time()`` of the frame
+        keypoints : numpy.ndarray
+            A [17, 3] array of MoveNet keypoints
+        violations : int
+            Bitmask of the violated posture rules
+        human_detected : bool
+            Whether a user is present
+        bad_posture : bool
+            Whether the posture is bad
+        """
+        if self._records is None:
+            self._open_file()
+        elif self._count == self._capacity:
+            if self._capacity >= self.segment_records * self.max_segments:
+                self._open_file()
+            else:
+                self._grow()
+        i = self._count
+        self._timestamps[i] = timestamp
+        self._keypoints[i] = keypoints
+        self._violations[i] = violations
+        self._human_detected[i] = human_detected
+        self._bad_posture[i] = bad_posture
+        # ヘッダーの件数はレコードを書き終えてから増やす
+        self._count = i + 1
+        self._count_view[0] = self._count
+        return
+
+    def __len__(self):
+        return self._count
+
+    def flush(self):
+        """Write the mapped pages of the current file to disk.
+        """
+        if self._records is not None:
+            self._records.flush()
+            self._header.flush()
+        return
+
+    def close(self):
+        """Flush and unmap the current file.
+        """
+        self.flush()
+        self._records = None
+        self._header = None
+        return
+
+
+def list_session_logs(directory):
+    """Return the log files of a directory, oldest first.
+    """
+    return sorted(glob.glob(os.path.join(directory, "keypoints-*.log")))
+
+
+def open_session_log(path):
+    """Open a log file as a read-only record array without copying it.
+
+    Parameters
+    ----------
+    path : str
+        Path of the log file
+
+    Returns
+    -------
+    numpy.memmap
+        Structured array with RECORD_DTYPE fields, holding the valid records.
+    """
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0 or header["magic"][0] != MAGIC:
+        raise ValueError(f"Not a keypoint session log: {path}")
+    if header["record_size"][0] != RECORD_DTYPE.itemsize:
+        raise ValueError(f"Unsupported record size in {path}: {header['record_size'][0]}")
+    count = int(header["count"][0])
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+def open_session_logs(directory, start=None, end=None):
+    """Open every log file of a directory, optionally limited to a time range.
+
+    Each file is mapped without copying; use np.concatenate on the result to
+    get one array.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the log files
+    start : float, optional
+        Only keep records at or after this ``time.time()``, by default None
+    end : float, optional
+        Only keep records before this ``time.time()``, by default None
+
+    Returns
+    -------
+    list
+        Record arrays, oldest first.
+    """
+    logs = []
+    for path in list_session_logs(directory):
+        records = open_session_log(path)
+        if start is not None or end is not None:
+            timestamps = records["timestamp"]
+            first = 0 if start is None else np.searchsorted(timestamps, start)
+            last = len(records) if end is None else np.searchsorted(timestamps, end)
+            records = records[first:last]
+        if len(records):
+            logs.append(records)
+    return logs
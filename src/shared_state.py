@@ -0,0 +1,185 @@
+import collections
+import threading
+import time
+
+# A timestamped change of one shared state field.
+Transition = collections.namedtuple("Transition", ["timestamp", "field", "old", "new"])
+
+
+class SharedState():
+    """State shared between the worker threads, with change notification.
+
+    Assigning a field wakes every thread waiting on the state and calls the
+    subscribed callbacks, but only when the value actually changes. Each change
+    is recorded as a Transition with a ``time.monotonic()`` timestamp so that
+    reaction latency can be measured. Closing the state releases every waiter
+    and tells the workers to exit.
+    """
+
+    FIELDS = ("human_detected", "bad_posture")
+
+    def __init__(self, history=256):
+        """Initialize the state with nobody present and good posture.
+
+        Parameters
+        ----------
+        history : int, optional
+            Number of transitions kept, by default 256
+        """
+        now = time.monotonic()
+        self._values = {field: False for field in SharedState.FIELDS}
+        self._changed_at = {field: now for field in SharedState.FIELDS}
+        self._cond = threading.Condition()
+        self._subscribers = []
+        self._closed = threading.Event()
+        self.transitions = collections.deque(maxlen=history)
+
+    @property
+    def closed(self):
+        """Whether the program is shutting down."""
+        return self._closed.is_set()
+
+    def close(self):
+        """Mark the state as closed and wake every waiting thread.
+        """
+        with self._cond:
+            self._closed.set()
+            self._cond.notify_all()
+        return
+
+    def wait_closed(self, timeout=None):
+        """Sleep until the timeout elapses or the state is closed.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait in seconds, by default None
+
+        Returns
+        -------
+        bool
+            True if the state is closed.
+        """
+        return self._closed.wait(timeout)
+
+    @property
+    def human_detected(self):
+        """Whether a user is in front of the robot."""
+        return self._values["human_detected"]
+
+    @human_detected.setter
+    def human_detected(self, value):
+        self.set("human_detected", value)
+
+    @property
+    def bad_posture(self):
+        """Whether the user currently has bad posture."""
+        return self._values["bad_posture"]
+
+    @bad_posture.setter
+    def bad_posture(self, value):
+        self.set("bad_posture", value)
+
+    def set(self, field, value):
+        """Set a field and notify waiters and subscribers if it changed.
+
+        Parameters
+        ----------
+        field : str
+            Name of the field
+        value : bool
+            New value
+
+        Returns
+        -------
+        bool
+            True if the value changed.
+        """
+        value = bool(value)
+        with self._cond:
+            old = self._values[field]
+            if old == value:
+                return False
+            timestamp = time.monotonic()
+            self._values[field] = value
+            self._changed_at[field] = timestamp
+            transition = Transition(timestamp, field, old, value)
+            self.transitions.append(transition)
+            subscribers = [callback for fields, callback in self._subscribers if fields is None or field in fields]
+            self._cond.notify_all()
+        for callback in subscribers:
+            callback(transition)
+        return True
+
+    def subscribe(self, callback, fields=None):
+        """Call a function on every transition.
+
+        The callback runs on the thread that changed the state, so it must be quick.
+
+        Parameters
+        ----------
+        callback : callable
+            Function called with the Transition
+        fields : iterable, optional
+            Only report changes of these fields, by default None (all fields)
+
+        Returns
+        -------
+        callable
+            Function that cancels the subscription.
+        """
+        entry = (None if fields is None else frozenset(fields), callback)
+        with self._cond:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._cond:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def wait_for(self, predicate, timeout=None):
+        """Block until the predicate holds or the state is closed.
+
+        Parameters
+        ----------
+        predicate : callable
+            Function called with this state
+        timeout : float, optional
+            Maximum time to wait in seconds, by default None
+
+        Returns
+        -------
+        bool
+            The last result of the predicate.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or predicate(self), timeout)
+            return predicate(self)
+
+    def wait_until(self, timeout=None, **expected):
+        """Block until the given fields have the given values or the state is closed.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait in seconds, by default None
+        **expected
+            Expected field values, e.g. ``human_detected=True``
+
+        Returns
+        -------
+        bool
+            True if the fields have the expected values.
+        """
+        return self.wait_for(lambda state: all(state._values[field] == value for field, value in expected.items()), timeout)
+
+    def changed_at(self, field):
+        """Return the ``time.monotonic()`` time of the last change of a field.
+        """
+        return self._changed_at[field]
+
+    def since_change(self, field):
+        """Return the seconds elapsed since the last change of a field.
+        """
+        return time.monotonic() - self._changed_at[field]
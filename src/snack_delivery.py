@@ -1,4 +1,5 @@
-from utils.common_functions import ServoMotor
+from utils.device_registry import create_device
+from utils import metrics
 import time
 import traceback
 
@@ -13,7 +14,7 @@ class Delivery():
         servo_motor_pin : int, optional
             The pin number of the servo motor, by default 18
         """
-        self.servo_motor = ServoMotor(servo_motor_pin)
+        self.servo_motor = create_device("servo_motor", servo_motor_pin)
         self.servo_motor.set_angle(0)
 
     def give(self, open_time=2):
@@ -29,12 +30,12 @@ class Delivery():
         self.servo_motor.set_angle(0)
         return
 
-def periodic_delivery(shared_state, speaker, delivery, const, verbose=False):
+def periodic_delivery(shared_state, speaker, delivery, const, verbose=False, config=None):
     """Periodically deliver snacks to the user.
 
     Parameters
     ----------
-    shared_state : dict
+    shared_state : object of class SharedState
         Shared state between threads.
     speaker : object of class Speaker
         Speaker object.
@@ -42,23 +43,48 @@ def periodic_delivery(shared_state, speaker, delivery, const, verbose=False):
         Delivery object.
     const : object of class Constants
         Constants object.
+    verbose : bool, optional
+        Whether to print debug messages. The default is False.
+    config : object of class ConfigStore, optional
+        Store whose reloaded constants replace const. const is fixed when omitted.
     """
     start_time = time.time()
-    while True:
+    while not shared_state.closed:
         try:
-            if not shared_state["human_detected"]:
-                time.sleep(0.1)
+            if config is not None:
+                const = config.constants
+            if not shared_state.human_detected:
+                # ユーザーが来るまで待機
+                shared_state.wait_until(human_detected=True)
                 start_time = time.time()
                 continue
 
             if verbose:
                 print(f"snack time={round(time.time()-start_time, 3)}")
 
-            if time.time() - start_time >= const.delivery_interval and not shared_state["bad_posture"]:
-                speaker.play_audio(const.treat_audio_file)
+            remaining = const.delivery_interval - (time.time() - start_time)
+            if remaining > 0:
+                # 時間になるかユーザーが離れるまで待機する。設定の再読み込みで
+                # 間隔が短くなっても反映されるよう、監視の周期ごとに計算し直す
+                if config is not None:
+                    remaining = min(remaining, config.poll_interval)
+                shared_state.wait_until(timeout=remaining, human_detected=False)
+                continue
+
+            if shared_state.closed:
+                break
+
+            if shared_state.bad_posture:
+                # 姿勢が直るかユーザーが離れるまで待機
+                shared_state.wait_for(lambda state: not state.bad_posture or not state.human_detected)
+                continue
+
+            with metrics.timer("stage_seconds", stage="delivery"):
+                speaker.play_audio(const.treat_audio_file, wait=True)
                 delivery.give()
-                speaker.play_audio(const.item_get_audio_file)
-                start_time = time.time()
+            metrics.inc("deliveries_total")
+            speaker.play_audio(const.item_get_audio_file)
+            start_time = time.time()
                 
         except KeyboardInterrupt:
             print("ご褒美機能を終了します")
@@ -67,5 +93,4 @@ def periodic_delivery(shared_state, speaker, delivery, const, verbose=False):
         except Exception as e:
             print("Error in periodic_delivery (from periodic_delivery):", e)
             traceback.print_exc()
-
-        time.sleep(0.1)
\ No newline at end of file
+            shared_state.wait_closed(0.1)
@@ -1,16 +1,42 @@
 import cv2
-import RPi.GPIO as GPIO
-from gpiozero import OutputDevice
-from gpiozero.pins.pigpio import PiGPIOFactory
+import numpy as np
+import threading
+import collections
+import concurrent.futures
 from datetime import datetime
 import time
 import os
-from pydub import AudioSegment
-from pydub.playback import play
-import pigpio
-import json
-from attrdict import AttrDict
-import sys
+import heapq
+
+# Hardware and audio libraries are optional so that the simulated devices in
+# utils.simulated_devices can run on machines without them.
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    GPIO = None
+try:
+    from gpiozero import OutputDevice
+    from gpiozero.pins.pigpio import PiGPIOFactory
+except ImportError:
+    OutputDevice = PiGPIOFactory = None
+try:
+    import pigpio
+except ImportError:
+    pigpio = None
+try:
+    from pydub import AudioSegment
+    from pydub.playback import play
+except ImportError:
+    AudioSegment = play = None
+try:
+    import simpleaudio
+except ImportError:
+    simpleaudio = None
+try:
+    from utils import metrics
+except ImportError:
+    # display_ip.py imports this module from inside utils/.
+    import metrics
 
 class Camera():
     """Camera class to capture picture or video.
@@ -61,9 +87,13 @@ class Camera():
         cv2.destroyAllWindows()
         return
     
-    def capt_video(self, width=640, height=480, rec_sec=5, fps=30, fourcc=('m', 'p', '4', 'v'), file_name=None):
+    def capt_video(self, width=640, height=480, rec_sec=5, fps=30, fourcc=('m', 'p', '4', 'v'), file_name=None, queue_size=8, drop_policy="drop_oldest"):
         """Capture a video from the camera.
 
+        Frames are read on the calling thread and encoded by a VideoRecorder
+        on its own thread, so a slow encoder does not stall the capture. The
+        camera stays open for later captures.
+
         Parameters
         ----------
         width : int, optional
@@ -78,25 +108,33 @@ class Camera():
             FourCC code, by default ('m', 'p', '4', 'v')
         file_name : str, optional
             Name of the video file, by default None
+        queue_size : int, optional
+            Number of frames waiting for the encoder, by default 8
+        drop_policy : str, optional
+            What to do when the encoder queue is full, see VideoRecorder, by default "drop_oldest"
+
+        Returns
+        -------
+        dict
+            Recording statistics, see VideoRecorder.stats().
         """
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
         self.cap.set(cv2.CAP_PROP_FPS, fps)
-        fourcc = cv2.VideoWriter_fourcc(*fourcc)
         if file_name is None:
             file_name = datetime.now().strftime('%Y%m%d%H%M%S') + '.mp4'
         path = os.path.join(self.path, file_name)
-        out = cv2.VideoWriter(path, fourcc, fps, (width, height))
-        for _ in range(fps * rec_sec):
-            ret, frame = self.cap.read()
-            if not ret:
-                print('Failed to capture video.')
-                return
-            out.write(frame)
-        self.cap.release()
-        out.release()
-        cv2.destroyAllWindows()
-        return
+        recorder = VideoRecorder(path, fps, fourcc, queue_size, drop_policy).start()
+        try:
+            for _ in range(fps * rec_sec):
+                ret, frame = self.cap.read()
+                if not ret:
+                    print('Failed to capture video.')
+                    break
+                recorder.offer(frame)
+        finally:
+            recorder.stop()
+        return recorder.stats()
     
     def __del__(self):
         """Release the camera and close the window.
@@ -105,11 +143,435 @@ class Camera():
         cv2.destroyAllWindows()
     
 
+class VideoRecorder():
+    """Video encoder fed through a bounded frame queue.
+
+    The capture side hands BGR frames to offer() without copying them and the
+    encoder thread writes them with cv2.VideoWriter, which is opened with the
+    size of the first frame. When the queue is full, the drop policy decides
+    which frame is lost: "drop_oldest" discards the oldest queued frame,
+    "drop_newest" rejects the offered frame, and "block" makes the capture
+    side wait up to block_timeout for space.
+    """
+
+    DROP_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(self, path, fps=30, fourcc=('m', 'p', '4', 'v'), queue_size=8, drop_policy="drop_oldest", block_timeout=1.0):
+        """Prepare the recorder.
+
+        Parameters
+        ----------
+        path : str
+            Path of the video file
+        fps : float, optional
+            Frame rate written to the file, by default 30
+        fourcc : tuple, optional
+            FourCC code, by default ('m', 'p', '4', 'v')
+        queue_size : int, optional
+            Number of frames waiting for the encoder, by default 8
+        drop_policy : str, optional
+            "drop_oldest", "drop_newest" or "block", by default "drop_oldest"
+        block_timeout : float, optional
+            Maximum wait of the "block" policy in seconds, by default 1.0
+        """
+        if drop_policy not in VideoRecorder.DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.queue_size = max(int(queue_size), 1)
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._recording = False
+        self._thread = None
+        self._writer = None
+        self._started_at = None
+        self._stopped_at = None
+        self.offered_frames = 0
+        self.written_frames = 0
+        self.dropped_frames = 0
+        self.max_queued = 0
+
+    def start(self):
+        """Start the encoder thread.
+
+        Returns
+        -------
+        VideoRecorder
+            The recorder itself, so that it can be chained after the constructor.
+        """
+        if self._recording:
+            return self
+        self._recording = True
+        self._started_at = time.monotonic()
+        self._stopped_at = None
+        self._thread = threading.Thread(target=self._run, name="VideoRecorder", daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def recording(self):
+        """Whether the recorder accepts frames."""
+        return self._recording
+
+    def offer(self, frame):
+        """Queue a BGR frame for encoding.
+
+        A queued frame is owned by the recorder until it has been written, so
+        the caller must not write into it afterwards.
+
+        Parameters
+        ----------
+        frame : numpy.ndarray
+            BGR frame
+
+        Returns
+        -------
+        bool
+            True if the recorder took the frame, False if it was dropped.
+        """
+        with self._cond:
+            if not self._recording:
+                return False
+            self.offered_frames += 1
+            if len(self._queue) >= self.queue_size:
+                if self.drop_policy == "drop_newest":
+                    self.dropped_frames += 1
+                    return False
+                if self.drop_policy == "block":
+                    if not self._cond.wait_for(lambda: len(self._queue) < self.queue_size or not self._recording, self.block_timeout) or not self._recording:
+                        self.dropped_frames += 1
+                        return False
+                else:
+                    self._queue.popleft()
+                    self.dropped_frames += 1
+            self._queue.append(frame)
+            self.max_queued = max(self.max_queued, len(self._queue))
+            self._cond.notify_all()
+        return True
+
+    def _run(self):
+        """Write queued frames until stopped and the queue is drained.
+        """
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or not self._recording)
+                if not self._queue:
+                    break
+                frame = self._queue.popleft()
+                self._cond.notify_all()
+            if self._writer is None:
+                height, width = frame.shape[:2]
+                self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+            self._writer.write(frame)
+            self.written_frames += 1
+        return
+
+    def stop(self):
+        """Stop accepting frames, write the queued ones and close the file.
+        """
+        with self._cond:
+            if not self._recording:
+                return
+            self._recording = False
+            self._stopped_at = time.monotonic()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        return
+
+    def stats(self):
+        """Return the recording counters.
+
+        Returns
+        -------
+        dict
+            Offered, written and dropped frames, the longest queue, and the
+            offered and written frame rates over the recording time.
+        """
+        if self._started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._stopped_at or time.monotonic()) - self._started_at
+        return {
+            "frames": self.offered_frames,
+            "written_frames": self.written_frames,
+            "dropped_frames": self.dropped_frames,
+            "max_queued": self.max_queued,
+            "capture_fps": self.offered_frames / elapsed if elapsed > 0 else 0.0,
+            "fps": self.written_frames / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+class FrameGrabber():
+    """Long-lived camera capture running on a dedicated grabber thread.
+
+    The device is opened and configured once. The grabber thread keeps the
+    newest frames in a small ring buffer with "latest frame wins" semantics,
+    so consumers always get the most recent frame without waiting for the
+    device and without copying it. record() also hands every grabbed BGR frame
+    to a VideoRecorder, so video can be recorded while posture inference reads
+    frames from the same device.
+    """
+
+    def __init__(self, dev_id=0, width=640, height=480, buffer_size=3):
+        """Open the camera and prepare the ring buffer.
+
+        Parameters
+        ----------
+        dev_id : int, optional
+            Device ID of the camera, by default 0
+        width : int, optional
+            Requested frame width, by default 640
+        height : int, optional
+            Requested frame height, by default 480
+        buffer_size : int, optional
+            Number of frames kept in the ring buffer, by default 3
+        """
+        self.cap = self._open(dev_id, width, height)
+        self.buffer_size = max(int(buffer_size), 2)
+        self._buffers = [None] * self.buffer_size
+        self._views = [None] * self.buffer_size
+        self._timestamps = [0.0] * self.buffer_size
+        self._latest = -1
+        self._consumed = True
+        self._lock = threading.Lock()
+        self._first_frame = threading.Event()
+        self._running = False
+        self._thread = None
+        self._recorders = []
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self.failed_reads = 0
+
+    def _open(self, dev_id, width, height):
+        """Open and configure the capture device.
+
+        Returns
+        -------
+        cv2.VideoCapture
+            The opened capture device.
+        """
+        cap = cv2.VideoCapture(dev_id)
+        if not cap.isOpened():
+            print('Failed to open camera.')
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        return cap
+
+    def start(self):
+        """Start the grabber thread.
+
+        Returns
+        -------
+        FrameGrabber
+            The grabber itself, so that it can be chained after the constructor.
+        """
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the grabber thread, the recorders and release the camera.
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        for recorder in list(self._recorders):
+            self.stop_recording(recorder)
+        self.cap.release()
+        return
+
+    def _run(self):
+        """Grab frames until stopped, converting them to RGB into the ring buffer.
+        """
+        raw = None
+        while self._running:
+            ret, raw = self.cap.read(raw)
+            if not ret:
+                self.failed_reads += 1
+                raw = None
+                time.sleep(0.01)
+                continue
+            timestamp = time.monotonic()
+            index = (self._latest + 1) % self.buffer_size
+            if self._buffers[index] is None or self._buffers[index].shape != raw.shape:
+                self._buffers[index] = np.empty_like(raw)
+                self._views[index] = self._buffers[index].view()
+                self._views[index].flags.writeable = False
+            cv2.cvtColor(raw, cv2.COLOR_BGR2RGB, dst=self._buffers[index])
+            taken = False
+            for recorder in list(self._recorders):
+                taken = recorder.offer(raw) or taken
+            if taken:
+                # 録画側が持っているフレームには書き込まず、次は新しい配列に読む
+                raw = None
+            with self._lock:
+                if not self._consumed:
+                    self.dropped_frames += 1
+                self._latest = index
+                self._timestamps[index] = timestamp
+                self._consumed = False
+                self.frame_count += 1
+            self._first_frame.set()
+
+    def record(self, path, fps=30, fourcc=('m', 'p', '4', 'v'), queue_size=8, drop_policy="drop_oldest"):
+        """Start recording the grabbed frames to a video file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the video file
+        fps : float, optional
+            Frame rate written to the file, by default 30
+        fourcc : tuple, optional
+            FourCC code, by default ('m', 'p', '4', 'v')
+        queue_size : int, optional
+            Number of frames waiting for the encoder, by default 8
+        drop_policy : str, optional
+            What to do when the encoder queue is full, see VideoRecorder, by default "drop_oldest"
+
+        Returns
+        -------
+        VideoRecorder
+            The running recorder, stopped with stop_recording().
+        """
+        recorder = VideoRecorder(path, fps, fourcc, queue_size, drop_policy).start()
+        self._recorders.append(recorder)
+        return recorder
+
+    def stop_recording(self, recorder):
+        """Stop a recorder started by record() and return its statistics.
+        """
+        if recorder in self._recorders:
+            self._recorders.remove(recorder)
+        recorder.stop()
+        return recorder.stats()
+
+    def read(self, timeout=1.0):
+        """Return the newest frame.
+
+        The returned array is a read-only view into the ring buffer. It stays
+        valid until ``buffer_size - 1`` newer frames have been grabbed, so
+        consumers that keep a frame for longer must copy it.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Time to wait for the very first frame in seconds, by default 1.0.
+            Once a frame exists this method never blocks.
+
+        Returns
+        -------
+        tuple
+            (frame, timestamp) where frame is an RGB numpy array and timestamp
+            is the ``time.monotonic()`` value at capture, or (None, None) if no
+            frame is available yet.
+        """
+        if not self._first_frame.wait(timeout):
+            return None, None
+        with self._lock:
+            index = self._latest
+            self._consumed = True
+            return self._views[index], self._timestamps[index]
+
+    def frame_age(self):
+        """Return the age of the newest frame.
+
+        Returns
+        -------
+        float
+            Seconds since the newest frame was grabbed, or None if no frame exists.
+        """
+        if self._latest < 0:
+            return None
+        return time.monotonic() - self._timestamps[self._latest]
+
+    def stats(self):
+        """Return the grabber counters.
+
+        Returns
+        -------
+        dict
+            Number of grabbed frames, frames overwritten before being read,
+            failed reads and the age of the newest frame.
+        """
+        return {
+            "frames": self.frame_count,
+            "dropped_frames": self.dropped_frames,
+            "failed_reads": self.failed_reads,
+            "frame_age": self.frame_age(),
+        }
+
+    def __del__(self):
+        """Stop grabbing and release the camera.
+        """
+        self._running = False
+        self.cap.release()
+
+
+class MedianFilter():
+    """Median of the most recent distance readings.
+
+    Keeps the last ``window`` readings with their timestamps and ignores the
+    ones older than a maximum age, so a sensor that stopped answering does not
+    report a stale distance.
+    """
+
+    def __init__(self, window=5):
+        """Initialize the filter.
+
+        Parameters
+        ----------
+        window : int, optional
+            Number of readings kept, by default 5
+        """
+        self._readings = collections.deque(maxlen=window)
+
+    def add(self, timestamp, distance):
+        """Add a reading taken at the given ``time.monotonic()``.
+        """
+        self._readings.append((timestamp, distance))
+        return
+
+    def value(self, now, max_age=1.0):
+        """Return the median of the readings taken at most max_age seconds before now.
+
+        Returns
+        -------
+        float
+            Filtered distance in cm, or None if there is no recent reading.
+        """
+        oldest = now - max_age
+        readings = sorted(distance for timestamp, distance in list(self._readings) if timestamp >= oldest)
+        if not readings:
+            return None
+        return readings[len(readings) // 2]
+
+
 class UltrasonicSensor():
     """Ultrasonic distance sensor class to measure distance.
+
+    The echo pulse is timed by pigpio edge callbacks, which carry hardware
+    timestamps, and every measurement is bounded by a timeout. An optional
+    background sampler keeps a ring buffer of readings and serves a
+    median-filtered distance to any thread without waiting for the sensor.
     """
 
-    def __init__(self, trig=27, echo=18):
+    # Centimeters per microsecond of echo pulse (half the speed of sound).
+    CM_PER_US = 0.01715
+
+    def __init__(self, trig=27, echo=18, timeout=0.05, window=5, pi=None):
         """Initialize the ultrasonic distance sensor.
 
         Parameters
@@ -118,36 +580,119 @@ class UltrasonicSensor():
             GPIO pin number for the trigger, by default 27
         echo : int, optional
             GPIO pin number for the echo, by default 18
+        timeout : float, optional
+            Maximum time to wait for an echo in seconds, by default 0.05
+        window : int, optional
+            Number of readings used by the median filter, by default 5
+        pi : pigpio.pi, optional
+            pigpio connection, by default a new connection
         """
         self.trig = trig
         self.echo = echo
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.trig, GPIO.OUT)
-        GPIO.setup(self.echo, GPIO.IN)
-    
+        self.timeout = timeout
+        self.pi = pigpio.pi() if pi is None else pi
+        self.pi.set_mode(self.trig, pigpio.OUTPUT)
+        self.pi.write(self.trig, 0)
+        self.pi.set_mode(self.echo, pigpio.INPUT)
+        self._rise_tick = None
+        self._pulse_us = None
+        self._echo_event = threading.Event()
+        self._read_lock = threading.Lock()
+        self._callback = self.pi.callback(self.echo, pigpio.EITHER_EDGE, self._on_echo)
+        self._init_sampler(window)
+
+    def _init_sampler(self, window):
+        """Prepare the ring buffer of the background sampler.
+        """
+        self._filter = MedianFilter(window)
+        self._sampler = None
+        self._sampling = False
+        self.timeouts = 0
+
+    def _on_echo(self, gpio, level, tick):
+        """Record the echo edges reported by pigpio.
+        """
+        if level == 1:
+            self._rise_tick = tick
+        elif level == 0 and self._rise_tick is not None:
+            self._pulse_us = pigpio.tickDiff(self._rise_tick, tick)
+            self._rise_tick = None
+            self._echo_event.set()
+
     def read_distance(self):
         """Read the distance from the ultrasonic distance sensor.
 
         Returns
         -------
         float
-            Distance in cm
-        """
-        GPIO.output(self.trig, GPIO.HIGH)
-        time.sleep(0.00001)
-        GPIO.output(self.trig, GPIO.LOW)
-        while GPIO.input(self.echo) == GPIO.LOW:
-            sig_off = time.time()
-        while GPIO.input(self.echo) == GPIO.HIGH:
-            sig_on = time.time()
-        duration = sig_off - sig_on
-        distance = duration * 17000
-        return distance
-    
+            Distance in cm, or None if no echo arrived before the timeout.
+        """
+        with self._read_lock:
+            self._echo_event.clear()
+            self._rise_tick = None
+            self.pi.gpio_trigger(self.trig, 10, 1)
+            if not self._echo_event.wait(self.timeout):
+                self.timeouts += 1
+                return None
+            return self._pulse_us * UltrasonicSensor.CM_PER_US
+
+    def start_sampling(self, interval=0.06):
+        """Start measuring continuously on a background thread.
+
+        Parameters
+        ----------
+        interval : float, optional
+            Time between measurements in seconds, by default 0.06
+        """
+        if self._sampling:
+            return
+        self._sampling = True
+        self._sampler = threading.Thread(target=self._sample, args=(interval,), name="UltrasonicSampler", daemon=True)
+        self._sampler.start()
+        return
+
+    def stop_sampling(self):
+        """Stop the background sampler.
+        """
+        self._sampling = False
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+            self._sampler = None
+        return
+
+    def _sample(self, interval):
+        """Fill the ring buffer with readings until stopped.
+        """
+        while self._sampling:
+            distance = self.read_distance()
+            if distance is not None:
+                self._filter.add(time.monotonic(), distance)
+            time.sleep(interval)
+
+    def latest_distance(self, max_age=1.0):
+        """Return the median of the recent readings.
+
+        When the background sampler is not running, a single reading is taken.
+
+        Parameters
+        ----------
+        max_age : float, optional
+            Readings older than this many seconds are ignored, by default 1.0
+
+        Returns
+        -------
+        float
+            Filtered distance in cm, or None if there is no valid reading.
+        """
+        if not self._sampling:
+            return self.read_distance()
+        return self._filter.value(time.monotonic(), max_age)
+
     def __del__(self):
-        """Clean up the GPIO pins.
+        """Stop sampling and release the pigpio callback.
         """
-        GPIO.cleanup()
+        self._sampling = False
+        self._callback.cancel()
 
 
 class MotionSensor():
@@ -175,10 +720,54 @@ class MotionSensor():
         GPIO.cleanup()
 
 
+# Pulse of a pigpio waveform, with the same fields as pigpio.pulse.
+Pulse = collections.namedtuple("Pulse", ["gpio_on", "gpio_off", "delay"])
+
+# pigpio.WAVE_MODE_ONE_SHOT_SYNC: start after the wave being transmitted ends.
+WAVE_MODE_ONE_SHOT_SYNC = 2
+
+
+def trapezoidal_delays(steps, max_rate, acceleration=None):
+    """Compute the step delays of a move with a trapezoidal speed profile.
+
+    The rate ramps up from rest at the given acceleration, cruises at the
+    maximum rate and ramps down symmetrically before the last step.
+
+    Parameters
+    ----------
+    steps : int
+        Number of steps
+    max_rate : float
+        Maximum rate in steps per second
+    acceleration : float, optional
+        Acceleration in steps per second squared, by default None (constant rate)
+
+    Returns
+    -------
+    numpy.ndarray
+        Delay after each step in microseconds.
+    """
+    rates = np.full(steps, float(max_rate))
+    if acceleration:
+        index = np.arange(steps, dtype=float)
+        ramp = np.sqrt(2.0 * acceleration * np.minimum(index + 1, steps - index))
+        rates = np.minimum(rates, ramp)
+    return np.maximum(np.rint(1e6 / rates), 1).astype(np.int64)
+
+
 class Stepper():
     """Stepper motor class to control the stepper motor.
+
+    step() drives the coils from a timing loop in Python. move() instead
+    precomputes the coil sequence into pigpio DMA waveforms, so the step timing
+    is kept by the hardware and the move runs in the background.
     """
 
+    # Pulses per waveform; longer moves are split into chained waveforms.
+    WAVE_PULSES = 2000
+    # Seconds between checks of the waveform being transmitted.
+    WAVE_POLL = 0.005
+
     def __init__(self, number_of_steps, mpins=[21, 17, 27, 22], method_step="half"):
         """Initialize the stepper motor.
 
@@ -195,6 +784,10 @@ class Stepper():
         self.direction = 0
         self.last_step_time = 0
         self.number_of_steps = number_of_steps
+        self.pin_numbers = list(mpins)
+        self.pi = None
+        self._move = None
+        self._move_cancel = threading.Event()
         self._method_step = method_step
         if method_step == "full":
             self._vlist = [[1, 1, 0, 0], [0, 1, 1, 0], [0, 0, 1, 1], [1, 0, 0, 1], [1, 1, 0, 0], [0, 1, 1, 0], [0, 0, 1, 1], [1, 0, 0, 1]]
@@ -203,10 +796,30 @@ class Stepper():
         else:
             self._vlist = [[1, 0, 0, 0], [1, 1, 0, 0], [0, 1, 0, 0], [0, 1, 1, 0], [0, 0, 1, 0], [0, 0, 1, 1], [0, 0, 0, 1], [1, 0, 0, 1]]
             self._method_step = "half"
-        factory = PiGPIOFactory()
-        self.mpins = [OutputDevice(pin, pin_factory=factory) for pin in mpins]
+        self.mpins = self._open_pins(mpins)
         self.set_speed()
 
+    def _open_pins(self, mpins):
+        """Open the motor pins.
+
+        Parameters
+        ----------
+        mpins : list
+            List of GPIO pin numbers for the motor
+
+        Returns
+        -------
+        list
+            Output devices for the motor pins.
+        """
+        factory = PiGPIOFactory()
+        return [OutputDevice(pin, pin_factory=factory) for pin in mpins]
+
+    def _open_wave(self):
+        """Open the pigpio connection used to transmit waveforms.
+        """
+        return pigpio.pi()
+
     def set_speed(self, what_speed=10):
         """Set the speed of the stepper motor.
 
@@ -261,29 +874,154 @@ class Stepper():
         for val, mpin in zip(self._vlist[this_step], self.mpins):
             mpin.on() if val else mpin.off()
         return
-    
-    def stop(self):
-        """Stop the motor.
+
+    def _advance(self, steps_left):
+        """Advance the step number in the current direction and return the coil indices.
+        """
+        sequence = []
+        for i in range(steps_left):
+            if self.direction == 1:
+                self.step_number += 1
+                if self.step_number == self.number_of_steps:
+                    self.step_number = 0
+            else:
+                if self.step_number == 0:
+                    self.step_number = self.number_of_steps
+                self.step_number -= 1
+            sequence.append(self.step_number % 8)
+        return sequence
+
+    def build_pulses(self, steps_to_move, acceleration=None):
+        """Build the waveform pulses of a move and advance the step number.
+
+        Parameters
+        ----------
+        steps_to_move : int
+            Number of steps to move, negative to move backwards
+        acceleration : float, optional
+            Acceleration in steps per second squared, by default None (constant speed)
+
+        Returns
+        -------
+        list
+            Pulses setting the coils of each step, followed by the step delay.
+        """
+        if self._method_step == "half":
+            steps_to_move *= 2
+        steps_left = abs(steps_to_move)
+        self.direction = 1 if steps_to_move > 0 else 0
+        masks = []
+        for coils in self._vlist:
+            on = sum(1 << pin for val, pin in zip(coils, self.pin_numbers) if val)
+            off = sum(1 << pin for val, pin in zip(coils, self.pin_numbers) if not val)
+            masks.append((on, off))
+        delays = trapezoidal_delays(steps_left, 1e9 / self.step_delay, acceleration)
+        return [Pulse(*masks[this_step], int(delay)) for this_step, delay in zip(self._advance(steps_left), delays)]
+
+    def move(self, steps_to_move, acceleration=None, auto_stop=True):
+        """Move the stepper motor with hardware-timed pigpio waveforms.
+
+        The move runs in the background at the speed set by set_speed(), and
+        with an acceleration it ramps up and down at both ends. A new move
+        waits for the previous one, and stop() cancels it.
+
+        Parameters
+        ----------
+        steps_to_move : int
+            Number of steps to move, negative to move backwards
+        acceleration : float, optional
+            Acceleration in steps per second squared, by default None (constant speed)
+        auto_stop : bool, optional
+            Stop the motor after moving, by default True
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future resolved with True when the move completes, or False if it was stopped.
+        """
+        if self.pi is None:
+            self.pi = self._open_wave()
+        if self._move is not None:
+            self._move.join()
+        self._move_cancel.clear()
+        pulses = self.build_pulses(steps_to_move, acceleration)
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        self._move = threading.Thread(target=self._transmit, args=(pulses, auto_stop, future), name="StepperWave", daemon=True)
+        self._move.start()
+        return future
+
+    def _transmit(self, pulses, auto_stop, future):
+        """Send the pulses as chained waveforms and resolve the future when done.
+        """
+        try:
+            previous = None
+            for start in range(0, len(pulses), Stepper.WAVE_PULSES):
+                if self._move_cancel.is_set():
+                    break
+                self.pi.wave_add_generic(pulses[start:start + Stepper.WAVE_PULSES])
+                wave_id = self.pi.wave_create()
+                self.pi.wave_send_using_mode(wave_id, WAVE_MODE_ONE_SHOT_SYNC)
+                if self._move_cancel.is_set():
+                    self.pi.wave_tx_stop()
+                if previous is not None:
+                    # 前の波形が終わってから削除する
+                    while self.pi.wave_tx_at() == previous and not self._move_cancel.wait(Stepper.WAVE_POLL):
+                        pass
+                    self.pi.wave_delete(previous)
+                previous = wave_id
+            while self.pi.wave_tx_busy() and not self._move_cancel.wait(Stepper.WAVE_POLL):
+                pass
+            if previous is not None:
+                self.pi.wave_delete(previous)
+            completed = not self._move_cancel.is_set()
+            if auto_stop and completed:
+                self.stop_coils()
+            future.set_result(completed)
+        except Exception as e:
+            future.set_exception(e)
+        return
+
+    def stop_coils(self):
+        """Turn off every coil.
         """
         for mpin in self.mpins:
             mpin.off()
         return
-    
+
+    def stop(self):
+        """Stop the motor, cancelling a running move.
+        """
+        if self._move is not None and self._move.is_alive():
+            self._move_cancel.set()
+            self.pi.wave_tx_stop()
+        self.stop_coils()
+        return
+
     def __del__(self):
         """Stop the motor and clean up the GPIO pins.
         """
         self.stop()
         for mpin in self.mpins:
             mpin.close()
+        if self.pi is not None:
+            self.pi.stop()
         return
-    
-    
+
+
 class LCD():
     """LCD class to control the LCD display.
+
+    The driver keeps a shadow framebuffer of the characters on the display.
+    update() compares the new lines with it and only rewrites the cells that
+    changed. The nibble and enable writes are packed into
+    ``write_i2c_block_data`` bursts instead of single bytes with sleeps, and
+    updates are rate limited so that the I2C bus stays free for other devices.
     """
 
     ADDR = 0x27  # LCDのI2Cアドレス
     WIDTH = 16  # LCDの文字数
+    ROWS = 2  # LCDの行数
     BACKLIGHT = 0x08  # バックライトの設定
     # HD44780コマンド
     CLEAR_DISPLAY = 0x01
@@ -294,12 +1032,34 @@ class LCD():
     CURSOR_ON = 0x0E
     BLINK_ON = 0x0F
     SET_DDRAM = 0x80
+    # 1回のSMBusブロック書き込みで送れる最大バイト数
+    BLOCK_SIZE = 32
+
+    def __init__(self, bus, rs=0x01, rw=0x02, en=0x04, min_interval=0.1):
+        """Initialize the display.
 
-    def __init__(self, bus, rs=0x01, rw=0x02, en=0x04):
+        Parameters
+        ----------
+        bus : smbus.SMBus
+            I2C bus of the display
+        rs : int, optional
+            Register select bit, by default 0x01
+        rw : int, optional
+            Read/write bit, by default 0x02
+        en : int, optional
+            Enable bit, by default 0x04
+        min_interval : float, optional
+            Minimum time between two updates in seconds, by default 0.1
+        """
         self.bus = bus
         self.rs = rs
         self.rw = rw
         self.en = en
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._pending = None
+        self._timer = None
+        self._last_update = 0.0
         self.lcd_init()
 
     def lcd_init(self):
@@ -317,6 +1077,9 @@ class LCD():
         time.sleep(0.00015)
         self.send(LCD.DISPLAY_ON, 0)
         time.sleep(0.00015)
+        # 画面消去後は全セルが空白でカーソルは左上
+        self._frame = [[" "] * LCD.WIDTH for row in range(LCD.ROWS)]
+        self._cursor = (0, 0)
 
     def send(self, data, mode):
         high = mode | (data & 0xF0) | LCD.BACKLIGHT
@@ -332,42 +1095,353 @@ class LCD():
         self.bus.write_byte(LCD.ADDR, (value & ~self.en))
         time.sleep(0.0005)
 
+    def _encode(self, data, mode):
+        """Return the bus bytes that send one byte, with the enable pulses.
+
+        Each byte on the bus takes about 90 us at 100 kHz, which is longer than
+        the enable pulse and the execution time of a write, so no sleep is needed.
+        """
+        encoded = []
+        for nibble in (data & 0xF0, (data << 4) & 0xF0):
+            value = mode | nibble | LCD.BACKLIGHT
+            encoded += [value, value | self.en, value & ~self.en]
+        return encoded
+
+    def _write_burst(self, encoded):
+        """Write bus bytes in as few block writes as possible.
+        """
+        for start in range(0, len(encoded), LCD.BLOCK_SIZE):
+            block = encoded[start:start + LCD.BLOCK_SIZE]
+            self.bus.write_i2c_block_data(LCD.ADDR, block[0], block[1:])
+        return
+
+    def _cursor_bytes(self, col, row):
+        self._cursor = (col, row)
+        return self._encode(LCD.SET_DDRAM | (col + (0x40 * row)), 0)
+
+    def _text_bytes(self, text):
+        """Encode characters at the cursor and record them in the framebuffer.
+        """
+        encoded = []
+        col, row = self._cursor
+        for char in text:
+            code = ord(char) if ord(char) < 0x100 else ord("?")
+            encoded += self._encode(code, self.rs)
+            if col < LCD.WIDTH:
+                self._frame[row][col] = char
+            col += 1
+        self._cursor = (col, row)
+        return encoded
+
     def set_cursor(self, col, row):
-        addr = LCD.SET_DDRAM | (col + (0x40 * row))
-        self.send(addr, 0)
+        with self._lock:
+            self._write_burst(self._cursor_bytes(col, row))
 
     def print_text(self, text):
-        for char in text:
-            self.send(ord(char), 1)
+        with self._lock:
+            self._write_burst(self._text_bytes(text))
+
+    def lines(self):
+        """Return the text currently on the display.
+        """
+        with self._lock:
+            return ["".join(row) for row in self._frame]
+
+    def update(self, lines, force=False):
+        """Show the given lines, sending only the cells that changed.
+
+        When the previous update was less than min_interval ago, the lines are
+        kept and shown at the end of the interval, and later calls replace them.
+
+        Parameters
+        ----------
+        lines : list of str
+            Text of each row, padded or cut to the display width
+        force : bool, optional
+            Ignore the rate limit, by default False
+
+        Returns
+        -------
+        bool
+            True if the display was updated now.
+        """
+        with self._lock:
+            self._pending = [str(line)[:LCD.WIDTH].ljust(LCD.WIDTH) for line in list(lines)[:LCD.ROWS]]
+            wait = self._last_update + self.min_interval - time.monotonic()
+            if wait > 0 and not force:
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return False
+            self._flush_locked()
+        return True
+
+    def flush(self):
+        """Show the lines kept back by the rate limit.
+        """
+        with self._lock:
+            self._flush_locked()
+        return
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending is None:
+            return
+        encoded = []
+        for row, line in enumerate(self._pending):
+            col = 0
+            while col < LCD.WIDTH:
+                if line[col] == self._frame[row][col]:
+                    col += 1
+                    continue
+                end = col
+                while end < LCD.WIDTH and line[end] != self._frame[row][end]:
+                    end += 1
+                if self._cursor != (col, row):
+                    encoded += self._cursor_bytes(col, row)
+                encoded += self._text_bytes(line[col:end])
+                col = end
+        self._pending = None
+        self._last_update = time.monotonic()
+        if encoded:
+            self._write_burst(encoded)
+        return
+
+
+class AudioRequest():
+    """Handle of a clip submitted to the Speaker.
+    """
+
+    def __init__(self, file_name, priority):
+        """Initialize the request.
+
+        Parameters
+        ----------
+        file_name : str
+            Name of the audio file
+        priority : int
+            Priority of the clip, lower values are more urgent
+        """
+        self.file_name = file_name
+        self.priority = priority
+        self.preempted = False
+        self.cancelled = False
+        self.created_at = time.monotonic()
+        self._done = threading.Event()
+
+    def done(self):
+        """Return whether the clip has finished playing or was preempted.
+        """
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Wait until the clip has finished playing or was preempted.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait in seconds, by default None
+
+        Returns
+        -------
+        bool
+            True if the clip is done.
+        """
+        return self._done.wait(timeout)
 
 
 class Speaker():
     """Speaker class to play audio.
+
+    Audio clips are decoded once into raw PCM in a common sample format and
+    cached by path and modification time, so playback never decodes. Clips are
+    played by a dedicated worker thread from a priority queue: callers do not
+    block, a more urgent clip stops a less urgent one that is playing, and a
+    clip that is already pending is not queued twice.
     """
 
-    def __init__(self, path=None):
-        """Initialize the speaker object.
+    SAMPLE_RATE = 44100
+    SAMPLE_WIDTH = 2
+    CHANNELS = 2
+    AUDIO_EXTENSIONS = (".wav", ".mp3")
+    PRIORITY_ALERT = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_GREETING = 2
+
+    def __init__(self, path=None, preload=True, max_cache_bytes=None):
+        """Initialize the speaker object and start the playback worker.
 
         Parameters
         ----------
         path : str, optional
             Path of the audio file, by default None
+        preload : bool, optional
+            Decode every audio file in path at startup, by default True
+        max_cache_bytes : int, optional
+            Maximum size of the decoded audio cache, by default None (no limit)
         """
         self.path = path
+        self.max_cache_bytes = max_cache_bytes
+        self._cache = collections.OrderedDict()
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()
+        self._queue = []
+        self._pending = {}
+        self._sequence = 0
+        self._queue_cond = threading.Condition()
+        self._running = True
         if path is None:
             print('Path is not provided.')
-    
-    def play_audio(self, file_name):
-        """Play the audio file.
+        elif preload:
+            self.preload()
+        self._worker = threading.Thread(target=self._playback_worker, name="Speaker", daemon=True)
+        self._worker.start()
+
+    def preload(self):
+        """Decode every audio file in the speaker's directory into the cache.
+        """
+        for file_name in sorted(os.listdir(self.path)):
+            if file_name.lower().endswith(Speaker.AUDIO_EXTENSIONS):
+                self.load_audio(file_name)
+        return
+
+    def load_audio(self, file_name):
+        """Return the decoded audio, decoding it only if it is not cached or changed.
 
         Parameters
         ----------
         file_name : str
             Name of the audio file
+
+        Returns
+        -------
+        AudioSegment
+            The audio as raw PCM in the common sample format.
         """
         path = os.path.join(self.path, file_name)
+        mtime = os.stat(path).st_mtime_ns
+        with self._cache_lock:
+            entry = self._cache.get(path)
+            if entry is not None and entry[0] == mtime:
+                self._cache.move_to_end(path)
+                return entry[1]
         sound = AudioSegment.from_file(path)
-        play(sound)
+        sound = sound.set_frame_rate(Speaker.SAMPLE_RATE).set_channels(Speaker.CHANNELS).set_sample_width(Speaker.SAMPLE_WIDTH)
+        with self._cache_lock:
+            old = self._cache.pop(path, None)
+            if old is not None:
+                self._cache_bytes -= len(old[1].raw_data)
+            self._cache[path] = (mtime, sound)
+            self._cache_bytes += len(sound.raw_data)
+            while self.max_cache_bytes is not None and self._cache_bytes > self.max_cache_bytes and len(self._cache) > 1:
+                _, (_, evicted) = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted.raw_data)
+        return sound
+
+    def play_audio(self, file_name, priority=PRIORITY_NORMAL, wait=False):
+        """Queue the audio file for playback.
+
+        Parameters
+        ----------
+        file_name : str
+            Name of the audio file
+        priority : int, optional
+            Priority of the clip, lower values are more urgent, by default PRIORITY_NORMAL
+        wait : bool, optional
+            Block until the clip has finished playing, by default False
+
+        Returns
+        -------
+        AudioRequest
+            Handle to wait on the clip. If the same clip is already pending, its
+            existing handle is returned.
+        """
+        metrics.inc("audio_requests_total", priority=priority)
+        with self._queue_cond:
+            request = self._pending.get(file_name)
+            if request is None or priority < request.priority:
+                new_request = AudioRequest(file_name, priority)
+                if request is not None:
+                    # Requeue the pending clip at the more urgent priority.
+                    request.cancelled = True
+                    new_request._done = request._done
+                request = new_request
+                self._pending[file_name] = request
+                heapq.heappush(self._queue, (priority, self._sequence, request))
+                self._sequence += 1
+                self._queue_cond.notify()
+        if wait:
+            request.wait()
+        return request
+
+    def _next_request(self):
+        """Pop the most urgent pending request, waiting until one exists.
+        """
+        with self._queue_cond:
+            while self._running:
+                while self._queue:
+                    _, _, request = heapq.heappop(self._queue)
+                    if not request.cancelled:
+                        del self._pending[request.file_name]
+                        return request
+                self._queue_cond.wait()
+            return None
+
+    def _preempted(self, request):
+        """Return whether a more urgent request is waiting.
+        """
+        with self._queue_cond:
+            return not self._running or any(
+                queued[0] < request.priority and not queued[2].cancelled for queued in self._queue)
+
+    def _play_clip(self, request):
+        """Play one clip, stopping early if a more urgent clip is queued.
+        """
+        sound = self.load_audio(request.file_name)
+        if simpleaudio is None:
+            play(sound)
+            return
+        play_obj = simpleaudio.play_buffer(sound.raw_data, sound.channels, sound.sample_width, sound.frame_rate)
+        while play_obj.is_playing():
+            if self._preempted(request):
+                play_obj.stop()
+                request.preempted = True
+                break
+            time.sleep(0.01)
+        return
+
+    def _playback_worker(self):
+        """Play queued clips until the speaker is closed.
+        """
+        while True:
+            request = self._next_request()
+            if request is None:
+                return
+            metrics.observe("stage_seconds", time.monotonic() - request.created_at, stage="audio_queue")
+            try:
+                with metrics.timer("stage_seconds", stage="audio_play"):
+                    self._play_clip(request)
+                if request.preempted:
+                    metrics.inc("audio_preemptions_total")
+            except Exception as e:
+                print("Error in Speaker:", e)
+            finally:
+                request._done.set()
+
+    def close(self):
+        """Stop the playback worker and drop pending clips.
+        """
+        with self._queue_cond:
+            self._running = False
+            for _, _, request in self._queue:
+                request.cancelled = True
+                request._done.set()
+            self._queue.clear()
+            self._pending.clear()
+            self._queue_cond.notify()
         return
     
 
@@ -399,28 +1473,70 @@ class ServoMotor():
         self.pi.set_servo_pulsewidth(self.pin, pulse_width)
         
 
-def input_json(file_path):
-    """Read a JSON
-
-    Parameters
-    ----------
-    file_path : str
-        Path of the JSON file
+class HaltableMotor():
+    """Wraps a motor so that it refuses commands once it was halted.
 
-    Returns
-    -------
-    AttrDict
-        JSON data as an AttrDict object
+    The runtime halts the motors when it shuts down. A worker that is still
+    in the middle of a sequence of moves then cannot start the motor again
+    after it was stopped.
     """
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-    return AttrDict(data)
+
+    def __init__(self, motor):
+        """Wrap the motor.
+
+        Parameters
+        ----------
+        motor : object
+            Motor with run_for_rotations, run_for_degrees, run_for_seconds,
+            start and stop, such as buildhat.Motor
+        """
+        self.motor = motor
+        self.halted = False
+        self._lock = threading.Lock()
+
+    def _command(self, name, *args, **kwargs):
+        with self._lock:
+            if self.halted:
+                return None
+            method = getattr(self.motor, name)
+        return method(*args, **kwargs)
+
+    def run_for_rotations(self, rotations, speed=None, blocking=True):
+        return self._command("run_for_rotations", rotations, speed, blocking=blocking)
+
+    def run_for_degrees(self, degrees, speed=None, blocking=True):
+        return self._command("run_for_degrees", degrees, speed, blocking=blocking)
+
+    def run_for_seconds(self, seconds, speed=None, blocking=True):
+        return self._command("run_for_seconds", seconds, speed, blocking=blocking)
+
+    def start(self, speed=None):
+        return self._command("start", speed)
+
+    def stop(self):
+        self.motor.stop()
+        return
+
+    def halt(self):
+        """Stop the motor and ignore every later command.
+        """
+        with self._lock:
+            self.halted = True
+        self.motor.stop()
+        return
+
+    def __getattr__(self, name):
+        return getattr(self.motor, name)
+
 
 def quit_program():
-    """Exits the program when the user enters 'q'.
+    """Blocks until the user enters 'q' or the input is closed.
     """
     while True:
-        char = input()
+        try:
+            char = input()
+        except EOFError:
+            return
         if char == "q":
             print("プログラムを終了します")
-            sys.exit()
\ No newline at end of file
+            return
\ No newline at end of file
@@ -0,0 +1,107 @@
+import importlib
+
+# Device implementations per backend, as "module:attribute" paths so that a
+# backend's dependencies are only imported when one of its devices is created.
+DEVICE_BACKENDS = {
+    "hardware": {
+        "camera": "utils.common_functions:FrameGrabber",
+        "ultrasonic_sensor": "utils.common_functions:UltrasonicSensor",
+        "motion_sensor": "utils.common_functions:MotionSensor",
+        "stepper": "utils.common_functions:Stepper",
+        "lcd": "utils.common_functions:LCD",
+        "servo_motor": "utils.common_functions:ServoMotor",
+        "speaker": "utils.common_functions:Speaker",
+        "led": "lightning_control:LED",
+        "organic_el": "lightning_control:OrganicEL",
+        "motor": "buildhat:Motor",
+    },
+    "simulated": {
+        "camera": "utils.simulated_devices:SimulatedFrameGrabber",
+        "ultrasonic_sensor": "utils.simulated_devices:SimulatedUltrasonicSensor",
+        "motion_sensor": "utils.simulated_devices:SimulatedMotionSensor",
+        "stepper": "utils.simulated_devices:SimulatedStepper",
+        "lcd": "utils.simulated_devices:SimulatedLCD",
+        "servo_motor": "utils.simulated_devices:SimulatedServoMotor",
+        "speaker": "utils.simulated_devices:SimulatedSpeaker",
+        "led": "utils.simulated_devices:SimulatedLED",
+        "organic_el": "utils.simulated_devices:SimulatedOrganicEL",
+        "motor": "utils.simulated_devices:SimulatedMotor",
+    },
+}
+
+_config = {"default": "hardware", "backends": {}, "options": {}}
+
+
+def register_device(kind, backend, target):
+    """Register a device implementation.
+
+    Parameters
+    ----------
+    kind : str
+        Device kind, e.g. "camera"
+    backend : str
+        Backend name, e.g. "simulated"
+    target : str or callable
+        Class or factory, or a "module:attribute" path to one
+    """
+    DEVICE_BACKENDS.setdefault(backend, {})[kind] = target
+    return
+
+
+def configure_devices(default="hardware", backends=None, options=None):
+    """Select the backend used for each device kind.
+
+    Parameters
+    ----------
+    default : str, optional
+        Backend used for kinds without an explicit choice, by default "hardware"
+    backends : dict, optional
+        Backend name per device kind, by default None
+    options : dict, optional
+        Extra keyword arguments per backend and device kind, e.g.
+        ``{"simulated": {"camera": {"source": "frames/"}}}``, by default None
+    """
+    if default not in DEVICE_BACKENDS:
+        raise ValueError(f"Unknown device backend: {default}")
+    _config["default"] = default
+    _config["backends"] = dict(backends or {})
+    _config["options"] = {backend: {kind: dict(kwargs) for kind, kwargs in kinds.items()}
+                          for backend, kinds in (options or {}).items()}
+    return
+
+
+def device_backend(kind):
+    """Return the backend name selected for a device kind.
+    """
+    return _config["backends"].get(kind, _config["default"])
+
+
+def create_device(kind, *args, backend=None, **kwargs):
+    """Create a device with the configured backend.
+
+    Parameters
+    ----------
+    kind : str
+        Device kind, e.g. "camera"
+    *args
+        Positional arguments of the device constructor
+    backend : str, optional
+        Backend name overriding the configuration, by default None
+    **kwargs
+        Keyword arguments of the device constructor
+
+    Returns
+    -------
+    object
+        The device.
+    """
+    backend = device_backend(kind) if backend is None else backend
+    try:
+        target = DEVICE_BACKENDS[backend][kind]
+    except KeyError:
+        raise ValueError(f"No {backend} backend for device {kind}")
+    if isinstance(target, str):
+        module_name, attribute = target.split(":")
+        target = getattr(importlib.import_module(module_name), attribute)
+    options = _config["options"].get(backend, {}).get(kind, {})
+    return target(*args, **{**options, **kwargs})
@@ -11,14 +11,10 @@ def main():
     text_line2 = target_ip.ipaddr("eth0")
 
 
-    lcd.set_cursor(0, 0)
-    lcd.print_text(text_line1)
-
-    lcd.set_cursor(0, 1)
-    lcd.print_text(text_line2)
+    lcd.update([text_line1, text_line2])
 
     time.sleep(10)
-    lcd.send(LCD.CLEAR_DISPLAY, 1)
+    lcd.update(["", ""], force=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
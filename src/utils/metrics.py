@@ -0,0 +1,301 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets in seconds.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prefix of every exported metric name.
+PREFIX = "sozo_"
+
+
+class Counter():
+    """Monotonically increasing count.
+    """
+
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram():
+    """Distribution of observed values over fixed buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {"buckets": list(self.buckets), "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+class _Timer():
+    """Context manager observing the elapsed ``time.monotonic()`` time into a histogram.
+    """
+
+    __slots__ = ("registry", "key", "start")
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry._observe(self.key, time.monotonic() - self.start)
+        return False
+
+
+class _NullTimer():
+    """Timer returned while the registry is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry():
+    """In-process registry of counters and latency histograms.
+
+    Metrics are identified by a name and keyword labels and created on first
+    use. While the registry is disabled, every call returns at once and timer()
+    returns a shared no-op context manager, so instrumented code pays almost
+    nothing.
+    """
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        """Initialize an empty registry.
+
+        Parameters
+        ----------
+        enabled : bool, optional
+            Whether metrics are recorded, by default False
+        buckets : tuple, optional
+            Bucket upper bounds of new histograms in seconds, by default DEFAULT_BUCKETS
+        """
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, key):
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = cls(self.buckets) if cls is Histogram else cls()
+        elif not isinstance(metric, cls):
+            raise TypeError(f"{key[0]} is a {metric.kind}")
+        return metric
+
+    def inc(self, name, amount=1, **labels):
+        """Increase a counter.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._get(Counter, (name, tuple(sorted(labels.items())))).inc(amount)
+
+    def observe(self, name, value, **labels):
+        """Record a value in a histogram.
+        """
+        if not self.enabled:
+            return
+        self._observe((name, tuple(sorted(labels.items()))), value)
+
+    def _observe(self, key, value):
+        with self._lock:
+            self._get(Histogram, key).observe(value)
+
+    def timer(self, name, **labels):
+        """Return a context manager that records its duration in seconds in a histogram.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, (name, tuple(sorted(labels.items()))))
+
+    def reset(self):
+        """Remove every metric.
+        """
+        with self._lock:
+            self._metrics.clear()
+        return
+
+    def snapshot(self):
+        """Return a copy of every metric.
+
+        Returns
+        -------
+        list
+            One dict per metric with its name, kind, labels and value.
+        """
+        with self._lock:
+            return [{"name": name, "kind": metric.kind, "labels": dict(labels), "value": metric.snapshot()}
+                    for (name, labels), metric in sorted(self._metrics.items(), key=lambda item: item[0])]
+
+    def to_json(self):
+        """Return the snapshot as one JSON line with a wall-clock timestamp.
+        """
+        return json.dumps({"time": time.time(), "metrics": self.snapshot()}, ensure_ascii=False)
+
+    def to_prometheus(self):
+        """Return the snapshot in the Prometheus text exposition format.
+        """
+        lines = []
+        declared = set()
+        for entry in self.snapshot():
+            name = PREFIX + entry["name"]
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {entry['kind']}")
+            labels = entry["labels"]
+            if entry["kind"] == "counter":
+                lines.append(f"{name}{_format_labels(labels)} {entry['value']}")
+                continue
+            value = entry["value"]
+            cumulative = 0
+            for bound, count in zip(value["buckets"] + ["+Inf"], value["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels, **extra):
+    """Format labels as a Prometheus label set.
+    """
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for key, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+
+class MetricsExporter():
+    """Writes registry snapshots to files on a background thread.
+
+    The Prometheus text file is replaced atomically so that a node_exporter
+    textfile collector never reads a partial file, and each snapshot is also
+    appended to a JSON lines file.
+    """
+
+    def __init__(self, registry, interval=10.0, prometheus_path=None, jsonl_path=None):
+        """Prepare the exporter.
+
+        Parameters
+        ----------
+        registry : MetricsRegistry
+            Registry to export
+        interval : float, optional
+            Seconds between two exports, by default 10.0
+        prometheus_path : str, optional
+            Prometheus text file, by default None (not written)
+        jsonl_path : str, optional
+            JSON lines file, by default None (not written)
+        """
+        self.registry = registry
+        self.interval = interval
+        self.prometheus_path = prometheus_path
+        self.jsonl_path = jsonl_path
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start exporting.
+
+        Returns
+        -------
+        MetricsExporter
+            The exporter itself, so that it can be chained after the constructor.
+        """
+        if self._thread is not None:
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop exporting after writing a last snapshot.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        return
+
+    def export(self):
+        """Write one snapshot now.
+        """
+        if self.prometheus_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.prometheus_path)), exist_ok=True)
+            temp_path = self.prometheus_path + ".tmp"
+            with open(temp_path, "w") as f:
+                f.write(self.registry.to_prometheus())
+            os.replace(temp_path, self.prometheus_path)
+        if self.jsonl_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.jsonl_path)), exist_ok=True)
+            with open(self.jsonl_path, "a") as f:
+                f.write(self.registry.to_json() + "\n")
+        return
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._export_safely()
+        self._export_safely()
+
+    def _export_safely(self):
+        try:
+            self.export()
+        except OSError as e:
+            print("Error in MetricsExporter:", e)
+
+
+# Registry shared by the whole program, disabled until configured.
+REGISTRY = MetricsRegistry()
+
+
+def timer(name, **labels):
+    """Time a block with the shared registry, see MetricsRegistry.timer().
+    """
+    return REGISTRY.timer(name, **labels)
+
+
+def inc(name, amount=1, **labels):
+    """Increase a counter of the shared registry.
+    """
+    REGISTRY.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    """Record a value in a histogram of the shared registry.
+    """
+    REGISTRY.observe(name, value, **labels)
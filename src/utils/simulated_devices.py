@@ -0,0 +1,549 @@
+import os
+import threading
+import time
+import wave
+import numpy as np
+import cv2
+
+from utils.common_functions import FrameGrabber, UltrasonicSensor, Stepper, LCD, Speaker, WAVE_MODE_ONE_SHOT_SYNC
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_distance_trace(path):
+    """Load an ultrasonic distance trace.
+
+    The trace is a CSV file with one ``time_s,distance_cm`` row per reading.
+    Lines starting with # are ignored and an empty distance is a missed echo.
+
+    Parameters
+    ----------
+    path : str
+        Path of the CSV file.
+
+    Returns
+    -------
+    tuple
+        (times, distances) float arrays, with NaN for missed echoes.
+    """
+    data = np.genfromtxt(path, delimiter=",", comments="#", ndmin=2)
+    data = data[~np.isnan(data[:, 0])]
+    return data[:, 0], data[:, 1]
+
+
+class SimulatedCapture():
+    """Stand-in for cv2.VideoCapture that plays frames from files at a fixed rate.
+
+    The source can be a video file, a directory of images or None for a blank
+    gray frame. Frames are resized to the requested size and the source loops
+    when it ends.
+    """
+
+    def __init__(self, source=None, width=640, height=480, fps=30, loop=True):
+        """Open the frame source.
+
+        Parameters
+        ----------
+        source : str, optional
+            Video file or image directory, by default None
+        width : int, optional
+            Frame width, by default 640
+        height : int, optional
+            Frame height, by default 480
+        fps : float, optional
+            Frame rate of the simulated camera, by default 30
+        loop : bool, optional
+            Restart the source when it ends, by default True
+        """
+        self.source = source
+        self.size = (width, height)
+        self.interval = 1.0 / fps
+        self.loop = loop
+        self._next_time = time.monotonic()
+        self._video = None
+        self._images = None
+        self._index = 0
+        if source is not None and os.path.isdir(source):
+            self._images = sorted(os.path.join(source, name) for name in os.listdir(source)
+                                  if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif source is not None:
+            self._video = cv2.VideoCapture(source)
+
+    def isOpened(self):
+        return self.source is None or bool(self._images) or (self._video is not None and self._video.isOpened())
+
+    def set(self, prop, value):
+        return False
+
+    def _next_frame(self):
+        """Return the next BGR frame of the source, or None at the end.
+        """
+        if self._images is not None:
+            if self._index >= len(self._images):
+                if not self.loop or not self._images:
+                    return None
+                self._index = 0
+            frame = cv2.imread(self._images[self._index])
+            self._index += 1
+            return frame
+        if self._video is not None:
+            ret, frame = self._video.read()
+            if not ret and self.loop:
+                self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self._video.read()
+            return frame if ret else None
+        return np.full((self.size[1], self.size[0], 3), 128, dtype=np.uint8)
+
+    def read(self, image=None):
+        """Wait for the next frame time and return the next frame.
+
+        Parameters
+        ----------
+        image : numpy.ndarray, optional
+            Buffer to write the frame into, by default None
+
+        Returns
+        -------
+        tuple
+            (ret, frame) like cv2.VideoCapture.read().
+        """
+        delay = self._next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_time = max(self._next_time + self.interval, time.monotonic())
+        frame = self._next_frame()
+        if frame is None:
+            return False, image
+        if frame.shape[1::-1] != self.size:
+            if image is not None and image.shape[1::-1] == self.size:
+                return True, cv2.resize(frame, self.size, dst=image)
+            return True, cv2.resize(frame, self.size)
+        return True, frame
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
+
+
+class SimulatedFrameGrabber(FrameGrabber):
+    """FrameGrabber that reads frames from files instead of a camera.
+    """
+
+    def __init__(self, dev_id=0, width=640, height=480, buffer_size=3, source=None, fps=30, loop=True):
+        """Initialize the simulated grabber.
+
+        Parameters
+        ----------
+        dev_id : int, optional
+            Ignored, by default 0
+        width : int, optional
+            Frame width, by default 640
+        height : int, optional
+            Frame height, by default 480
+        buffer_size : int, optional
+            Number of frames kept in the ring buffer, by default 3
+        source : str, optional
+            Video file or image directory, by default None (gray frames)
+        fps : float, optional
+            Frame rate of the simulated camera, by default 30
+        loop : bool, optional
+            Restart the source when it ends, by default True
+        """
+        self.source = source
+        self.fps = fps
+        self.loop = loop
+        super().__init__(dev_id, width, height, buffer_size)
+
+    def _open(self, dev_id, width, height):
+        return SimulatedCapture(self.source, width, height, self.fps, self.loop)
+
+
+class SimulatedUltrasonicSensor(UltrasonicSensor):
+    """Ultrasonic sensor that replays a distance trace with realistic echo delays.
+    """
+
+    def __init__(self, trig=27, echo=18, timeout=0.05, window=5, trace=None, distance=60.0, loop=True):
+        """Initialize the simulated sensor.
+
+        Parameters
+        ----------
+        trig : int, optional
+            Ignored, by default 27
+        echo : int, optional
+            Ignored, by default 18
+        timeout : float, optional
+            Time a missed echo takes in seconds, by default 0.05
+        window : int, optional
+            Number of readings used by the median filter, by default 5
+        trace : str, optional
+            Distance trace CSV, see load_distance_trace(), by default None
+        distance : float, optional
+            Constant distance in cm used without a trace, by default 60.0
+        loop : bool, optional
+            Restart the trace when it ends, by default True
+        """
+        self.trig = trig
+        self.echo = echo
+        self.timeout = timeout
+        self.loop = loop
+        self._read_lock = threading.Lock()
+        if trace is None:
+            self._times, self._distances = np.zeros(1), np.array([distance], dtype=float)
+        else:
+            self._times, self._distances = load_distance_trace(trace)
+        self._start = time.monotonic()
+        self._init_sampler(window)
+
+    def distance_at(self, elapsed):
+        """Return the trace distance at the given time, or None for a missed echo.
+
+        Parameters
+        ----------
+        elapsed : float
+            Seconds since the sensor was created.
+        """
+        if self.loop and self._times[-1] > 0:
+            elapsed %= self._times[-1]
+        index = max(np.searchsorted(self._times, elapsed, side="right") - 1, 0)
+        distance = self._distances[index]
+        return None if np.isnan(distance) else float(distance)
+
+    def read_distance(self):
+        with self._read_lock:
+            distance = self.distance_at(time.monotonic() - self._start)
+            if distance is None:
+                time.sleep(self.timeout)
+                self.timeouts += 1
+                return None
+            time.sleep(10e-6 + distance / UltrasonicSensor.CM_PER_US * 1e-6)
+            return distance
+
+    def __del__(self):
+        self._sampling = False
+
+
+class SimulatedMotionSensor():
+    """Motion sensor with a fixed detection state.
+    """
+
+    def __init__(self, pin=14, presence=True):
+        self.pin = pin
+        self.presence = presence
+
+    def detect_human(self):
+        return self.presence
+
+
+class SimulatedOutputDevice():
+    """Records the state of a gpiozero OutputDevice.
+    """
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.value = 0
+        self.toggles = 0
+
+    def on(self):
+        self.toggles += self.value == 0
+        self.value = 1
+
+    def off(self):
+        self.toggles += self.value == 1
+        self.value = 0
+
+    def close(self):
+        self.value = 0
+
+
+class SimulatedPigpio():
+    """pigpio connection stand-in that transmits waveforms on a simulated clock.
+
+    Waves take as long as the sum of their pulse delays, and every transmitted
+    pulse is logged with its start tick in microseconds so that step timing can
+    be checked. Waves longer than max_pulses are rejected like on pigpio.
+    """
+
+    NO_TX_WAVE = 9998
+
+    def __init__(self, max_pulses=12000):
+        """Initialize the simulated connection.
+
+        Parameters
+        ----------
+        max_pulses : int, optional
+            Maximum pulses per wave, by default 12000
+        """
+        self.max_pulses = max_pulses
+        self.sent = []
+        self._pending = []
+        self._waves = {}
+        self._next_id = 0
+        self._schedule = []
+        self._lock = threading.Lock()
+        self._epoch = time.monotonic()
+
+    def _tick(self):
+        return int((time.monotonic() - self._epoch) * 1e6)
+
+    def wave_add_generic(self, pulses):
+        self._pending.extend(pulses)
+        if len(self._pending) > self.max_pulses:
+            raise RuntimeError(f"Too many pulses in a wave: {len(self._pending)} > {self.max_pulses}")
+        return len(self._pending)
+
+    def wave_create(self):
+        wave_id = self._next_id
+        self._next_id += 1
+        self._waves[wave_id] = self._pending
+        self._pending = []
+        return wave_id
+
+    def wave_delete(self, wave_id):
+        with self._lock:
+            if any(scheduled == wave_id for scheduled, start, end in self._schedule if end > self._tick()):
+                raise RuntimeError(f"Wave {wave_id} deleted while being transmitted")
+        del self._waves[wave_id]
+
+    def wave_send_using_mode(self, wave_id, mode):
+        """Queue a wave after the one being transmitted, or replace it in one-shot mode.
+        """
+        with self._lock:
+            now = self._tick()
+            if mode != WAVE_MODE_ONE_SHOT_SYNC:
+                self._truncate(now)
+            start = max([now] + [end for scheduled, begin, end in self._schedule])
+            tick = start
+            for pulse in self._waves[wave_id]:
+                self.sent.append((tick, pulse.gpio_on, pulse.gpio_off))
+                tick += pulse.delay
+            self._schedule.append((wave_id, start, tick))
+        return len(self._waves[wave_id])
+
+    def _truncate(self, now):
+        self._schedule = [(wave_id, start, min(end, now)) for wave_id, start, end in self._schedule if start <= now]
+        self.sent = [entry for entry in self.sent if entry[0] <= now]
+
+    def wave_tx_stop(self):
+        with self._lock:
+            self._truncate(self._tick())
+
+    def wave_tx_busy(self):
+        now = self._tick()
+        with self._lock:
+            return int(any(end > now for wave_id, start, end in self._schedule))
+
+    def wave_tx_at(self):
+        now = self._tick()
+        with self._lock:
+            for wave_id, start, end in self._schedule:
+                if start <= now < end:
+                    return wave_id
+        return SimulatedPigpio.NO_TX_WAVE
+
+    def step_intervals(self):
+        """Return the microseconds between consecutive transmitted pulses.
+        """
+        ticks = np.array([tick for tick, gpio_on, gpio_off in self.sent], dtype=np.int64)
+        return np.diff(ticks)
+
+    def stop(self):
+        return
+
+
+class SimulatedStepper(Stepper):
+    """Stepper whose coils are simulated output devices, keeping the real step timing.
+
+    move() transmits its waveforms on a SimulatedPigpio.
+    """
+
+    def _open_pins(self, mpins):
+        return [SimulatedOutputDevice(pin) for pin in mpins]
+
+    def _open_wave(self):
+        return SimulatedPigpio()
+
+
+class SimulatedSMBus():
+    """SMBus stand-in that takes as long as the I2C transfers would.
+    """
+
+    def __init__(self, bus=1, clock_hz=100000):
+        """Initialize the simulated bus.
+
+        Parameters
+        ----------
+        bus : int, optional
+            Ignored, by default 1
+        clock_hz : int, optional
+            I2C clock used for the timing model, by default 100000
+        """
+        self.byte_time = 9.0 / clock_hz
+        self.bytes_written = 0
+        self.transactions = 0
+
+    def _transfer(self, count):
+        self.bytes_written += count
+        self.transactions += 1
+        time.sleep(self.byte_time * (count + 1))
+
+    def write_byte(self, addr, value):
+        self._transfer(1)
+
+    def write_i2c_block_data(self, addr, cmd, data):
+        self._transfer(2 + len(data))
+
+
+class SimulatedLCD(LCD):
+    """LCD driven over a simulated I2C bus.
+    """
+
+    def __init__(self, bus=None, **kwargs):
+        super().__init__(SimulatedSMBus() if bus is None else bus, **kwargs)
+
+
+class SimulatedServoMotor():
+    """Servo motor that records the commanded angle.
+    """
+
+    def __init__(self, pin=18):
+        self.pin = pin
+        self.angle = None
+
+    def set_angle(self, angle):
+        assert 0 <= angle <= 180, 'Angle must be between 0 and 180.'
+        self.angle = angle
+
+
+class SimulatedSpeaker(Speaker):
+    """Speaker that takes as long as the clips would play, without an audio device.
+    """
+
+    # Bit rate assumed to estimate the length of compressed clips.
+    ASSUMED_BITRATE = 128000
+
+    def load_audio(self, file_name):
+        """Return the duration of the clip in seconds.
+        """
+        path = os.path.join(self.path, file_name)
+        with self._cache_lock:
+            if path in self._cache:
+                return self._cache[path]
+        if path.lower().endswith(".wav"):
+            with wave.open(path) as f:
+                duration = f.getnframes() / f.getframerate()
+        else:
+            duration = os.path.getsize(path) * 8 / SimulatedSpeaker.ASSUMED_BITRATE
+        with self._cache_lock:
+            self._cache[path] = duration
+        return duration
+
+    def _play_clip(self, request):
+        end = time.monotonic() + self.load_audio(request.file_name)
+        while time.monotonic() < end:
+            if self._preempted(request):
+                request.preempted = True
+                break
+            time.sleep(0.01)
+        return
+
+
+class SimulatedLED():
+    """LED that records its power state.
+    """
+
+    def __init__(self, hub_num=2, port=None):
+        self.hub_num = hub_num
+        self.port = port
+        self.state = None
+        self.transitions = 0
+
+    def on(self):
+        self.transitions += self.state is not True
+        self.state = True
+
+    def off(self):
+        self.transitions += self.state is not False
+        self.state = False
+
+    def blink(self, t=5):
+        for i in range(t):
+            self.on()
+            self.off()
+
+    def close(self):
+        return
+
+
+class SimulatedOrganicEL():
+    """Organic EL that records its state.
+    """
+
+    def __init__(self, pin=2):
+        self.pin = pin
+        self.state = False
+
+    def on(self):
+        self.state = True
+
+    def off(self):
+        self.state = False
+
+
+class SimulatedMotor():
+    """buildhat.Motor stand-in whose moves take as long as on the real motor.
+
+    Moves are timed from the speed (percent of the maximum) and the maximum
+    speed of a LEGO Technic motor, and stop() interrupts a running move.
+    """
+
+    MAX_RPM = 175
+    DEFAULT_SPEED = 20
+
+    def __init__(self, port):
+        self.port = port
+        self.position = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _seconds_for_rotations(self, rotations, speed):
+        rps = abs(speed) / 100 * SimulatedMotor.MAX_RPM / 60
+        return abs(rotations) / rps if rps else 0.0
+
+    def _run(self, seconds, speed, blocking):
+        """Turn the motor for the given time (None until stopped), in the background unless blocking.
+        """
+        self._stop_event.clear()
+
+        def move():
+            start = time.monotonic()
+            self._stop_event.wait(seconds)
+            elapsed = time.monotonic() - start if seconds is None else min(time.monotonic() - start, seconds)
+            turned = elapsed * speed / 100 * SimulatedMotor.MAX_RPM / 60
+            self.position += turned * 360
+
+        if blocking:
+            move()
+        else:
+            self._thread = threading.Thread(target=move, daemon=True)
+            self._thread.start()
+
+    def run_for_rotations(self, rotations, speed=None, blocking=True):
+        speed = SimulatedMotor.DEFAULT_SPEED if speed is None else speed
+        self._run(self._seconds_for_rotations(rotations, speed), speed if rotations >= 0 else -speed, blocking)
+
+    def run_for_degrees(self, degrees, speed=None, blocking=True):
+        self.run_for_rotations(degrees / 360, speed, blocking)
+
+    def run_for_seconds(self, seconds, speed=None, blocking=True):
+        speed = SimulatedMotor.DEFAULT_SPEED if speed is None else speed
+        self._run(seconds, speed, blocking)
+
+    def start(self, speed=None):
+        speed = SimulatedMotor.DEFAULT_SPEED if speed is None else speed
+        self._run(None, speed, False)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def get_position(self):
+        return self.position
@@ -0,0 +1,68 @@
+import json
+import os
+import pytest
+
+from config import DEFAULT_SETTING_PATH, ConfigError, ConfigStore, load_settings
+
+
+@pytest.fixture
+def setting_path(tmp_path):
+    path = tmp_path / "setting.json"
+    path.write_text(open(DEFAULT_SETTING_PATH).read())
+    return path
+
+
+def write(path, text):
+    path.write_text(text)
+    # mtime の分解能が粗いファイルシステムでも変更に気付かせる
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def edit(path, **constants):
+    data = json.loads(path.read_text())
+    data["constants"].update(constants)
+    write(path, json.dumps(data))
+
+
+def test_reload_publishes_valid_change(setting_path):
+    store = ConfigStore(str(setting_path))
+    published = []
+    store.subscribe(published.append)
+    assert not store.reload()
+    edit(setting_path, delivery_interval=12)
+    assert store.reload()
+    assert store.version == 1 and store.constants.delivery_interval == 12.0
+    assert published == [store.settings]
+
+
+@pytest.mark.parametrize("text", [
+    "{not json",
+    json.dumps({"constants": {}}),
+])
+def test_reload_ignores_broken_file(setting_path, text):
+    store = ConfigStore(str(setting_path))
+    settings = store.settings
+    write(setting_path, text)
+    assert not store.reload()
+    assert store.settings is settings and store.version == 0
+
+
+@pytest.mark.parametrize("constants", [
+    {"camera_width": "640"},
+    {"bad_posture_limit": True},
+    {"unknown_constant": 1},
+    {"posture_rules": [{"name": "x", "keypoint": "tail", "axis": "y", "op": ">"}]},
+])
+def test_reload_ignores_invalid_constants(setting_path, constants):
+    store = ConfigStore(str(setting_path))
+    settings = store.settings
+    edit(setting_path, **constants)
+    with pytest.raises(ConfigError):
+        load_settings(str(setting_path))
+    assert not store.reload()
+    assert store.settings is settings and store.version == 0
+    # 直した設定は次の変更で読み込まれる
+    write(setting_path, open(DEFAULT_SETTING_PATH).read())
+    edit(setting_path, delivery_interval=7)
+    assert store.reload() and store.constants.delivery_interval == 7.0
@@ -0,0 +1,48 @@
+import numpy as np
+import cv2
+
+from crop_region import CropTracker, determine_crop_region, init_crop_region
+
+
+def test_crop_round_trip():
+    # 640x480 のフレームは 640x640 に余白を付けた座標で表す (上下に 80 ピクセル)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.circle(frame, (400, 300), 3, (255, 255, 255), -1)
+    tracker = CropTracker(192)
+    tracker.crop_region = {'y_min': 0.4, 'x_min': 0.45, 'y_max': 0.8, 'x_max': 0.85, 'height': 0.4, 'width': 0.4}
+    image = tracker.crop(frame)
+    assert image.shape == (192, 192, 3)
+    weights = image[..., 0].astype(float)
+    y = (weights.sum(axis=1) * np.arange(192)).sum() / weights.sum()
+    x = (weights.sum(axis=0) * np.arange(192)).sum() / weights.sum()
+    keypoints = np.zeros((17, 3), dtype=np.float32)
+    keypoints[0] = (y / 192, x / 192, 1)
+    mapped = tracker.update(keypoints)
+    np.testing.assert_allclose(mapped[0, :2], [(300 + 80) / 640, 400 / 640], atol=1 / 640)
+
+
+def test_whole_frame_crop_matches_letterbox():
+    frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    image = CropTracker(192).crop(frame)
+    assert not image[:24].any() and not image[-24:].any()
+    assert image[24:-24].any()
+
+
+def test_region_follows_torso():
+    keypoints = np.zeros((17, 3), dtype=np.float32)
+    # 肩と腰だけを検出した姿勢
+    keypoints[[5, 6, 11, 12]] = [(0.4, 0.45, 1), (0.4, 0.55, 1), (0.6, 0.45, 1), (0.6, 0.55, 1)]
+    region = determine_crop_region(keypoints)
+    assert region != init_crop_region()
+    center = ((region['y_min'] + region['y_max']) / 2, (region['x_min'] + region['x_max']) / 2)
+    np.testing.assert_allclose(center, (0.6, 0.5), atol=1e-6)
+    assert region['height'] == region['width']
+    assert region['y_min'] <= 0.4 and region['y_max'] >= 0.6
+
+
+def test_falls_back_to_whole_frame():
+    keypoints = np.zeros((17, 3), dtype=np.float32)
+    assert determine_crop_region(keypoints) == init_crop_region()
+    # 全関節が一点に重なった場合も切り出し範囲が潰れないようにする
+    keypoints[:, :] = (0.5, 0.5, 1)
+    assert determine_crop_region(keypoints) == init_crop_region()
@@ -0,0 +1,61 @@
+import pytest
+
+from utils.common_functions import LCD
+from utils.simulated_devices import SimulatedLCD
+
+
+class RecordingBus():
+    """SMBus stand-in that keeps the bytes written after the display was initialized."""
+
+    def __init__(self):
+        self.written = []
+
+    def write_byte(self, addr, value):
+        return
+
+    def write_i2c_block_data(self, addr, cmd, data):
+        self.written += [cmd] + list(data)
+
+
+def sent_bytes(written, en=0x04):
+    """Decode the nibbles latched by the enable pulses back into bytes."""
+    latched = [written[i] & 0xF0 for i in range(1, len(written), 3) if written[i] & en]
+    return [(high | low >> 4, written[i * 6] & 0x01) for i, (high, low) in enumerate(zip(latched[::2], latched[1::2]))]
+
+
+@pytest.fixture
+def lcd():
+    return SimulatedLCD(RecordingBus(), min_interval=0)
+
+
+def test_first_update_writes_text(lcd):
+    assert lcd.update(["hello", "world"])
+    assert lcd.lines() == ["hello".ljust(16), "world".ljust(16)]
+    text = "".join(chr(value) for value, rs in sent_bytes(lcd.bus.written) if rs)
+    assert text == "helloworld"
+
+
+def test_same_lines_send_nothing(lcd):
+    lcd.update(["hello", "world"])
+    lcd.bus.written.clear()
+    lcd.update(["hello", "world"])
+    assert lcd.bus.written == []
+
+
+def test_only_changed_cells_are_sent(lcd):
+    lcd.update(["distance 60cm", "ok"])
+    lcd.bus.written.clear()
+    lcd.update(["distance 75cm", "ok"])
+    # カーソル移動 1 回と変わった 2 文字だけ
+    assert sent_bytes(lcd.bus.written) == [(LCD.SET_DDRAM | 9, 0), (ord("7"), 1), (ord("5"), 1)]
+    assert lcd.lines()[0] == "distance 75cm".ljust(16)
+
+
+def test_rate_limit_keeps_last_lines():
+    lcd = SimulatedLCD(RecordingBus(), min_interval=60)
+    assert lcd.update(["first"])
+    assert not lcd.update(["second"])
+    assert not lcd.update(["third"])
+    assert lcd.lines()[0] == "first".ljust(16)
+    lcd.flush()
+    assert lcd.lines()[0] == "third".ljust(16)
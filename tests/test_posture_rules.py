@@ -0,0 +1,51 @@
+import numpy as np
+
+from config import load_settings
+from posture_rules import KEYPOINT_NAMES, PostureRules, compile_rules
+
+
+def legacy_groups(key_points, const):
+    """The hand-written checks posture_check() had before the rules were declared in setting.json."""
+    move = key_points["left_shoulder"][1] > const.left_shoulder_x_limit or \
+        key_points["right_shoulder"][1] < const.right_shoulder_x_limit
+    back = key_points["left_eye"][0] < const.left_eye_y_limit or key_points["right_eye"][0] > const.right_eye_y_limit or \
+        key_points["left_shoulder"][0] < const.left_shoulder_y_limit or key_points["right_shoulder"][0] > const.right_shoulder_y_limit
+    nose2eye_y = abs(key_points["nose"][0] - key_points["left_eye"][0])
+    bad_posture = abs(key_points["left_shoulder"][0] - key_points["right_shoulder"][0]) > (2 * nose2eye_y) or \
+        abs(key_points["left_shoulder"][0] - key_points["nose"][0]) < 2 * nose2eye_y or \
+        abs(key_points["left_hip"][0] - key_points["left_shoulder"][0]) < 4 * nose2eye_y
+    return {"move": move, "back": back, "bad_posture": bad_posture}
+
+
+def test_rules_match_legacy_checks():
+    const = load_settings().constants
+    rules = compile_rules(const)
+    keypoints = np.random.default_rng(0).random((2000, 17, 3), dtype=np.float32)
+    mask, margins = rules.evaluate(keypoints)
+    assert mask.shape == (2000,) and margins.shape == (2000, len(rules.names))
+    for frame, frame_mask in zip(keypoints, mask):
+        key_points = dict(zip(KEYPOINT_NAMES, frame))
+        for group, violated in legacy_groups(key_points, const).items():
+            assert bool(rules.violations(frame_mask, group)) == violated
+
+
+def test_margins_and_messages():
+    rules = PostureRules([
+        {"name": "low", "keypoint": "nose", "axis": "y", "op": ">", "limit": 0.5, "message": "too low"},
+        {"name": "wide", "group": "pair", "keypoint": "left_wrist", "relative_to": "right_wrist", "axis": "x",
+         "op": ">", "limit": 0.1, "scale": 2, "unit": ["nose", "left_eye"]},
+    ])
+    keypoints = np.zeros((17, 3), dtype=np.float32)
+    keypoints[KEYPOINT_NAMES.index("nose")] = (0.75, 0.5, 1)
+    keypoints[KEYPOINT_NAMES.index("left_eye")] = (0.7, 0.45, 1)
+    keypoints[KEYPOINT_NAMES.index("left_wrist")] = (0.5, 0.8, 1)
+    keypoints[KEYPOINT_NAMES.index("right_wrist")] = (0.5, 0.5, 1)
+    mask, margins = rules.evaluate(keypoints)
+    # 基準の距離も規則と同じ x 方向で測る: |0.8 - 0.5| - (0.1 + 2 * |0.5 - 0.45|)
+    np.testing.assert_allclose(margins, [0.25, 0.1], atol=1e-6)
+    assert mask == 0b11
+    assert rules.violations(mask) == ["too low", "wide"]
+    assert rules.violations(mask, group="pair") == ["wide"]
+    # 閾値の候補を並べて一度に評価できる
+    mask, margins = rules.evaluate(keypoints, limits=np.array([[0.5, 0.1], [0.9, 0.5]], dtype=np.float32))
+    assert list(mask) == [0b11, 0]
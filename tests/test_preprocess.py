@@ -0,0 +1,53 @@
+import numpy as np
+import cv2
+import pytest
+
+from preprocess import InputBuffer
+
+
+def reference_letterbox(frame, input_size):
+    """Layout of tf.image.resize_with_pad: resize to fit, then center with zero padding."""
+    height, width = frame.shape[:2]
+    ratio = max(width / input_size, height / input_size)
+    size = (int(width / ratio), int(height / ratio))
+    top = (input_size - size[1]) // 2
+    left = (input_size - size[0]) // 2
+    image = np.zeros((input_size, input_size, 3), dtype=np.uint8)
+    image[top:top + size[1], left:left + size[0]] = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+    return image
+
+
+def random_frame(height, width, seed=0):
+    return np.random.default_rng(seed).integers(1, 256, (height, width, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("shape", [(480, 640), (640, 480), (192, 192), (100, 400)])
+def test_letterbox_layout(shape):
+    frame = random_frame(*shape)
+    batch = InputBuffer(192).letterbox(frame)
+    assert batch.shape == (1, 192, 192, 3) and batch.dtype == np.uint8
+    np.testing.assert_array_equal(batch[0], reference_letterbox(frame, 192))
+
+
+def test_padding_cleared_when_frame_size_changes():
+    buffer = InputBuffer(192)
+    buffer.letterbox(random_frame(640, 480, seed=1))
+    frame = random_frame(480, 640, seed=2)
+    np.testing.assert_array_equal(buffer.letterbox(frame)[0], reference_letterbox(frame, 192))
+
+
+def test_float_input_is_cast():
+    frame = random_frame(480, 640)
+    batch = InputBuffer(192, dtype=np.float32).letterbox(frame)
+    assert batch.dtype == np.float32
+    np.testing.assert_array_equal(batch[0], reference_letterbox(frame, 192).astype(np.float32))
+
+
+def test_matches_resize_with_pad():
+    tf = pytest.importorskip("tensorflow")
+    frame = random_frame(480, 640)
+    expected = tf.image.resize_with_pad(np.expand_dims(frame, axis=0), 192, 192).numpy()
+    batch = InputBuffer(192, dtype=np.float32).letterbox(frame)
+    # 補間の実装は違うので、配置と画素値の近さを比べる
+    np.testing.assert_array_equal(batch[0] == 0, expected[0] == 0)
+    assert np.abs(batch - expected).mean() < 2.0
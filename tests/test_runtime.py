@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import runtime
+from runtime import Runtime
+from shared_state import SharedState
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def test_stuck_worker_does_not_block_exit():
+    # 標準入力が閉じているので、起動するとすぐに終了処理に入る
+    script = textwrap.dedent("""
+        import time
+        from runtime import Runtime
+        from shared_state import SharedState
+
+        runtime = Runtime(SharedState(), shutdown_timeout=0.2)
+        runtime.add_worker("stuck", time.sleep, 60)
+        runtime.run()
+        print("returned")
+    """)
+    start = time.monotonic()
+    result = subprocess.run([sys.executable, "-c", script], cwd=SRC, stdin=subprocess.DEVNULL,
+                            capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    assert "returned" in result.stdout
+    assert time.monotonic() - start < 10
+
+
+def test_failed_worker_is_restarted(monkeypatch):
+    shared_state = SharedState()
+    calls = []
+    quit_event = threading.Event()
+
+    def worker():
+        calls.append(threading.current_thread())
+        if len(calls) < 3:
+            raise RuntimeError("fails")
+        quit_event.set()
+        while not shared_state.closed:
+            time.sleep(0.01)
+
+    monkeypatch.setattr(runtime, "quit_program", quit_event.wait)
+    stopped = []
+    rt = Runtime(shared_state, restart_delay=0.01)
+    rt.add_worker("flaky", worker)
+    rt.on_stop(lambda: stopped.append(True))
+    rt.run()
+    assert rt.restarts["flaky"] == 2
+    assert stopped == [True]
+    assert all(thread.daemon and thread.name == "flaky" for thread in calls)
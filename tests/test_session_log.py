@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from session_log import HEADER_DTYPE, SessionLogWriter, list_session_logs, open_session_log, open_session_logs
+
+
+def append_frames(writer, start, count):
+    for i in range(start, start + count):
+        writer.append(float(i), np.full((17, 3), i / 100), i, True, i % 2 == 1)
+
+
+def test_count_header(tmp_path):
+    writer = SessionLogWriter(str(tmp_path), segment_records=8)
+    append_frames(writer, 0, 5)
+    # 領域は 1 セグメント分確保してあるが、読めるのはヘッダーの件数分だけ
+    header = np.fromfile(writer.path, dtype=HEADER_DTYPE, count=1)
+    assert header["count"][0] == 5 and header["segment_records"][0] == 8
+    records = open_session_log(writer.path)
+    assert len(records) == 5
+    np.testing.assert_array_equal(records["timestamp"], np.arange(5))
+    np.testing.assert_array_equal(records["violations"], np.arange(5))
+    np.testing.assert_array_equal(records["bad_posture"], [0, 1, 0, 1, 0])
+    np.testing.assert_allclose(records["keypoints"][3], np.full((17, 3), 0.03), atol=1e-3)
+    writer.close()
+
+
+def test_segments_and_rotation(tmp_path):
+    writer = SessionLogWriter(str(tmp_path), segment_records=4, max_segments=2, max_files=2)
+    append_frames(writer, 0, 20)
+    writer.close()
+    # 8 件ごとに新しいファイルになり、古いファイルは 2 つを残して消える
+    paths = list_session_logs(str(tmp_path))
+    assert len(paths) == 2
+    assert [len(open_session_log(path)) for path in paths] == [8, 4]
+    records = np.concatenate(open_session_logs(str(tmp_path)))
+    np.testing.assert_array_equal(records["timestamp"], np.arange(8, 20))
+    records = np.concatenate(open_session_logs(str(tmp_path), start=10, end=17))
+    np.testing.assert_array_equal(records["timestamp"], np.arange(10, 17))
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "keypoints-other.log"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        open_session_log(str(path))
@@ -0,0 +1,58 @@
+import time
+import numpy as np
+
+from utils.common_functions import Stepper, trapezoidal_delays
+from utils.simulated_devices import SimulatedPigpio, SimulatedStepper
+
+
+def make_stepper(max_pulses=12000):
+    stepper = SimulatedStepper(200, method_step="full")
+    # 200 steps/rev at 3000 rpm: 100 µs per step
+    stepper.set_speed(3000)
+    stepper.pi = SimulatedPigpio(max_pulses=max_pulses)
+    return stepper
+
+
+def test_trapezoidal_intervals():
+    stepper = make_stepper()
+    assert stepper.move(200, acceleration=2e6).result(timeout=5)
+    intervals = stepper.pi.step_intervals()
+    expected = trapezoidal_delays(200, 1e4, 2e6)
+    assert len(intervals) == 199
+    np.testing.assert_array_equal(intervals, expected[:-1])
+    # 加速、巡航、減速の順になっている
+    cruise = np.flatnonzero(intervals == 100)
+    assert cruise.size > 0 and 0 < cruise[0] and cruise[-1] < len(intervals) - 1
+    assert np.all(np.diff(intervals[:cruise[0] + 1]) <= 0)
+    assert np.all(np.diff(intervals[cruise[-1]:]) >= 0)
+    assert intervals[0] > 100 and intervals[-1] > 100
+
+
+def test_constant_speed_intervals():
+    stepper = make_stepper()
+    assert stepper.move(50).result(timeout=5)
+    assert np.all(stepper.pi.step_intervals() == 100)
+
+
+def test_waves_chained_past_pulse_limit(monkeypatch):
+    monkeypatch.setattr(Stepper, "WAVE_PULSES", 100)
+    stepper = make_stepper(max_pulses=100)
+    assert stepper.move(350).result(timeout=5)
+    assert len(stepper.pi.sent) == 350
+    assert stepper.step_number == 350 % 200
+    # 4 つの波形をすべて削除している
+    assert stepper.pi._next_id == 4 and stepper.pi._waves == {}
+    assert all(coil.value == 0 for coil in stepper.mpins)
+
+
+def test_stop_cancels_move():
+    stepper = make_stepper()
+    # 1 ms per step: 2000 steps take 2 s
+    stepper.set_speed(300)
+    future = stepper.move(2000)
+    time.sleep(0.05)
+    stepper.stop()
+    assert future.result(timeout=1) is False
+    assert 0 < len(stepper.pi.sent) < 2000
+    assert not stepper.pi.wave_tx_busy()
+    assert all(coil.value == 0 for coil in stepper.mpins)
@@ -0,0 +1,41 @@
+import time
+
+from benchmark import StageTimer, replay_trace
+from utils.common_functions import MedianFilter
+from utils.simulated_devices import SimulatedUltrasonicSensor
+
+
+def test_median_filter():
+    readings = MedianFilter(window=3)
+    assert readings.value(0.0) is None
+    for timestamp, distance in enumerate([60.0, 200.0, 61.0, 62.0]):
+        readings.add(float(timestamp), distance)
+    # 窓は最新の 3 件: 200, 61, 62
+    assert readings.value(3.0, max_age=10) == 62.0
+    assert readings.value(3.0, max_age=0.5) == 62.0
+    assert readings.value(10.0) is None
+
+
+def test_sensor_serves_filtered_distance():
+    sensor = SimulatedUltrasonicSensor(distance=80.0)
+    sensor.start_sampling(interval=0.01)
+    try:
+        deadline = time.monotonic() + 2
+        while sensor.latest_distance() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sensor.latest_distance() == 80.0
+    finally:
+        sensor.stop_sampling()
+
+
+def write_trace(path, distances):
+    path.write_text("".join(f"{i * 0.06:.2f},{'' if d is None else d}\n" for i, d in enumerate(distances)))
+    return str(path)
+
+
+def test_replay_filters_single_spike(tmp_path):
+    # 遠くの壁しか見えていない中で 1 回だけ近い値が出ても、在席にはしない
+    trace = write_trace(tmp_path / "spike.csv", [200, 200, 200, 60, 200, 200, None, 200])
+    assert replay_trace(trace, StageTimer()) == {"readings": 8, "presence_changes": 0}
+    trace = write_trace(tmp_path / "arrive.csv", [200, 200, 60, 60, 60, 60, None, 60])
+    assert replay_trace(trace, StageTimer()) == {"readings": 8, "presence_changes": 1}